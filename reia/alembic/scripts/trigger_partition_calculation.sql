@@ -0,0 +1,30 @@
+-- The loss category leaves of the partitions are created on demand,
+-- for the loss categories of the results saved to the calculation.
+CREATE OR REPLACE FUNCTION calculation_partition_function()
+RETURNS TRIGGER AS $$
+DECLARE
+	partition_name_assoc TEXT;
+	partition_name_risk TEXT;
+BEGIN
+ 	partition_name_assoc := 'loss_assoc_' || NEW._oid;
+	partition_name_risk := 'loss_riskvalue_' || NEW._oid;
+IF NOT EXISTS
+	(SELECT 1
+   	 FROM   information_schema.tables 
+   	 WHERE  table_name = partition_name_assoc) 
+THEN
+	RAISE NOTICE 'A partition has been created %', partition_name_assoc;
+	EXECUTE format(E'CREATE TABLE %I PARTITION OF loss_assoc_riskvalue_aggregationtag FOR VALUES IN (%s) PARTITION BY LIST(losscategory)', partition_name_assoc, NEW._oid);
+END IF;
+IF NOT EXISTS
+	(SELECT 1
+   	 FROM   information_schema.tables 
+   	 WHERE  table_name = partition_name_risk) 
+THEN
+	RAISE NOTICE 'A partition has been created %', partition_name_risk;
+	EXECUTE format(E'CREATE TABLE %I PARTITION OF loss_riskvalue FOR VALUES IN (%s) PARTITION BY LIST(losscategory)', partition_name_risk, NEW._oid);
+END IF;
+RETURN NEW;
+END
+$$
+LANGUAGE plpgsql;
@@ -0,0 +1,49 @@
+"""Aggregation key results layout
+
+Revision ID: a3c5e8f21d47
+Revises: bb9bd27f1af5
+Create Date: 2026-10-17 09:12:41.503118
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa  # noqa
+from alembic import op  # noqa
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c5e8f21d47'
+down_revision: Union[str, Sequence[str], None] = 'bb9bd27f1af5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The initial revision creates the tables from the current models,
+    # all statements need to be no-ops on a freshly created database.
+    from reia.datamodel.lossvalues import aggregationkey_aggregationtag
+    from reia.schemas.enums import EResultsLayout
+
+    bind = op.get_bind()
+
+    sa.Enum(EResultsLayout).create(bind, checkfirst=True)
+    op.execute("""
+        ALTER TABLE loss_calculation
+        ADD COLUMN IF NOT EXISTS resultslayout eresultslayout
+        NOT NULL DEFAULT 'ASSOCIATION';
+    """)
+    op.execute("""
+        ALTER TABLE loss_riskvalue
+        ADD COLUMN IF NOT EXISTS aggregationkey INTEGER;
+    """)
+    aggregationkey_aggregationtag.create(bind, checkfirst=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("""
+        DROP TABLE IF EXISTS loss_assoc_aggregationkey_aggregationtag;
+        ALTER TABLE loss_riskvalue DROP COLUMN IF EXISTS aggregationkey;
+        ALTER TABLE loss_calculation DROP COLUMN IF EXISTS resultslayout;
+        DROP TYPE IF EXISTS eresultslayout;
+    """)
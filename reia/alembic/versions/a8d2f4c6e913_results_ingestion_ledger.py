@@ -0,0 +1,31 @@
+"""Results ingestion ledger
+
+Revision ID: a8d2f4c6e913
+Revises: f3b6d8e1a2c4
+Create Date: 2026-10-17 17:41:09.562184
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa  # noqa
+from alembic import op  # noqa
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8d2f4c6e913'
+down_revision: Union[str, Sequence[str], None] = 'f3b6d8e1a2c4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The initial revision creates the tables from the current models,
+    # all statements need to be no-ops on a freshly created database.
+    from reia.datamodel.lossvalues import ingestledger
+
+    ingestledger.create(op.get_bind(), checkfirst=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TABLE IF EXISTS loss_ingestledger;")
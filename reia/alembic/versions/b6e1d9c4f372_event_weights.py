@@ -0,0 +1,77 @@
+"""Event weights
+
+Revision ID: b6e1d9c4f372
+Revises: a8d2f4c6e913
+Create Date: 2026-10-17 19:12:47.305918
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa  # noqa
+from alembic import op  # noqa
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6e1d9c4f372'
+down_revision: Union[str, Sequence[str], None] = 'a8d2f4c6e913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The initial revision creates the tables from the current models,
+    # all statements need to be no-ops on a freshly created database.
+    from reia.datamodel.lossvalues import event
+
+    event.create(op.get_bind(), checkfirst=True)
+
+    # move the weights of the stored risk values to their events
+    op.execute("""
+        DO $$
+        BEGIN
+            IF EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_name = 'loss_riskvalue'
+                AND column_name = 'weight'
+            ) THEN
+                INSERT INTO loss_event (
+                    _calculation_oid, _calculationbranch_oid,
+                    eventid, weight)
+                SELECT DISTINCT ON (_calculationbranch_oid, eventid)
+                    _calculation_oid, _calculationbranch_oid,
+                    eventid, weight
+                FROM loss_riskvalue
+                WHERE _calculationbranch_oid IS NOT NULL
+                AND eventid IS NOT NULL
+                AND weight IS NOT NULL
+                ON CONFLICT DO NOTHING;
+
+                ALTER TABLE loss_riskvalue DROP COLUMN weight;
+            END IF;
+        END $$;
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    from reia.repositories.utils import (RISKVALUE_STORAGE_TYPES,
+                                         get_riskvalue_storage)
+
+    weight_type = RISKVALUE_STORAGE_TYPES[
+        get_riskvalue_storage(op.get_bind())]
+    op.execute(f"""
+        ALTER TABLE loss_riskvalue
+        ADD COLUMN IF NOT EXISTS weight {weight_type};
+    """)
+    op.execute("""
+        DO $$
+        BEGIN
+            IF to_regclass('loss_event') IS NOT NULL THEN
+                UPDATE loss_riskvalue rv SET weight = ev.weight
+                FROM loss_event ev
+                WHERE rv._calculationbranch_oid = ev._calculationbranch_oid
+                AND rv.eventid = ev.eventid;
+            END IF;
+        END $$;
+    """)
+    op.execute("DROP TABLE IF EXISTS loss_event;")
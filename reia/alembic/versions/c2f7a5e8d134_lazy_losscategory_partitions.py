@@ -0,0 +1,47 @@
+"""Lazy loss category partitions
+
+Revision ID: c2f7a5e8d134
+Revises: b6e1d9c4f372
+Create Date: 2026-10-17 20:26:13.648091
+
+"""
+from pathlib import Path
+from typing import Sequence, Union
+
+import sqlalchemy as sa  # noqa
+from alembic import op  # noqa
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2f7a5e8d134'
+down_revision: Union[str, Sequence[str], None] = 'b6e1d9c4f372'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def execute_sql_file(filename: str) -> None:
+    """Execute a SQL file from the scripts directory."""
+    sql_file = Path(__file__).parent.parent / "scripts" / filename
+    with open(sql_file, 'r') as f:
+        op.execute(f.read())
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # new calculations only get their partition, the loss category
+    # leaves are created when the results are saved
+    execute_sql_file("trigger_partition_calculation.sql")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    from reia.repositories.utils import create_calculation_leaves
+    from reia.schemas.enums import ELossCategory
+
+    execute_sql_file("trigger_partition_losstype.sql")
+
+    # all calculations have all loss category leaves again
+    connection = op.get_bind()
+    for calculation_oid in connection.execute(sa.text(
+            "SELECT _oid FROM loss_calculation;")).scalars().all():
+        create_calculation_leaves(connection, calculation_oid,
+                                  [c.name for c in ELossCategory])
@@ -0,0 +1,31 @@
+"""Precomputed risk statistics
+
+Revision ID: c71d2e9b4f05
+Revises: a3c5e8f21d47
+Create Date: 2026-10-17 11:38:07.214592
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa  # noqa
+from alembic import op  # noqa
+
+# revision identifiers, used by Alembic.
+revision: str = 'c71d2e9b4f05'
+down_revision: Union[str, Sequence[str], None] = 'a3c5e8f21d47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The initial revision creates the tables from the current models,
+    # all statements need to be no-ops on a freshly created database.
+    from reia.datamodel.lossvalues import riskstatistics
+
+    riskstatistics.create(op.get_bind(), checkfirst=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TABLE IF EXISTS loss_riskstatistics;")
@@ -0,0 +1,31 @@
+"""Total event weight
+
+Revision ID: d4b8a1f6e392
+Revises: c71d2e9b4f05
+Create Date: 2026-10-17 14:02:55.871340
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa  # noqa
+from alembic import op  # noqa
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4b8a1f6e392'
+down_revision: Union[str, Sequence[str], None] = 'c71d2e9b4f05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The initial revision creates the tables from the current models,
+    # all statements need to be no-ops on a freshly created database.
+    from reia.datamodel.lossvalues import totalweight
+
+    totalweight.create(op.get_bind(), checkfirst=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TABLE IF EXISTS loss_totalweight;")
@@ -0,0 +1,29 @@
+"""Compact risk value storage
+
+Revision ID: e5a9c3d7f218
+Revises: d4b8a1f6e392
+Create Date: 2026-10-17 15:02:36.871240
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa  # noqa
+from alembic import op  # noqa
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a9c3d7f218'
+down_revision: Union[str, Sequence[str], None] = 'd4b8a1f6e392'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The risk values are created as double precision, converting them
+    # is left to `reia db riskvalue-storage`.
+    pass
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    pass
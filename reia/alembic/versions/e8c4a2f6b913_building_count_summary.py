@@ -0,0 +1,65 @@
+"""Building count summary
+
+Revision ID: e8c4a2f6b913
+Revises: d9a3b7e2c561
+Create Date: 2026-10-17 22:14:36.481203
+
+"""
+from pathlib import Path
+from typing import Sequence, Union
+
+import sqlalchemy as sa  # noqa
+from alembic import op  # noqa
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8c4a2f6b913'
+down_revision: Union[str, Sequence[str], None] = 'd9a3b7e2c561'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def execute_sql_file(filename: str) -> None:
+    """Execute a SQL file from the scripts directory."""
+    sql_file = Path(__file__).parent.parent / "scripts" / filename
+    with open(sql_file, 'r') as f:
+        op.execute(f.read())
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The initial revision creates the tables from the current models,
+    # the table is only filled if it didn't exist before.
+    from reia.datamodel.asset import buildingcount
+
+    # the building counts are summed up once per imported exposure model
+    # instead of refreshing the view after every statement on loss_asset
+    op.execute("""
+        DROP TRIGGER IF EXISTS refresh_materialized_loss_buildings_trigger
+        ON loss_asset;
+        DROP FUNCTION IF EXISTS refresh_materialized_loss_buildings();
+        DROP MATERIALIZED VIEW IF EXISTS loss_buildings_per_municipality;
+    """)
+
+    created = not sa.inspect(op.get_bind()).has_table(buildingcount.name)
+    buildingcount.create(op.get_bind(), checkfirst=True)
+
+    if created:
+        op.execute(f"""
+            INSERT INTO {buildingcount.name} (
+                _exposuremodel_oid, aggregationtype,
+                aggregationtag, buildingcount)
+            SELECT ast._exposuremodel_oid, assoc.aggregationtype,
+                assoc.aggregationtag, SUM(ast.buildingcount)
+            FROM loss_asset ast
+            JOIN loss_assoc_asset_aggregationtag assoc
+                ON assoc.asset = ast._oid
+            GROUP BY ast._exposuremodel_oid, assoc.aggregationtype,
+                assoc.aggregationtag;
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TABLE IF EXISTS loss_buildingcount;")
+    execute_sql_file("materialized_loss_buildings.sql")
+    execute_sql_file("trigger_refresh_materialized.sql")
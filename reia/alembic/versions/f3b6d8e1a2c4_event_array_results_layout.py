@@ -0,0 +1,35 @@
+"""Event array results layout
+
+Revision ID: f3b6d8e1a2c4
+Revises: e5a9c3d7f218
+Create Date: 2026-10-17 16:24:51.338017
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa  # noqa
+from alembic import op  # noqa
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b6d8e1a2c4'
+down_revision: Union[str, Sequence[str], None] = 'e5a9c3d7f218'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The initial revision creates the tables from the current models,
+    # all statements need to be no-ops on a freshly created database.
+    from reia.datamodel.lossvalues import riskarray
+
+    op.execute("""
+        ALTER TYPE eresultslayout ADD VALUE IF NOT EXISTS 'EVENTARRAY';
+    """)
+    riskarray.create(op.get_bind(), checkfirst=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # PostgreSQL can't remove a value from an enum type, EVENTARRAY stays
+    op.execute("DROP TABLE IF EXISTS loss_riskarray;")
@@ -0,0 +1,31 @@
+"""Event array staging
+
+Revision ID: f7d2b9e4c815
+Revises: e8c4a2f6b913
+Create Date: 2026-10-17 23:41:08.512974
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa  # noqa
+from alembic import op  # noqa
+
+# revision identifiers, used by Alembic.
+revision: str = 'f7d2b9e4c815'
+down_revision: Union[str, Sequence[str], None] = 'e8c4a2f6b913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The initial revision creates the tables from the current models,
+    # all statements need to be no-ops on a freshly created database.
+    from reia.datamodel.lossvalues import riskarraystaging
+
+    riskarraystaging.create(op.get_bind(), checkfirst=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TABLE IF EXISTS loss_riskarraystaging;")
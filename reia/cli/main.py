@@ -1,12 +1,16 @@
 import os
 import subprocess
 import sys
+from datetime import datetime
 from pathlib import Path
 
 import typer
 from typing_extensions import Annotated
 
 from reia.cli.extensions import plugin_manager
+from reia.config.settings import get_settings
+from reia.io.input_cache import InputCache
+from reia.io.results_cache import ResultsCache
 from reia.repositories import DatabaseSession
 from reia.repositories.asset import (AggregationGeometryRepository,
                                      AssetRepository, ExposureModelRepository,
@@ -15,10 +19,14 @@ from reia.repositories.calculation import (CalculationRepository,
                                            RiskAssessmentRepository)
 from reia.repositories.fragility import (FragilityModelRepository,
                                          TaxonomyMapRepository)
+from reia.repositories.lossvalue import RiskValueRepository
+from reia.repositories.utils import close_copy_loader
 from reia.repositories.vulnerability import VulnerabilityModelRepository
 from reia.schemas.calculation_schemas import RiskAssessment
-from reia.schemas.enums import ECalculationType
+from reia.schemas.enums import ECalculationType, EResultsStorage
+from reia.services import get_input_cache
 from reia.services.calculation import (CalculationDataService,
+                                       CalculationService,
                                        run_calculation_from_files,
                                        run_test_calculation)
 from reia.services.exposure import (ExposureService,
@@ -64,14 +72,18 @@ fragility = typer.Typer()
 taxonomymap = typer.Typer()
 calculation = typer.Typer()
 risk_assessment = typer.Typer()
+cache = typer.Typer()
 
 
 @app.callback()
 def main(
+    ctx: typer.Context,
     verbose: bool = typer.Option(False, "--verbose", "-v",
                                  help="Enable verbose logging")
 ) -> None:
     """REIA - Rapid Earthquake Impact Assessment Switzerland."""
+    # close the COPY connections once the command has finished
+    ctx.call_on_close(close_copy_loader)
     if verbose:
         os.environ['LOG_LEVEL'] = 'DEBUG'
         # Re-initialize logging with new level
@@ -93,6 +105,8 @@ app.add_typer(calculation, name='calculation',
               help='Create or execute calculations')
 app.add_typer(risk_assessment, name='risk-assessment',
               help='Manage Risk Assessments')
+app.add_typer(cache, name='cache',
+              help='Inspect or purge the results and input file caches')
 
 # Load and register plugins
 plugin_manager.register_plugins(app)
@@ -237,6 +251,32 @@ def stamp_database(
         raise typer.Exit(code=1)
 
 
+@db.command('drop-empty-partitions')
+def drop_empty_partitions() -> None:
+    """Drop the loss category partitions which don't contain results."""
+    with DatabaseSession() as session:
+        dropped = RiskValueRepository.drop_empty_partitions(session)
+    typer.echo(f'Dropped {len(dropped)} empty partition(s).')
+
+
+@db.command('riskvalue-storage')
+def riskvalue_storage(
+    storage: Annotated[EResultsStorage | None, typer.Argument(
+        help='Convert the risk values to this storage profile, double or '
+        'compact (real), shows the current one if omitted')] = None
+) -> None:
+    """Show or convert the column types of the stored risk values."""
+    with DatabaseSession() as session:
+        if storage is not None:
+            try:
+                RiskValueRepository.set_storage(session, storage)
+            except ValueError as e:
+                typer.echo(f'Error: {str(e)} Exiting...')
+                raise typer.Exit(code=1)
+        current = RiskValueRepository.get_storage(session)
+    typer.echo(f'Risk values use {current.value} storage.')
+
+
 @exposure.command('add')
 def add_exposure(
     exposure: Annotated[Path, typer.Argument(
@@ -268,6 +308,7 @@ def delete_exposure(
     """Delete an exposure model."""
     with DatabaseSession() as session:
         ExposureModelRepository.delete(session, exposuremodel_oid)
+        ExposureService.purge_cached(session, exposuremodel_oid)
     typer.echo(
         f'Successfully deleted exposure model with ID {exposuremodel_oid}.')
 
@@ -374,6 +415,7 @@ def delete_fragility(
     """Delete a fragility model."""
     with DatabaseSession() as session:
         FragilityModelRepository.delete(session, fragility_model_oid)
+        FragilityService.purge_cached(session, fragility_model_oid)
 
     typer.echo(
         f'Successfully deleted fragility model with ID {fragility_model_oid}.')
@@ -430,6 +472,7 @@ def delete_taxonomymap(
     """Delete a taxonomy mapping."""
     with DatabaseSession() as session:
         TaxonomyMapRepository.delete(session, taxonomymap_oid)
+        TaxonomyService.purge_cached(session, taxonomymap_oid)
     typer.echo(
         f'Successfully deleted taxonomy mapping with ID {taxonomymap_oid}.')
 
@@ -488,6 +531,7 @@ def delete_vulnerability(
     """Delete a vulnerability model."""
     with DatabaseSession() as session:
         VulnerabilityModelRepository.delete(session, vulnerability_model_oid)
+        VulnerabilityService.purge_cached(session, vulnerability_model_oid)
     typer.echo(
         'Successfully deleted vulnerability '
         f'model with ID {vulnerability_model_oid}.')
@@ -572,6 +616,28 @@ def run_calculation(
         raise typer.Exit(code=1)
 
 
+@calculation.command('resume')
+def resume_calculation(
+    branch_id: Annotated[int, typer.Argument(
+        help='ID of the calculation branch')],
+    job_id: Annotated[int | None, typer.Option(
+        help='OpenQuake job ID of the branch calculation')] = None,
+    datastore: Annotated[Path | None, typer.Option(
+        help='Path to the datastore of the branch calculation')] = None
+) -> None:
+    """Continue saving the results of an interrupted calculation branch."""
+    if (job_id is None) == (datastore is None):
+        typer.echo('Error: Provide either --job-id or --datastore.')
+        raise typer.Exit(code=1)
+
+    with DatabaseSession() as session:
+        calculation = CalculationService(session).resume_results(
+            branch_id, job_id, str(datastore) if datastore else None)
+
+    typer.echo(f'Calculation {calculation.oid} has status '
+               f'{calculation.status.name}.')
+
+
 @calculation.command('list')
 def list_calculations(calc_type: Annotated[ECalculationType | None,
                                            typer.Option(
@@ -673,3 +739,88 @@ def run_risk_assessment(
         f'{risk_assessment.status.name}')
 
     return risk_assessment.oid
+
+
+def _get_results_cache() -> ResultsCache:
+    """Get the results cache configured in the settings."""
+    config = get_settings()
+    if not config.results_cache_dir:
+        typer.echo('The results cache is disabled, set RESULTS_CACHE_DIR.')
+        raise typer.Exit(code=1)
+    return ResultsCache(config.results_cache_dir, config.results_cache_size)
+
+
+@cache.command('list')
+def list_cache() -> None:
+    """List the cached OpenQuake results, least recently used first."""
+    results_cache = _get_results_cache()
+    entries = results_cache.entries()
+
+    headers = ['Key', 'Size (MB)', 'Last Access']
+    rows = [[e['key'], f"{e['size'] / 1024**2:.1f}",
+             datetime.fromtimestamp(e['last_access']).isoformat(
+                 ' ', 'seconds')]
+            for e in entries]
+
+    display_table('Cached OpenQuake results:', headers, rows)
+    typer.echo(f'Total {sum(e["size"] for e in entries) / 1024**2:.1f} MB '
+               f'of {results_cache.max_size / 1024**2:.1f} MB.')
+
+
+@cache.command('purge')
+def purge_cache(
+    job_id: Annotated[int | None, typer.Option(
+        help='Only remove the results of this OpenQuake job')] = None,
+    older_than: Annotated[int | None, typer.Option(
+        help='Only remove results not accessed for this many days')] = None
+) -> None:
+    """Remove cached OpenQuake results."""
+    results_cache = _get_results_cache()
+    removed = results_cache.purge(
+        job_id, older_than * 86400 if older_than is not None else None)
+    typer.echo(f'Removed {len(removed)} cached result(s).')
+
+
+def _get_input_cache() -> InputCache:
+    """Get the input file cache configured in the settings."""
+    with DatabaseSession() as session:
+        input_cache = get_input_cache(session)
+    if input_cache is None:
+        typer.echo('The input file cache is disabled, set INPUT_CACHE_DIR.')
+        raise typer.Exit(code=1)
+    return input_cache
+
+
+@cache.command('list-inputs')
+def list_input_cache() -> None:
+    """List the cached calculation input files, least recently used first."""
+    input_cache = _get_input_cache()
+    entries = input_cache.entries()
+
+    headers = ['Key', 'Size (MB)', 'Last Access']
+    rows = [[e['key'], f"{e['size'] / 1024**2:.1f}",
+             datetime.fromtimestamp(e['last_access']).isoformat(
+                 ' ', 'seconds')]
+            for e in entries]
+
+    display_table('Cached calculation input files:', headers, rows)
+    typer.echo(f'Total {input_cache.size() / 1024**2:.1f} MB '
+               f'of {input_cache.max_size / 1024**2:.1f} MB.')
+
+
+@cache.command('purge-inputs')
+def purge_input_cache(
+    model_type: Annotated[str | None, typer.Option(
+        help='Only remove the files of this model type, e.g. exposure')
+    ] = None,
+    oid: Annotated[int | None, typer.Option(
+        help='Only remove the files of models with this ID')] = None,
+    older_than: Annotated[int | None, typer.Option(
+        help='Only remove files not accessed for this many days')] = None
+) -> None:
+    """Remove cached calculation input files."""
+    input_cache = _get_input_cache()
+    removed = input_cache.purge(
+        model_type, oid,
+        older_than * 86400 if older_than is not None else None)
+    typer.echo(f'Removed {len(removed)} cached input model(s).')
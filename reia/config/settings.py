@@ -68,14 +68,50 @@ class REIASettings(Settings):
     oq_password: str = Field(default='password')
 
     oq_version: int = Field(default=16)
+    # download remote results here instead of registering them in the
+    # local OpenQuake database, unless oq_register_remote is set
+    oq_download_dir: str = Field(
+        default=str(Path.home() / '.cache' / 'reia' / 'datastores'))
+    oq_register_remote: bool = Field(default=False)
 
     # Database Superuser
     postgres_user: str = Field(default='postgres')
     postgres_password: str = Field(default='postgres')
 
     # Application Configuration
+    # connections copying in parallel, bounded by the free connections
     max_processes: int = Field(default=2)
 
+    # Results Ingestion
+    copy_format: str = Field(default='binary')  # 'binary' or 'csv'
+    results_chunk_size: int = Field(default=2_000_000)
+    results_queue_size: int = Field(default=2)
+    # calculation branches whose results are saved concurrently
+    results_ingest_workers: int = Field(default=4)
+    # cache of the extracted results per OpenQuake job, disabled if None
+    results_cache_dir: str | None = Field(default=None)
+    results_cache_size: int = Field(default=20 * 1024**3)  # bytes
+    # storage layout of new calculations: 'association', 'aggregationkey'
+    # or 'eventarray'
+    results_layout: str = Field(default='association')
+    # don't store zero losses, statistics use the total event weight
+    results_sparse: bool = Field(default=False)
+    # load the partitions of new calculations detached, building their
+    # indexes and validating their foreign keys once all branches are saved
+    results_bulk_load: bool = Field(default=False)
+    results_bulk_maintenance_work_mem: str = Field(default='1GB')
+    # stage the leaf partitions as UNLOGGED tables while bulk loading
+    results_bulk_unlogged: bool = Field(default=False)
+
+    # Exposure Import
+    # rows of the exposure assets CSV parsed and copied at once
+    exposure_chunk_size: int = Field(default=500_000)
+
+    # Calculation Input Export
+    # cache of the input files exported per model, disabled if None
+    input_cache_dir: str | None = Field(default=None)
+    input_cache_size: int = Field(default=2 * 1024**3)  # bytes
+
     agency_id: str = Field(default='')
 
     @computed_field
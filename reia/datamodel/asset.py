@@ -110,6 +110,26 @@ class AggregationTag(ORMBase):
     )
 
 
+# Total number of buildings per aggregation tag of an exposure model,
+# filled once all assets of the exposure model are imported.
+buildingcount = Table(
+    'loss_buildingcount',
+    ORMBase.metadata,
+    Column('_exposuremodel_oid', ForeignKey('loss_exposuremodel._oid',
+                                            ondelete='CASCADE'),
+           primary_key=True),
+    Column('aggregationtype', String, primary_key=True),
+    Column('aggregationtag', BigInteger, primary_key=True),
+    Column('buildingcount', BigInteger, nullable=False),
+
+    ForeignKeyConstraint(['aggregationtag',
+                          'aggregationtype'],
+                         ['loss_aggregationtag._oid',
+                         'loss_aggregationtag.type'],
+                         ondelete='CASCADE'),
+)
+
+
 class AggregationGeometry(ORMBase):
     """Aggregation Geometry model"""
 
@@ -9,7 +9,8 @@ from sqlalchemy.sql.sqltypes import BigInteger, Boolean, Enum, Float, String
 from reia.datamodel.base import ORMBase
 from reia.datamodel.mixins import (CompatibleStringArray, CreationInfoMixin,
                                    JSONEncodedDict)
-from reia.schemas.enums import ECalculationType, EEarthquakeType, EStatus
+from reia.schemas.enums import (ECalculationType, EEarthquakeType,
+                                EResultsLayout, EStatus)
 
 
 class RiskAssessment(ORMBase, CreationInfoMixin):
@@ -198,6 +199,12 @@ class Calculation(ORMBase, CreationInfoMixin):
     status = Column(Enum(EStatus), nullable=False, default=EStatus.CREATED)
     description = Column(String())
 
+    # how the aggregation tags of the risk values are stored
+    resultslayout = Column(Enum(EResultsLayout),
+                           nullable=False,
+                           default=EResultsLayout.ASSOCIATION,
+                           server_default=EResultsLayout.ASSOCIATION.name)
+
     _type = Column(Enum(ECalculationType))
 
     __mapper_args__ = {
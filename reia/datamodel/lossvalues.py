@@ -1,7 +1,8 @@
-from sqlalchemy import ForeignKeyConstraint, Table
-from sqlalchemy.orm import relationship
+from sqlalchemy import ForeignKeyConstraint, Index, Table, select
+from sqlalchemy.orm import column_property, relationship
 from sqlalchemy.sql.schema import Column, ForeignKey
-from sqlalchemy.sql.sqltypes import BigInteger, Enum, Float, Integer, String
+from sqlalchemy.sql.sqltypes import (ARRAY, REAL, BigInteger, Boolean, Enum,
+                                     Float, Integer, String)
 
 from reia.datamodel.base import ORMBase
 from reia.datamodel.mixins import RealQuantityMixin
@@ -33,6 +34,162 @@ riskvalue_aggregationtag = Table(
     postgresql_partition_by='LIST (_calculation_oid)'
 )
 
+# Dictionary of the OpenQuake aggregation keys of a calculation branch,
+# used instead of riskvalue_aggregationtag with the AGGREGATIONKEY layout.
+aggregationkey_aggregationtag = Table(
+    'loss_assoc_aggregationkey_aggregationtag',
+    ORMBase.metadata,
+
+    Column('_calculation_oid', ForeignKey('loss_calculation._oid',
+                                          ondelete='CASCADE'),
+           nullable=False),
+    Column('_calculationbranch_oid', ForeignKey('loss_calculationbranch._oid',
+                                                ondelete='CASCADE'),
+           primary_key=True),
+    Column('aggregationkey', Integer, primary_key=True),
+
+    Column('aggregationtag', BigInteger, nullable=False),
+    Column('aggregationtype', String, primary_key=True),
+
+    ForeignKeyConstraint(['aggregationtag', 'aggregationtype'],
+                         ['loss_aggregationtag._oid',
+                         'loss_aggregationtag.type'],
+                         ondelete='CASCADE'),
+
+    Index('idx_aggregationkey_calculation_type',
+          '_calculation_oid', 'aggregationtype', 'aggregationtag')
+)
+
+# Risk values of a calculation with the EVENTARRAY layout, one row per
+# aggregation tag and quantity ('loss', 'dg1', ...) over all branches.
+# The values are sorted, the weights are in the same order.
+riskarray = Table(
+    'loss_riskarray',
+    ORMBase.metadata,
+
+    Column('_calculation_oid', ForeignKey('loss_calculation._oid',
+                                          ondelete='CASCADE'),
+           primary_key=True),
+    Column('losscategory', Enum(ELossCategory), primary_key=True),
+    Column('aggregationtype', String, primary_key=True),
+    Column('aggregationtag', BigInteger, primary_key=True),
+    Column('quantity', String, primary_key=True),
+
+    Column('weight', Float, nullable=False),
+    Column('riskvalues', ARRAY(REAL), nullable=False),
+    Column('weights', ARRAY(REAL), nullable=False),
+
+    ForeignKeyConstraint(['aggregationtag', 'aggregationtype'],
+                         ['loss_aggregationtag._oid',
+                         'loss_aggregationtag.type'],
+                         ondelete='CASCADE')
+)
+
+# Event arrays of the saved chunks of a calculation branch, which are
+# merged into loss_riskarray at once when all chunks are saved. UNLOGGED,
+# the chunks emptied by a crash of the database server are saved again.
+riskarraystaging = Table(
+    'loss_riskarraystaging',
+    ORMBase.metadata,
+
+    Column('_calculationbranch_oid', ForeignKey('loss_calculationbranch._oid',
+                                                ondelete='CASCADE'),
+           nullable=False),
+    Column('chunk', Integer, nullable=False),
+    Column('_calculation_oid', BigInteger, nullable=False),
+    Column('losscategory', Enum(ELossCategory), nullable=False),
+    Column('aggregationtype', String, nullable=False),
+    Column('aggregationtag', BigInteger, nullable=False),
+    Column('quantity', String, nullable=False),
+
+    Column('weight', Float, nullable=False),
+    Column('riskvalues', ARRAY(REAL), nullable=False),
+    Column('weights', ARRAY(REAL), nullable=False),
+
+    Index('idx_riskarraystaging_branch', '_calculationbranch_oid'),
+    prefixes=['UNLOGGED']
+)
+
+# Total weight of the events of a calculation branch per loss category,
+# including the events without a stored risk value.
+totalweight = Table(
+    'loss_totalweight',
+    ORMBase.metadata,
+
+    Column('_calculation_oid', ForeignKey('loss_calculation._oid',
+                                          ondelete='CASCADE'),
+           nullable=False),
+    Column('_calculationbranch_oid', ForeignKey('loss_calculationbranch._oid',
+                                                ondelete='CASCADE'),
+           primary_key=True),
+    Column('losscategory', Enum(ELossCategory), primary_key=True),
+    Column('weight', Float, nullable=False),
+
+    Index('idx_totalweight_calculation', '_calculation_oid', 'losscategory')
+)
+
+# Events of a calculation branch which have stored risk values, with the
+# event weight times the branch weight. The risk values only store their
+# event id.
+event = Table(
+    'loss_event',
+    ORMBase.metadata,
+
+    Column('_calculation_oid', ForeignKey('loss_calculation._oid',
+                                          ondelete='CASCADE'),
+           nullable=False),
+    Column('_calculationbranch_oid', ForeignKey('loss_calculationbranch._oid',
+                                                ondelete='CASCADE'),
+           primary_key=True),
+    Column('eventid', Integer, primary_key=True),
+    Column('weight', Float, nullable=False),
+
+    Index('idx_event_calculation', '_calculation_oid')
+)
+
+# Ledger of the chunks of risk values saved per calculation branch. A
+# chunk's oids are recorded before it is copied, so that an interrupted
+# ingestion can remove the partially copied chunk and continue after the
+# last committed one.
+ingestledger = Table(
+    'loss_ingestledger',
+    ORMBase.metadata,
+
+    Column('_calculation_oid', ForeignKey('loss_calculation._oid',
+                                          ondelete='CASCADE'),
+           nullable=False),
+    Column('_calculationbranch_oid', ForeignKey('loss_calculationbranch._oid',
+                                                ondelete='CASCADE'),
+           primary_key=True),
+    Column('chunk', Integer, primary_key=True),
+
+    # OpenQuake job and slice size the chunks were read with
+    Column('jobid', String),
+    Column('chunksize', Integer, nullable=False),
+    Column('oidstart', BigInteger),
+    Column('rows', Integer, nullable=False),
+    Column('losscategories', ARRAY(String), nullable=False),
+    Column('committed', Boolean, nullable=False, default=False)
+)
+
+# Weighted statistics per aggregation tag, precomputed over all branches
+# once a calculation is complete. Columns of the other risk type are NULL.
+riskstatistics = Table(
+    'loss_riskstatistics',
+    ORMBase.metadata,
+
+    Column('_calculation_oid', ForeignKey('loss_calculation._oid',
+                                          ondelete='CASCADE'),
+           primary_key=True),
+    Column('losscategory', Enum(ELossCategory), primary_key=True),
+    Column('aggregationtype', String, primary_key=True),
+    Column('tagname', String, primary_key=True),
+
+    *[Column(f'{quantity}_{statistic}', Float)
+      for quantity in ('loss', 'dg1', 'dg2', 'dg3', 'dg4', 'dg5')
+      for statistic in ('mean', 'pc10', 'pc90')]
+)
+
 
 class RiskValue(ORMBase):
     _oid = Column(BigInteger, autoincrement=True,
@@ -42,7 +199,8 @@ class RiskValue(ORMBase):
     losscategory = Column(Enum(ELossCategory),
                           primary_key=True)
     eventid = Column(Integer)  # id of the realization
-    weight = Column(Float)
+    # OpenQuake agg_id, only stored with the AGGREGATIONKEY layout
+    aggregationkey = Column(Integer)
 
     _calculation_oid = Column(BigInteger,
                               ForeignKey('loss_calculation._oid'),
@@ -52,6 +210,13 @@ class RiskValue(ORMBase):
                                     ForeignKey(
                                         'loss_calculationbranch._oid'))
 
+    weight = column_property(
+        select(event.c.weight)
+        .where(event.c._calculationbranch_oid == _calculationbranch_oid,
+               event.c.eventid == eventid)
+        .correlate_except(event)
+        .scalar_subquery())
+
     aggregationtags = relationship('AggregationTag',
                                    secondary=riskvalue_aggregationtag,
                                    back_populates='riskvalues',
@@ -20,6 +20,21 @@ ASSETS_COLS_MAPPING = {'taxonomy': 'taxonomy_concept',
                        'business_interruption': 'businessinterruptionvalue'
                        }
 
+# declared types of the exposure assets CSV columns, aggregation tag
+# columns are read as 'category'
+ASSETS_COLS_DTYPES = {'id': 'str',
+                      'lon': 'float64',
+                      'lat': 'float64',
+                      'taxonomy': 'category',
+                      'number': 'Int64',
+                      'contents': 'float64',
+                      'day': 'float64',
+                      'night': 'float64',
+                      'transit': 'float64',
+                      'structural': 'float64',
+                      'nonstructural': 'float64',
+                      'business_interruption': 'float64'}
+
 VULNERABILITY_FK_MAPPING = {
     'structural_vulnerability_file': '_structuralvulnerabilitymodel_oid',
     'contents_vulnerability_file': '_contentsvulnerabilitymodel_oid',
@@ -55,11 +70,11 @@ MODEL_FIELD_MAPPINGS = {
 
 RISK_COLUMNS_MAPPING = {
     ERiskType.LOSS: {'event_id': 'eventid',
-                     'agg_id': 'aggregationtags',
+                     'agg_id': 'aggregationkey',
                      'loss_id': 'losscategory',
                      'loss': 'loss_value'},
     ERiskType.DAMAGE: {'event_id': 'eventid',
-                       'agg_id': 'aggregationtags',
+                       'agg_id': 'aggregationkey',
                        'loss_id': 'losscategory',
                        'dmg_1': 'dg1_value',
                        'dmg_2': 'dg2_value',
@@ -1,6 +1,7 @@
 import configparser
 from itertools import groupby
 
+from reia.config.settings import get_settings
 from reia.io import (CALCULATION_BRANCH_MAPPING, CALCULATION_MAPPING,
                      MODEL_FIELD_MAPPINGS)
 from reia.schemas.calculation_schemas import (Calculation, CalculationBranch,
@@ -74,7 +75,8 @@ def create_calculation(
     calculation_dict = {
         'description': description,
         'aggregateby': [x.strip() for x in aggregate_by.split(',')]
-        if aggregate_by else None
+        if aggregate_by else None,
+        'resultslayout': get_settings().results_layout
     }
 
     calculation = CALCULATION_MAPPING[calculation_mode].model_validate(
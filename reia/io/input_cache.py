@@ -0,0 +1,221 @@
+import hashlib
+import io
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+# bump when the exported files change without a change of the templates
+INPUT_EXPORT_VERSION = 1
+TEMPLATES_DIR = Path(__file__).parent.parent / 'templates'
+
+ENTRIES_DIR = 'entries'
+OBJECTS_DIR = 'objects'
+
+
+def template_version(template: str | None = None) -> str:
+    """Version of the files exported using a template.
+
+    Args:
+        template: File name of the template in `reia/templates`, None if
+            the files are exported without template.
+
+    Returns:
+        Digest of the export version and the template content.
+    """
+    digest = hashlib.sha256(str(INPUT_EXPORT_VERSION).encode())
+    if template is not None:
+        digest.update((TEMPLATES_DIR / template).read_bytes())
+    return digest.hexdigest()[:12]
+
+
+class InputCache:
+    """On-disk cache of the calculation input files exported from models.
+
+    Every entry lists the files exported for one model, keyed by model
+    type, oid, database and template version. The file contents are
+    stored once per SHA-256 digest, so that identical files of several
+    entries share their storage. The least recently used entries are
+    evicted once the cache grows larger than `max_size` bytes.
+
+    Args:
+        directory: Directory of the cache.
+        max_size: Size limit of the file contents in bytes.
+        database: Identity of the database the oids belong to, see
+            `get_database_identity`.
+    """
+
+    def __init__(self, directory: str | Path, max_size: int, database: str):
+        self.directory = Path(directory)
+        self.max_size = max_size
+        self.database = database
+        (self.directory / ENTRIES_DIR).mkdir(parents=True, exist_ok=True)
+        (self.directory / OBJECTS_DIR).mkdir(parents=True, exist_ok=True)
+
+    def key(self, model_type: str, oid: int, version: str) -> str:
+        return f'{model_type}_{oid}-{self.database}-{version}'
+
+    def get(self,
+            model_type: str,
+            oid: int,
+            version: str) -> list[io.StringIO] | None:
+        """Load the cached files of a model.
+
+        Args:
+            model_type: Type of the model, e.g. 'exposure'.
+            oid: OID of the model.
+            version: Version of the export, see `template_version`.
+
+        Returns:
+            New in-memory files with their names, or None if the model
+            is not cached.
+        """
+        entry = self._entry_path(self.key(model_type, oid, version))
+        try:
+            with open(entry) as f:
+                files = json.load(f)
+            contents = [(self.directory / OBJECTS_DIR / file['digest'])
+                        .read_text(encoding='utf-8') for file in files]
+        except FileNotFoundError:
+            return None
+
+        # the modification time of the entry is the last access
+        os.utime(entry)
+
+        buffers = []
+        for file, content in zip(files, contents):
+            buffer = io.StringIO(content)
+            if file['name'] is not None:
+                buffer.name = file['name']
+            buffers.append(buffer)
+        return buffers
+
+    def put(self,
+            model_type: str,
+            oid: int,
+            version: str,
+            files: list[io.StringIO]) -> None:
+        """Cache the exported files of a model.
+
+        Args:
+            model_type: Type of the model, e.g. 'exposure'.
+            oid: OID of the model.
+            version: Version of the export, see `template_version`.
+            files: In-memory files as exported, their names are kept.
+        """
+        listing = []
+        for file in files:
+            content = file.getvalue().encode('utf-8')
+            digest = hashlib.sha256(content).hexdigest()
+            self._write(self.directory / OBJECTS_DIR / digest, content)
+            listing.append({'name': getattr(file, 'name', None),
+                            'digest': digest,
+                            'size': len(content)})
+
+        self._write(self._entry_path(self.key(model_type, oid, version)),
+                    json.dumps(listing).encode())
+        self.evict()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.directory / ENTRIES_DIR / f'{key}.json'
+
+    def _write(self, path: Path, content: bytes) -> None:
+        # written completely before it can be read by its name
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def entries(self) -> list[dict]:
+        """List the cached models, least recently used first."""
+        entries = []
+        for path in (self.directory / ENTRIES_DIR).glob('*.json'):
+            try:
+                with open(path) as f:
+                    files = json.load(f)
+                last_access = path.stat().st_mtime
+            except FileNotFoundError:
+                continue  # removed concurrently
+            entries.append({
+                'key': path.stem,
+                'digests': {file['digest'] for file in files},
+                'size': sum(file['size'] for file in files),
+                'last_access': last_access})
+        return sorted(entries, key=lambda e: e['last_access'])
+
+    def size(self) -> int:
+        """Size of the stored file contents in bytes."""
+        return sum(path.stat().st_size
+                   for path in (self.directory / OBJECTS_DIR).iterdir())
+
+    def _remove(self, keys: list[str]) -> None:
+        for key in keys:
+            self._entry_path(key).unlink(missing_ok=True)
+
+        # file contents which are no longer listed by any entry
+        referenced = set().union(*(e['digests'] for e in self.entries()))
+        for path in (self.directory / OBJECTS_DIR).iterdir():
+            if path.name not in referenced \
+                    and not path.name.startswith('.'):
+                path.unlink(missing_ok=True)
+
+    def evict(self) -> list[str]:
+        """Remove least recently used entries above the size limit.
+
+        Returns:
+            Keys of the removed entries.
+        """
+        entries = self.entries()
+        total = self.size()
+        removed = []
+        for entry in entries:
+            if total <= self.max_size:
+                break
+            removed.append(entry['key'])
+            # file contents shared with other entries are kept
+            shared = set().union(*(e['digests'] for e in entries
+                                   if e['key'] not in removed))
+            total -= sum(
+                (self.directory / OBJECTS_DIR / digest).stat().st_size
+                for digest in entry['digests'] - shared
+                if (self.directory / OBJECTS_DIR / digest).exists())
+        if removed:
+            self._remove(removed)
+        return removed
+
+    def purge(self,
+              model_type: str | None = None,
+              oid: int | None = None,
+              older_than: float | None = None) -> list[str]:
+        """Remove cached entries.
+
+        Args:
+            model_type: Only remove the entries of this model type.
+            oid: Only remove the entries of models with this oid in
+                the database of the cache.
+            older_than: Only remove entries not accessed for this
+                many seconds.
+
+        Returns:
+            Keys of the removed entries.
+        """
+        removed = []
+        for entry in self.entries():
+            entry_type, _, rest = entry['key'].rpartition('_')
+            entry_oid, entry_database, _ = rest.split('-')
+            if model_type is not None and entry_type != model_type:
+                continue
+            if oid is not None and (entry_oid, entry_database) != \
+                    (str(oid), self.database):
+                continue
+            if older_than is not None and \
+                    time.time() - entry['last_access'] < older_than:
+                continue
+            removed.append(entry['key'])
+        self._remove(removed)
+        return removed
@@ -1,52 +1,82 @@
 import os
 import xml.etree.ElementTree as ET
+from collections.abc import Iterator
 from pathlib import Path
 from typing import TextIO
 
 import geopandas as gpd
+import numpy as np
 import pandas as pd
 import shapely
 from shapely.geometry.multipolygon import MultiPolygon
 from shapely.geometry.polygon import Polygon
 
-from reia.io import ASSETS_COLS_MAPPING
+from reia.config.settings import get_settings
+from reia.io import ASSETS_COLS_DTYPES, ASSETS_COLS_MAPPING
 from reia.schemas.exposure_schema import ExposureModel
 from reia.schemas.fragility_schemas import FragilityModel
 from reia.schemas.vulnerability_schemas import VulnerabilityModel
 from reia.utils import clean_array
 
 
-def parse_exposure_assets(file: TextIO, tagnames: list[str]) -> pd.DataFrame:
-    """Reads an exposure file with assets into a dataframe.
+def iter_exposure_assets(file: TextIO,
+                         tagnames: list[str],
+                         chunksize: int) -> Iterator[pd.DataFrame]:
+    """Reads an exposure file with assets in chunks of rows.
+
+    The columns are parsed with the types declared in
+    `ASSETS_COLS_DTYPES`, taxonomies and aggregation tags as categoricals.
+    Columns which are neither asset values nor one of `tagnames` are
+    not parsed.
 
     Args:
         file: csv file object with headers (Input OpenQuake):
               id,lon,lat,taxonomy,number,structural,contents,day(
               CantonGemeinde,CantonGemeindePC, ...)
         tagnames: List of tag names to include.
+        chunksize: Number of rows per chunk.
 
-    Returns:
-        df with columns for datamodel.Assets object + lat and lon.
+    Yields:
+        dfs with columns for datamodel.Assets object + lat and lon.
     """
-
-    df = pd.read_csv(file, index_col='id')
-
     lonlat = {'lon': 'longitude',
               'lat': 'latitude'}
 
-    df = df.rename(
-        columns={
-            k: v for k,
-            v in {
-                **ASSETS_COLS_MAPPING,
-                **lonlat}.items() if k in df and v not in df})
+    mapping = {**ASSETS_COLS_MAPPING, **lonlat}
 
-    valid_cols = list(ASSETS_COLS_MAPPING.values()) + \
-        tagnames + list(lonlat.values())
+    # columns may be named as in the OpenQuake input or as the targets
+    valid_cols = ['id', *mapping, *mapping.values(), *tagnames]
+    dtypes = {**ASSETS_COLS_DTYPES,
+              **{v: ASSETS_COLS_DTYPES[k] for k, v in mapping.items()},
+              **{t: 'category' for t in tagnames}}
 
-    df.drop(columns=df.columns.difference(valid_cols), inplace=True)
+    reader = pd.read_csv(file,
+                         index_col='id',
+                         usecols=lambda c: c in valid_cols,
+                         dtype=dtypes,
+                         chunksize=chunksize)
 
-    return df
+    with reader:
+        for df in reader:
+            yield df.rename(columns={
+                k: v for k, v in mapping.items() if k in df and v not in df})
+
+
+def parse_exposure_assets(file: TextIO, tagnames: list[str]) -> pd.DataFrame:
+    """Reads an exposure file with assets into a dataframe.
+
+    Args:
+        file: csv file object with headers (Input OpenQuake):
+              id,lon,lat,taxonomy,number,structural,contents,day(
+              CantonGemeinde,CantonGemeindePC, ...)
+        tagnames: List of tag names to include.
+
+    Returns:
+        df with columns for datamodel.Assets object + lat and lon.
+    """
+    return pd.concat(
+        iter_exposure_assets(file, tagnames,
+                             get_settings().exposure_chunk_size))
 
 
 def parse_exposure_metadata(file: TextIO
@@ -219,21 +249,46 @@ def parse_shapefile_geometries(
     return gdf
 
 
-def _extract_sites(assets: pd.DataFrame) -> tuple[pd.DataFrame, list[int]]:
+def _factorize_columns(*columns: pd.Series) -> tuple[np.ndarray,
+                                                     np.ndarray]:
+    """Factorize rows of several columns without building tuples.
+
+    Every column is factorized on its own, the codes are then combined
+    by offsetting them with the number of uniques of the next columns.
+
+    Args:
+        columns: Columns of equal length, without missing values.
+
+    Returns:
+        Codes of the unique rows in order of appearance and the position
+        of the first occurrence of every unique row.
+    """
+    combined = np.zeros(len(columns[0]), dtype=np.int64)
+    for column in columns:
+        codes, uniques = pd.factorize(column)
+        combined = combined * len(uniques) + codes
+
+    codes, _ = pd.factorize(combined)
+    _, first = np.unique(codes, return_index=True)
+    return codes, first
+
+
+def _extract_sites(assets: pd.DataFrame) -> tuple[pd.DataFrame, np.ndarray]:
     """Extract sites from assets dataframe.
 
     Args:
         assets: Dataframe of assets with 'longitude' and 'latitude' column.
 
     Returns:
-        DataFrame of `n` unique Sites and list of `len(assets)` indices
+        DataFrame of `n` unique Sites and array of `len(assets)` indices
         mapping each asset to its corresponding site.
     """
-    site_keys = list(zip(assets['longitude'], assets['latitude']))
-    group_indices, unique_keys = pd.factorize(site_keys)
-    unique_sites = pd.DataFrame(unique_keys.tolist(),
-                                columns=['longitude', 'latitude'])
-    return unique_sites, group_indices.tolist()
+    group_indices, first = _factorize_columns(assets['longitude'],
+                                              assets['latitude'])
+    unique_sites = pd.DataFrame({
+        'longitude': assets['longitude'].to_numpy()[first],
+        'latitude': assets['latitude'].to_numpy()[first]})
+    return unique_sites, group_indices
 
 
 def _normalize_tags(df: pd.DataFrame,
@@ -241,101 +296,141 @@ def _normalize_tags(df: pd.DataFrame,
                     tag_cols: list[str]) -> tuple[pd.DataFrame,
                                                   pd.DataFrame,
                                                   pd.DataFrame]:
-    """Split a DataFrame into asset values and normalized tags."""
-    asset_df = df[asset_cols].copy()
+    """Split a DataFrame into asset values and normalized tags.
 
-    # Melt tag columns into long format
-    tag_df = (
-        df[tag_cols]
-        .reset_index(drop=True)
-        .melt(ignore_index=False, var_name='type', value_name='name')
-        .reset_index().rename(columns={'index': 'asset'})
-    )
-
-    tag_table, mapping_df = _normalize_tag_pairs(tag_df)
-    return asset_df, tag_table, mapping_df
+    The tags of every type column are factorized on their own, the tag
+    codes of a type are offset by the number of tags of the previous
+    types. Assets without a tag of a type are not associated with it.
 
+    Args:
+        df: DataFrame of assets with one column per aggregation type.
+        asset_cols: Columns of the asset values.
+        tag_cols: Aggregation type columns.
 
-def _normalize_tag_pairs(
-        tag_df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
-    """Normalize (type, name) pairs using pd.factorize."""
-    tag_idx, unique_tags = pd.factorize(
-        list(zip(tag_df['type'], tag_df['name'])))
-    tag_table = pd.DataFrame(unique_tags.tolist(), columns=['type', 'name'])
+    Returns:
+        Asset values, unique (type, name) tags and the association of
+        the assets, by position in `df`, with the position of their tags.
+    """
+    asset_df = df[asset_cols].copy()
 
-    mapping_df = tag_df[['asset', 'type']].copy()
-    mapping_df['aggregationtag'] = tag_idx
-    mapping_df.rename(columns={'type': 'aggregationtype'}, inplace=True)
+    codes = []
+    names = []
+    offset = 0
+    for col in tag_cols:
+        tag_codes, uniques = pd.factorize(df[col])
+        codes.append(np.where(tag_codes == -1, -1, tag_codes + offset))
+        names.append(np.asarray(uniques, dtype=object))
+        offset += len(uniques)
+
+    tag_table = pd.DataFrame({
+        'type': np.repeat(np.asarray(tag_cols, dtype=object),
+                          [len(n) for n in names]),
+        'name': np.concatenate(names) if names else np.empty(0, object)})
+
+    # one row per asset and type, types are the outer loop
+    mapping_df = pd.DataFrame({
+        'asset': np.tile(np.arange(len(df), dtype=np.int64), len(tag_cols)),
+        'aggregationtype': np.repeat(np.asarray(tag_cols, dtype=object),
+                                     len(df)),
+        'aggregationtag': np.concatenate(codes) if codes
+        else np.empty(0, np.int64)})
+    mapping_df = mapping_df[
+        mapping_df['aggregationtag'].to_numpy() != -1].reset_index(drop=True)
 
-    return tag_table, mapping_df
+    return asset_df, tag_table, mapping_df
 
 
-def _try_convert_numeric(df: pd.DataFrame) -> pd.DataFrame:
-    """Try to convert all columns in the DataFrame to numeric types.
+def _merge_unique(known: pd.MultiIndex | None,
+                  unique: pd.DataFrame
+                  ) -> tuple[pd.MultiIndex, pd.DataFrame, np.ndarray]:
+    """Merge the unique rows of a chunk into the rows of previous chunks.
 
     Args:
-        df: Input DataFrame.
+        known: Unique rows of the previous chunks, None for the first.
+        unique: Unique rows of the current chunk.
 
     Returns:
-        DataFrame with numeric columns converted, non-numeric columns intact.
+        The updated known rows, the rows of `unique` which were not known
+        yet and the position of every row of `unique` in the known rows.
     """
-    out = df.copy()
-    for c in out.columns:
-        try:
-            s = pd.to_numeric(out[c])
-        except (ValueError, TypeError):
-            continue  # leave non-numeric columns alone
-
-        # If it's float but all non-NA values are integer-like, use Int64
-        if pd.api.types.is_float_dtype(s) and s.dropna().mod(1).eq(0).all():
-            s = s.astype("Int64")
-
-        out[c] = s
-    return out
+    keys = pd.MultiIndex.from_frame(unique)
+    if known is None:
+        known = keys[:0]
+
+    positions = known.get_indexer(keys)
+    new = positions == -1
+    positions[new] = len(known) + np.arange(new.sum())
+
+    return known.append(keys[new]), \
+        unique[new].reset_index(drop=True), positions
+
+
+def _iter_exposure_chunks(assets_path: str,
+                          tagnames: list[str],
+                          chunksize: int
+                          ) -> Iterator[tuple[pd.DataFrame, pd.DataFrame,
+                                              pd.DataFrame, pd.DataFrame]]:
+    """Parse the assets file in chunks of database-ready DataFrames.
+
+    Sites and aggregation tags are only returned with the first chunk
+    referencing them. Assets reference their site, and associations
+    their aggregation tag, by the position in the concatenation of the
+    sites, respectively tags, of all chunks. Associations reference
+    their asset by the position in the chunk.
+    """
+    # Asset columns for database insertion
+    asset_cols = list(ASSETS_COLS_MAPPING.values()) + ['_site_oid']
 
+    known_sites = None
+    known_tags = None
 
-def parse_exposure(file: TextIO
-                   ) -> tuple[ExposureModel, pd.DataFrame, pd.DataFrame,
-                              pd.DataFrame, pd.DataFrame]:
-    """Parse exposure file and return database-ready DataFrames.
+    with open(assets_path, 'r') as f:
+        for assets in iter_exposure_assets(f, tagnames, chunksize):
+            # Get aggregation types from the DataFrame
+            aggregation_types = [
+                x for x in assets.columns if x not in list(
+                    ASSETS_COLS_MAPPING.values()) + ['longitude', 'latitude']]
+
+            # Extract sites and get site mapping
+            sites, site_idx = _extract_sites(assets)
+            known_sites, sites, positions = _merge_unique(known_sites, sites)
+            assets['_site_oid'] = positions[site_idx]
+
+            # Normalize aggregation tags
+            assets_clean, aggregationtags, assoc_table = _normalize_tags(
+                assets, asset_cols, aggregation_types)
+            known_tags, aggregationtags, positions = _merge_unique(
+                known_tags, aggregationtags)
+            assoc_table['aggregationtag'] = \
+                positions[assoc_table['aggregationtag'].to_numpy()]
+
+            yield sites, assets_clean, aggregationtags, assoc_table
+
+
+def parse_exposure(file: TextIO,
+                   chunksize: int | None = None
+                   ) -> tuple[ExposureModel,
+                              Iterator[tuple[pd.DataFrame, pd.DataFrame,
+                                             pd.DataFrame, pd.DataFrame]]]:
+    """Parse exposure file into chunks of database-ready DataFrames.
 
     Args:
         file: Open file object containing exposure XML.
+        chunksize: Number of assets per chunk, defaults to
+            `REIASettings.exposure_chunk_size`.
 
     Returns:
         Tuple containing:
         - ExposureModel pydantic object
-        - Sites DataFrame ready for database insertion
-        - Assets DataFrame ready for database insertion
-        - AggregationTags DataFrame ready for database insertion
-        - Asset-Tag association DataFrame ready for database insertion
+        - Iterator over chunks of (sites, assets, aggregationtags,
+          asset-tag associations) DataFrames ready for database
+          insertion, the assets file is read while iterating.
     """
     # Parse the exposure file
     exposure_model, assets_path = parse_exposure_metadata(file)
 
-    with open(assets_path, 'r') as f:
-        assets = parse_exposure_assets(f, exposure_model.aggregationtypes)
-
-    # Get aggregation types from the DataFrame
-    aggregation_types = [
-        x for x in assets.columns if x not in list(
-            ASSETS_COLS_MAPPING.values()) + ['longitude', 'latitude']]
-
-    # Asset columns for database insertion
-    asset_cols = list(ASSETS_COLS_MAPPING.values()) + ['_site_oid']
-
-    # Extract sites and get site mapping
-    sites, assets['_site_oid'] = _extract_sites(assets)
-
-    # Normalize aggregation tags
-    assets_clean, aggregationtags, assoc_table = _normalize_tags(
-        assets, asset_cols, aggregation_types)
-
-    # convert columns to numeric if possible, keeps non-numeric columns intact
-
-    assets_clean = _try_convert_numeric(assets_clean)
-    sites = _try_convert_numeric(sites)
-    aggregationtags = _try_convert_numeric(aggregationtags)
-    assoc_table = _try_convert_numeric(assoc_table)
+    chunks = _iter_exposure_chunks(
+        assets_path, exposure_model.aggregationtypes,
+        chunksize or get_settings().exposure_chunk_size)
 
-    return exposure_model, sites, assets_clean, aggregationtags, assoc_table
+    return exposure_model, chunks
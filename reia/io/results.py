@@ -1,13 +1,152 @@
-from operator import attrgetter
+from collections.abc import Iterator
 
+import numpy as np
 import pandas as pd
 from openquake.commonlib.datastore import DataStore
 from openquake.risklib.scientific import LOSSTYPE
 
 from reia.config.settings import get_settings
 from reia.io import RISK_COLUMNS_MAPPING
+from reia.schemas.asset_schemas import AggregationTag
 from reia.schemas.calculation_schemas import CalculationBranch
-from reia.schemas.enums import ELossCategory, ERiskType
+from reia.schemas.enums import ELossCategory, EResultsLayout, ERiskType
+
+LOSSCATEGORY_NAMES = [c.name for c in ELossCategory]
+
+# Columns of the risk values stored with the EVENTARRAY layout
+EVENT_ARRAY_COLUMNS = ['_calculation_oid', 'losscategory', 'aggregationtype',
+                       'aggregationtag', 'quantity', 'weight', 'riskvalues',
+                       'weights']
+
+# Version of the output of `iter_risk_from_datastore`, invalidates the
+# cached results when increased.
+RESULTS_TRANSFORM_VERSION = 4
+
+
+def _event_weights(dstore: DataStore) -> np.ndarray:
+    """Weight of every event, indexed by event id.
+
+    Events have an associated weight which comes from the realization
+    weight, divided by the number of ground motion fields.
+    """
+    weights = dstore['weights'][:]
+    events = dstore['events'][:]
+
+    event_weights = np.zeros(events['id'].max() + 1)
+    event_weights[events['id']] = weights[events['rlz_id']] / \
+        dstore['oqparam'].number_of_ground_motion_fields
+    return event_weights
+
+
+def _losscategory_codes(loss_ids: np.ndarray,
+                        loss_types: list[str]) -> np.ndarray:
+    """Translate OpenQuake loss ids to codes into `LOSSCATEGORY_NAMES`."""
+    lookup = np.full(len(loss_types), -1, dtype=np.int8)
+    for loss_id in np.unique(loss_ids):
+        lookup[loss_id] = LOSSCATEGORY_NAMES.index(
+            ELossCategory[loss_types[loss_id].upper()].name)
+    return lookup[loss_ids]
+
+
+def _loss_categories(loss_types: list[str]) -> list[str]:
+    """`ELossCategory` names of the OpenQuake loss types."""
+    return [name for name in LOSSCATEGORY_NAMES
+            if name.lower() in loss_types]
+
+
+def extract_metadata_from_datastore(dstore: DataStore) -> dict:
+    """Extract the information about a calculation needed for storage.
+
+    Args:
+        dstore: OpenQuake datastore containing calculation results
+
+    Returns:
+        Dictionary with the `calculation_mode`, the `aggregation_types`,
+        the `loss_categories` and the total `event_weight` of all events.
+    """
+    oqparam = dstore['oqparam']
+    return {
+        'calculation_mode': oqparam.calculation_mode,
+        # Flatten and deduplicate types
+        'aggregation_types': list(
+            {it for sub in oqparam.aggregate_by for it in sub}),
+        'loss_categories': _loss_categories(oqparam.loss_types),
+        'event_weight': float(_event_weights(dstore).sum())
+    }
+
+
+def drop_zero_losses(risk_values: pd.DataFrame) -> pd.DataFrame:
+    """Drop the risk values whose loss is 0.
+
+    The statistics treat the weight of missing events as zero values, so
+    the dropped rows don't change them.
+    """
+    mask = risk_values['loss_value'].to_numpy() != 0
+    if mask.all():
+        return risk_values
+    return risk_values.loc[mask].reset_index(drop=True)
+
+
+def iter_risk_from_datastore(dstore: DataStore,
+                             risk_type: ERiskType,
+                             chunk_size: int | None = None,
+                             start_chunk: int = 0
+                             ) -> Iterator[pd.DataFrame]:
+    """Extract risk data from OpenQuake datastore in bounded slices.
+
+    `risk_by_event` is read `chunk_size` rows at a time, so that the
+    memory needed does not depend on the size of the calculation.
+
+    Args:
+        dstore: OpenQuake datastore containing calculation results
+        risk_type: Type of risk calculation (LOSS or DAMAGE)
+        chunk_size: Number of `risk_by_event` rows read per slice,
+            defaults to `REIASettings.results_chunk_size`
+        start_chunk: Index of the first slice to read.
+
+    Yields:
+        DataFrames with processed risk values, one per slice, empty if
+        the slice contains no values.
+        `aggregationkey` is the OpenQuake `agg_id` and `losscategory`
+        is categorical over the `ELossCategory` names.
+    """
+    config = get_settings()
+    chunk_size = chunk_size or config.results_chunk_size
+
+    n_agg_keys = len(dstore['agg_keys'])
+    event_weights = _event_weights(dstore)
+
+    if config.oq_version >= 15:
+        loss_types = LOSSTYPE
+    else:
+        loss_types = dstore['oqparam'].loss_types
+
+    cols_mapping = RISK_COLUMNS_MAPPING[risk_type]
+    n_rows = len(dstore['risk_by_event/agg_id'])
+
+    for start in range(start_chunk * chunk_size, n_rows, chunk_size):
+        df = dstore.read_df('risk_by_event',
+                            slc=slice(start, min(start + chunk_size, n_rows)))
+        df = df.rename(columns=cols_mapping)[cols_mapping.values()]
+
+        # risk by event contains more agg_id's than keys which
+        # are used to store the total per agg value. Remove them.
+        mask = df['aggregationkey'].to_numpy() != n_agg_keys
+
+        if risk_type == ERiskType.DAMAGE:
+            damages = df[['dg1_value', 'dg2_value', 'dg3_value',
+                          'dg4_value', 'dg5_value']].to_numpy()
+            mask &= (damages > 0).any(axis=1)
+
+        df = df.loc[mask].reset_index(drop=True)
+
+        df['losscategory'] = pd.Categorical.from_codes(
+            _losscategory_codes(df['losscategory'].to_numpy(), loss_types),
+            categories=LOSSCATEGORY_NAMES)
+
+        df['weight'] = event_weights[df['eventid'].to_numpy()]
+
+        yield df
 
 
 def extract_risk_from_datastore(dstore: DataStore,
@@ -21,89 +160,281 @@ def extract_risk_from_datastore(dstore: DataStore,
     Returns:
         DataFrame with processed risk values
     """
-    all_agg_keys = [d.decode().split(',')
-                    for d in dstore['agg_keys'][:]]
+    chunks = list(iter_risk_from_datastore(dstore, risk_type))
+    if not chunks:
+        return pd.DataFrame(
+            columns=RISK_COLUMNS_MAPPING[risk_type].values())
+    return pd.concat(chunks, ignore_index=True)
 
-    df = dstore.read_df('risk_by_event')  # get risk_by_event
 
-    weights = dstore['weights'][:]
-    events = dstore.read_df('events', 'id')[['rlz_id']]
+def build_aggregation_lookup(
+        agg_keys: np.ndarray,
+        aggregation_tags: list[AggregationTag]
+) -> tuple[np.ndarray, pd.DataFrame]:
+    """Build a lookup from OpenQuake `agg_id` to aggregation tags.
 
-    # risk by event contains more agg_id's than keys which
-    # are used to store the total per agg value. Remove them.
-    df = df.loc[df['agg_id'] != len(all_agg_keys)]
-    cols_mapping = RISK_COLUMNS_MAPPING[risk_type]
-    df = df.rename(columns=cols_mapping)[cols_mapping.values()]
+    The lookup is stored in compressed sparse row layout: the tags of
+    `agg_id` are the rows `offsets[agg_id]:offsets[agg_id + 1]` of the
+    returned DataFrame.
 
-    if get_settings().oq_version >= 15:
-        loss_types = LOSSTYPE
-    else:
-        loss_types = dstore['oqparam'].loss_types
+    Args:
+        agg_keys: The `agg_keys` dataset of the OpenQuake datastore,
+            comma separated tag names as bytes.
+        aggregation_tags: Aggregation tags of the exposure model.
 
-    df['losscategory'] = df['losscategory'].map(
-        lambda x: ELossCategory[loss_types[x].upper()])
+    Returns:
+        Tuple of (offsets, tags), where tags has the columns
+        `aggregationtag` (tag oid) and `aggregationtype` (categorical).
 
-    df['aggregationtags'] = df['aggregationtags'].map(
-        all_agg_keys.__getitem__)
+    Raises:
+        ValueError: If a tag name of the agg_keys is not known.
+    """
+    keys = [k.decode().split(',') for k in agg_keys]
+    counts = np.fromiter((len(k) for k in keys), dtype=np.int64,
+                         count=len(keys))
+    offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
 
-    # events have an associated weight which comes from the branch weight
-    events['weight'] = events['rlz_id'].map(weights.__getitem__)
+    # same semantics as a dict by name: the last tag of a name wins
+    tags = pd.DataFrame({
+        'name': [t.name for t in aggregation_tags],
+        'aggregationtag': np.array([t.oid for t in aggregation_tags],
+                                   dtype=np.int64),
+        'aggregationtype': pd.Categorical(
+            [t.type for t in aggregation_tags])}) \
+        .drop_duplicates('name', keep='last') \
+        .set_index('name')
 
-    df['weight'] = df['eventid'].map(events['weight']) / \
-        dstore['oqparam'].number_of_ground_motion_fields
+    flat_names = [name for k in keys for name in k]
+    indexer = tags.index.get_indexer(flat_names)
+    if (indexer == -1).any():
+        missing = sorted({n for n, i in zip(flat_names, indexer) if i == -1})
+        raise ValueError(f'Unknown aggregation tags in results: {missing}')
+
+    return offsets, tags.iloc[indexer].reset_index(drop=True)
+
+
+def _expand_to_tags(agg_keys: np.ndarray,
+                    offsets: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Pair every risk value with each of the tags of its `agg_id`.
+
+    Returns:
+        Tuple of (risk value rows, tag rows) with one entry per pair.
+    """
+    starts = offsets[agg_keys]
+    counts = offsets[agg_keys + 1] - starts
+    rows = np.repeat(np.arange(len(agg_keys)), counts)
+    tag_rows = np.repeat(starts - (np.cumsum(counts) - counts), counts) \
+        + np.arange(counts.sum())
+    return rows, tag_rows
+
+
+def _tag_clustered_order(
+        agg_keys: np.ndarray,
+        eventids: np.ndarray,
+        aggregation_lookup: tuple[np.ndarray, pd.DataFrame]) -> np.ndarray:
+    """Order of risk values which stores the values of a tag together.
+
+    The values are sorted by the (aggregationtype, aggregationtag) of the
+    first tag of their `agg_id`, then by `agg_id` and event id.
+    """
+    offsets, tags = aggregation_lookup
+    first = offsets[:-1]
+    n_keys = len(first)
+    key_rank = np.empty(n_keys, dtype=np.int64)
+    key_rank[np.lexsort((
+        np.arange(n_keys),
+        tags['aggregationtag'].to_numpy()[first],
+        tags['aggregationtype'].cat.codes.to_numpy()[first]))] = \
+        np.arange(n_keys)
+    return np.lexsort((eventids, key_rank[agg_keys]))
+
+
+def prepare_aggregation_keys_for_storage(
+        calculationbranch: CalculationBranch,
+        aggregation_lookup: tuple[np.ndarray, pd.DataFrame]
+) -> pd.DataFrame:
+    """Prepare the aggregation key dictionary for database storage.
 
-    if risk_type == ERiskType.DAMAGE:
-        df = df[(df['dg1_value'] > 0)
-                | (df['dg2_value'] > 0)
-                | (df['dg3_value'] > 0)
-                | (df['dg4_value'] > 0)
-                | (df['dg5_value'] > 0)]
+    Args:
+        calculationbranch: The calculation branch object
+        aggregation_lookup: Lookup from `agg_id` to aggregation tags as
+            returned by `build_aggregation_lookup`
 
-    return df
+    Returns:
+        DataFrame with one row per (aggregation key, aggregation tag).
+    """
+    offsets, tags = aggregation_lookup
+    return pd.DataFrame({
+        '_calculation_oid': calculationbranch.calculation_oid,
+        '_calculationbranch_oid': calculationbranch.oid,
+        'aggregationkey': np.repeat(np.arange(len(offsets) - 1),
+                                    np.diff(offsets)),
+        'aggregationtag': tags['aggregationtag'].to_numpy(),
+        'aggregationtype': tags['aggregationtype'].values
+    })
 
 
 def prepare_risk_data_for_storage(
         risk_values: pd.DataFrame,
         calculationbranch: CalculationBranch,
         risk_type: ERiskType,
-        aggregation_tag_by_name: dict) -> tuple[pd.DataFrame, pd.DataFrame]:
+        aggregation_lookup: tuple[np.ndarray, pd.DataFrame],
+        layout: EResultsLayout = EResultsLayout.ASSOCIATION
+) -> tuple[pd.DataFrame, pd.DataFrame | None]:
     """Prepare risk data for database storage.
 
     Args:
         risk_values: Raw risk values DataFrame from OpenQuake extraction
         calculationbranch: The calculation branch object
         risk_type: Type of risk calculation (LOSS or DAMAGE)
-        aggregation_tag_by_name: Dictionary mapping tag names to tag objects
+        aggregation_lookup: Lookup from `agg_id` to aggregation tags as
+            returned by `build_aggregation_lookup`
+        layout: Storage layout of the calculation. With AGGREGATIONKEY
+            the `aggregationkey` is kept on the risk values and no
+            aggregation mappings are created.
 
     Returns:
         Tuple of (processed_risk_values, aggregation_mappings) ready for
-        database insertion
+        database insertion, aggregation_mappings is None with the
+        AGGREGATIONKEY layout.
     """
-    # Create a copy to avoid modifying the original
-    risk_values = risk_values.copy()
-    # Add calculation metadata
-    risk_values['weight'] *= calculationbranch.weight
+    offsets, tags = aggregation_lookup
+    n_values = len(risk_values)
+
+    # the webservice reads the values per tag, store them clustered
+    risk_values = risk_values.take(_tag_clustered_order(
+        risk_values['aggregationkey'].to_numpy(),
+        risk_values['eventid'].to_numpy(),
+        aggregation_lookup)).reset_index(drop=True)
+
+    agg_keys = risk_values['aggregationkey'].to_numpy()
+    losscategory = risk_values['losscategory'].values
+    oids = np.arange(1, n_values + 1, dtype=np.int64)
+
+    # Add calculation metadata, the weights are stored per event
+    risk_values = risk_values.drop(
+        columns=['weight', 'aggregationkey']
+        if layout == EResultsLayout.ASSOCIATION else ['weight'])
     risk_values['_calculation_oid'] = calculationbranch.calculation_oid
     risk_values['_calculationbranch_oid'] = calculationbranch.oid
     risk_values['_type'] = risk_type.name
-    risk_values['losscategory'] = risk_values['losscategory'].map(
-        attrgetter('name'))
-    risk_values['_oid'] = pd.RangeIndex(start=1, stop=len(risk_values) + 1)
+    risk_values['_oid'] = oids
+
+    if layout == EResultsLayout.AGGREGATIONKEY:
+        return risk_values, None
+
+    # Build many-to-many reference table, one row per
+    # (risk value, aggregation tag) pair
+    rows, tag_rows = _expand_to_tags(agg_keys, offsets)
+
+    # sorted like the index on the association partitions
+    order = np.lexsort((
+        rows,
+        tags['aggregationtag'].to_numpy()[tag_rows],
+        tags['aggregationtype'].cat.codes.to_numpy()[tag_rows]))
+    rows, tag_rows = rows[order], tag_rows[order]
 
-    # Build many-to-many reference table
     df_agg_val = pd.DataFrame({
-        'riskvalue': risk_values['_oid'],
-        'aggregationtag': risk_values.pop('aggregationtags'),
-        '_calculation_oid': risk_values['_calculation_oid'],
-        'losscategory': risk_values['losscategory']
+        'riskvalue': oids[rows],
+        'aggregationtag': tags['aggregationtag'].to_numpy()[tag_rows],
+        '_calculation_oid': calculationbranch.calculation_oid,
+        'losscategory': losscategory.take(rows),
+        'aggregationtype': tags['aggregationtype'].values.take(tag_rows)
     })
 
-    # Explode aggregation tags (list -> rows)
-    df_agg_val = df_agg_val.explode('aggregationtag', ignore_index=True)
+    return risk_values, df_agg_val
 
-    # Map to tag object
-    tag_objs = df_agg_val['aggregationtag'].map(aggregation_tag_by_name)
-    df_agg_val['aggregationtype'] = tag_objs.map(attrgetter('type'))
-    df_agg_val['aggregationtag'] = tag_objs.map(attrgetter('oid'))
 
-    return risk_values, df_agg_val
+def prepare_events_for_storage(
+        risk_values: pd.DataFrame,
+        calculationbranch: CalculationBranch) -> pd.DataFrame:
+    """Prepare the events of risk values for database storage.
+
+    Args:
+        risk_values: Raw risk values DataFrame from OpenQuake extraction
+        calculationbranch: The calculation branch object
+
+    Returns:
+        DataFrame with one row per event id, the event weight multiplied
+        by the branch weight.
+    """
+    eventids, first = np.unique(risk_values['eventid'].to_numpy(),
+                                return_index=True)
+    return pd.DataFrame({
+        '_calculation_oid': calculationbranch.calculation_oid,
+        '_calculationbranch_oid': calculationbranch.oid,
+        'eventid': eventids,
+        'weight': risk_values['weight'].to_numpy()[first]
+        * calculationbranch.weight
+    })
+
+
+def prepare_event_arrays_for_storage(
+        risk_values: pd.DataFrame,
+        calculationbranch: CalculationBranch,
+        risk_type: ERiskType,
+        aggregation_lookup: tuple[np.ndarray, pd.DataFrame]
+) -> pd.DataFrame:
+    """Prepare the risk values of a branch for the EVENTARRAY layout.
+
+    The values of every loss category, aggregation tag and quantity are
+    collected into one array sorted by value, with the weights of the
+    values in the same order. The arrays of several chunks are merged
+    by `RiskValueRepository.merge_event_arrays`.
+
+    Args:
+        risk_values: Raw risk values of a chunk of the calculation branch
+        calculationbranch: The calculation branch object
+        risk_type: Type of risk calculation (LOSS or DAMAGE)
+        aggregation_lookup: Lookup from `agg_id` to aggregation tags as
+            returned by `build_aggregation_lookup`
+
+    Returns:
+        DataFrame with one row per (losscategory, aggregationtag,
+        quantity), the arrays `riskvalues` and `weights` and their total
+        `weight`.
+    """
+    offsets, tags = aggregation_lookup
+    quantities = [c.removesuffix('_value')
+                  for c in RISK_COLUMNS_MAPPING[risk_type].values()
+                  if c.endswith('_value')]
+
+    rows, tag_rows = _expand_to_tags(
+        risk_values['aggregationkey'].to_numpy(), offsets)
+    if len(rows) == 0:
+        return pd.DataFrame(columns=EVENT_ARRAY_COLUMNS)
+
+    losscategory = risk_values['losscategory'].cat.codes.to_numpy()[rows]
+    aggregationtag = tags['aggregationtag'].to_numpy()[tag_rows]
+    weights = risk_values['weight'].to_numpy()[rows] \
+        * calculationbranch.weight
+
+    # the groups are in the same order for every quantity
+    order = np.lexsort((aggregationtag, losscategory))
+    changes = (np.diff(losscategory[order]) != 0) \
+        | (np.diff(aggregationtag[order]) != 0)
+    starts = np.concatenate([[0], np.flatnonzero(changes) + 1])
+    first = order[starts]
+
+    event_arrays = []
+    for quantity in quantities:
+        values = risk_values[f'{quantity}_value'] \
+            .to_numpy(dtype=np.float32)[rows]
+        order = np.lexsort((values, aggregationtag, losscategory))
+        event_arrays.append(pd.DataFrame({
+            '_calculation_oid': calculationbranch.calculation_oid,
+            'losscategory': np.array(LOSSCATEGORY_NAMES,
+                                     dtype=object)[losscategory[first]],
+            'aggregationtype': tags['aggregationtype'].values.take(
+                tag_rows[first]),
+            'aggregationtag': aggregationtag[first],
+            'quantity': quantity,
+            'weight': np.add.reduceat(weights[order], starts),
+            'riskvalues': pd.Series(np.split(values[order], starts[1:]),
+                                    dtype=object),
+            'weights': pd.Series(np.split(
+                weights[order].astype(np.float32), starts[1:]),
+                dtype=object)}))
+
+    return pd.concat(event_arrays, ignore_index=True)
@@ -0,0 +1,212 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from collections.abc import Iterator
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from reia.io.results import RESULTS_TRANSFORM_VERSION
+
+METADATA_FILE = 'metadata.json'
+AGG_KEYS_FILE = 'agg_keys.npy'
+
+
+class ResultsCache:
+    """On-disk cache of the risk values extracted from OpenQuake.
+
+    Every entry holds the output of `iter_risk_from_datastore` for one
+    OpenQuake job of a source and one transform version, one raw column
+    file per column which is memory mapped on read. The least recently
+    used entries are evicted once the cache grows larger than `max_size`
+    bytes.
+    """
+
+    def __init__(self, directory: str | Path, max_size: int):
+        self.directory = Path(directory)
+        self.max_size = max_size
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def key(job_id: int | str, source: str) -> str:
+        digest = hashlib.sha256(source.encode()).hexdigest()[:12]
+        return f'calc_{job_id}-{digest}-v{RESULTS_TRANSFORM_VERSION}'
+
+    def get(self,
+            job_id: int | str,
+            source: str,
+            chunk_size: int | None = None,
+            start_chunk: int = 0
+            ) -> tuple[dict, np.ndarray, Iterator[pd.DataFrame]] | None:
+        """Load the cached risk values of a job.
+
+        Args:
+            job_id: OpenQuake job id.
+            source: Where the job was read from, the URL of the OpenQuake
+                server or the path of the datastore.
+            chunk_size: Number of rows per chunk, the chunks as they were
+                cached if None.
+            start_chunk: Index of the first chunk to load.
+
+        Returns:
+            Tuple of (metadata, agg_keys, risk value chunks), or None if
+            the job is not cached.
+        """
+        path = self.directory / self.key(job_id, source)
+        try:
+            with open(path / METADATA_FILE) as f:
+                metadata = json.load(f)
+        except FileNotFoundError:
+            return None
+        if metadata.get('source') != source:
+            return None
+
+        # the modification time of the metadata is the last access
+        os.utime(path / METADATA_FILE)
+
+        agg_keys = np.load(path / AGG_KEYS_FILE)
+        return metadata, agg_keys, \
+            self._read_chunks(path, metadata, chunk_size, start_chunk)
+
+    def put(self,
+            job_id: int | str,
+            source: str,
+            metadata: dict,
+            agg_keys: np.ndarray,
+            chunks: Iterator[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        """Cache risk value chunks while passing them through.
+
+        The entry is only stored once all chunks have been consumed.
+
+        Args:
+            job_id: OpenQuake job id.
+            source: Where the job was read from, see `get`.
+            metadata: JSON serializable information about the job.
+            agg_keys: The `agg_keys` dataset of the OpenQuake datastore.
+            chunks: Risk values as returned by `iter_risk_from_datastore`.
+
+        Yields:
+            The unchanged risk value chunks.
+        """
+        tmp = Path(tempfile.mkdtemp(dir=self.directory, prefix='.tmp-'))
+        try:
+            columns = {}
+            chunk_rows = []
+            for chunk in chunks:
+                for name, values in chunk.items():
+                    if isinstance(values.dtype, pd.CategoricalDtype):
+                        columns[name] = {
+                            'dtype': values.cat.codes.dtype.str,
+                            'categories': values.cat.categories.tolist()}
+                        values = values.cat.codes
+                    else:
+                        columns[name] = {'dtype': values.dtype.str}
+                    with open(tmp / f'{name}.bin', 'ab') as f:
+                        values.to_numpy().tofile(f)
+                chunk_rows.append(len(chunk))
+                yield chunk
+
+            np.save(tmp / AGG_KEYS_FILE, agg_keys)
+            with open(tmp / METADATA_FILE, 'w') as f:
+                json.dump(metadata | {'source': source,
+                                      'rows': sum(chunk_rows),
+                                      'chunks': chunk_rows,
+                                      'columns': columns}, f)
+
+            try:
+                tmp.rename(self.directory / self.key(job_id, source))
+            except OSError:
+                pass  # cached concurrently
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+        self.evict()
+
+    def _read_chunks(self,
+                     path: Path,
+                     metadata: dict,
+                     chunk_size: int | None,
+                     start_chunk: int) -> Iterator[pd.DataFrame]:
+        n_rows = metadata['rows']
+        if n_rows == 0:
+            return
+
+        columns = {name: np.memmap(path / f'{name}.bin', mode='r',
+                                   dtype=column['dtype'], shape=(n_rows,))
+                   for name, column in metadata['columns'].items()}
+
+        if chunk_size is None:
+            bounds = np.cumsum([0] + metadata['chunks'])
+        else:
+            bounds = np.append(np.arange(0, n_rows, chunk_size), n_rows)
+
+        for start, end in zip(bounds[start_chunk:-1], bounds[start_chunk + 1:]):
+            chunk = {}
+            for name, values in columns.items():
+                values = values[start:end]
+                categories = metadata['columns'][name].get('categories')
+                chunk[name] = values if categories is None else \
+                    pd.Categorical.from_codes(values, categories=categories)
+            yield pd.DataFrame(chunk, copy=False)
+
+    def entries(self) -> list[dict]:
+        """List the cached jobs, least recently used first."""
+        entries = []
+        for path in self.directory.iterdir():
+            metadata_file = path / METADATA_FILE
+            if path.name.startswith('.') or not metadata_file.exists():
+                continue
+            entries.append({
+                'key': path.name,
+                'size': sum(f.stat().st_size for f in path.iterdir()),
+                'last_access': metadata_file.stat().st_mtime})
+        return sorted(entries, key=lambda e: e['last_access'])
+
+    def size(self) -> int:
+        return sum(e['size'] for e in self.entries())
+
+    def evict(self) -> list[str]:
+        """Remove least recently used entries above the size limit.
+
+        Returns:
+            Keys of the removed entries.
+        """
+        entries = self.entries()
+        total = sum(e['size'] for e in entries)
+        removed = []
+        for entry in entries:
+            if total <= self.max_size:
+                break
+            shutil.rmtree(self.directory / entry['key'], ignore_errors=True)
+            total -= entry['size']
+            removed.append(entry['key'])
+        return removed
+
+    def purge(self,
+              job_id: int | str | None = None,
+              older_than: float | None = None) -> list[str]:
+        """Remove cached entries.
+
+        Args:
+            job_id: Only remove the entries of this job.
+            older_than: Only remove entries not accessed for this
+                many seconds.
+
+        Returns:
+            Keys of the removed entries.
+        """
+        removed = []
+        for entry in self.entries():
+            if job_id is not None and \
+                    not entry['key'].startswith(f'calc_{job_id}-'):
+                continue
+            if older_than is not None and \
+                    time.time() - entry['last_access'] < older_than:
+                continue
+            shutil.rmtree(self.directory / entry['key'], ignore_errors=True)
+            removed.append(entry['key'])
+        return removed
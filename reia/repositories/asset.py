@@ -1,3 +1,5 @@
+from collections.abc import Iterable
+
 import numpy as np
 import pandas as pd
 from sqlalchemy import case, delete, func, select, text, true
@@ -8,13 +10,13 @@ from reia.datamodel.asset import AggregationGeometry as AggregationGeometryORM
 from reia.datamodel.asset import AggregationTag as AggregationTagORM
 from reia.datamodel.asset import Asset as AssetORM
 from reia.datamodel.asset import Site as SiteORM
-from reia.datamodel.asset import asset_aggregationtag
+from reia.datamodel.asset import asset_aggregationtag, buildingcount
 from reia.datamodel.exposure import CostType as CostTypeORM
 from reia.datamodel.exposure import ExposureModel as ExposureModelORM
 from reia.repositories import pandas_read_sql
 from reia.repositories.base import repository_factory
-from reia.repositories.utils import (allocate_oids, copy_pooled,
-                                     db_cursor_from_session)
+from reia.repositories.utils import (copy_from_dataframe, copy_pooled,
+                                     db_cursor_from_session, reserve_oids)
 from reia.schemas.asset_schemas import (AggregationGeometry, AggregationTag,
                                         Asset, Site)
 from reia.schemas.exposure_schema import CostType, ExposureModel
@@ -91,7 +93,7 @@ class AssetRepository(repository_factory(
 
     @classmethod
     def insert_many_bulk(cls, session: Session,
-                         assets: pd.DataFrame) -> list[int]:
+                         assets: pd.DataFrame) -> np.ndarray:
         """Bulk insert assets using COPY and pre-allocated OIDs.
 
         Args:
@@ -99,13 +101,14 @@ class AssetRepository(repository_factory(
             assets: DataFrame containing asset data.
 
         Returns:
-            List of OIDs of the inserted assets in the same order as input.
+            Contiguous OIDs of the inserted assets in the same order as input.
         """
         with db_cursor_from_session(session) as cursor:
-            db_indexes = allocate_oids(cursor,
-                                       AssetORM.__table__.name,
-                                       '_oid',
-                                       len(assets))
+            start = reserve_oids(cursor,
+                                 AssetORM.__table__.name,
+                                 '_oid',
+                                 len(assets))
+        db_indexes = start + np.arange(len(assets), dtype=np.int64)
 
         # Create a copy and assign pre-allocated OIDs
         assets_copy = assets.copy()
@@ -117,62 +120,99 @@ class AssetRepository(repository_factory(
         return db_indexes
 
     @classmethod
-    def insert_from_exposuremodel(cls,
-                                  session: Session,
-                                  sites: pd.DataFrame,
-                                  assets: pd.DataFrame,
-                                  aggregationtags: pd.DataFrame,
-                                  assoc_assets_tags: pd.DataFrame
-                                  ) -> tuple[list[int], list[int]]:
+    def insert_from_exposuremodel(
+            cls,
+            session: Session,
+            exposuremodel_oid: int,
+            chunks: Iterable[tuple[pd.DataFrame, pd.DataFrame,
+                                   pd.DataFrame, pd.DataFrame]]
+    ) -> tuple[np.ndarray, np.ndarray]:
         """Insert assets and their associated tags into the database.
+
         Args:
             session: SQLAlchemy session.
-            sites: DataFrame containing site data.
-            assets: DataFrame containing asset data.
-            aggregationtags: DataFrame containing aggregation tags.
-            assoc_assets_tags: DataFrame mapping assets to tags.
+            exposuremodel_oid: OID of the exposure model.
+            chunks: Chunks of (sites, assets, aggregationtags,
+                assoc_assets_tags) as returned by `parse_exposure`. Assets
+                reference sites and associations reference tags by their
+                position over all chunks, associations reference assets
+                by their position in the chunk.
 
         Returns:
-            List of OIDs of the inserted assets and sites.
+            OIDs of the inserted assets and sites.
         """
+        assets_oids = []
+        sites_oids = np.empty(0, dtype=np.int64)
+        tags_oids = np.empty(0, dtype=np.int64)
+
+        for sites, assets, aggregationtags, assoc_assets_tags in chunks:
+            if not sites.empty:
+                # Use bulk insert for sites with pre-allocated OIDs
+                sites['_exposuremodel_oid'] = exposuremodel_oid
+                sites_oids = np.concatenate([
+                    sites_oids,
+                    SiteRepository.insert_many_bulk(session, sites)])
+
+            # Update assets with site OIDs, sites are referenced by their
+            # position
+            assets['_exposuremodel_oid'] = exposuremodel_oid
+            assets['_site_oid'] = sites_oids[assets['_site_oid'].to_numpy()]
+
+            if not aggregationtags.empty:
+                # Upsert aggregation tags, they can exist already
+                aggregationtags['_exposuremodel_oid'] = exposuremodel_oid
+                tags_oids = np.concatenate([
+                    tags_oids,
+                    AggregationTagRepository.insert_many(
+                        session, aggregationtags)])
+
+            # Update associations with tag OIDs using index-based lookup
+            assoc_assets_tags['aggregationtag'] = \
+                tags_oids[assoc_assets_tags['aggregationtag'].to_numpy()]
+
+            # Use bulk insert for assets with pre-allocated OIDs
+            chunk_oids = AssetRepository.insert_many_bulk(session, assets)
+            assets_oids.append(chunk_oids)
+
+            # Update associations with asset OIDs using index-based lookup
+            assoc_assets_tags['asset'] = \
+                chunk_oids[assoc_assets_tags['asset'].to_numpy()]
+
+            # Use bulk insert for associations
+            AssetAggregationTagRepository.insert_many(
+                session, assoc_assets_tags)
+
+        cls.update_building_counts(session, exposuremodel_oid)
+
+        return np.concatenate(assets_oids or [np.empty(0, np.int64)]), \
+            sites_oids
 
-        # Use bulk insert for sites with pre-allocated OIDs
-        sites_oids = SiteRepository.insert_many_bulk(session, sites.copy())
+    @classmethod
+    def update_building_counts(cls, session: Session,
+                               exposuremodel_oid: int) -> None:
+        """Sum up the buildings per aggregation tag of an exposure model.
 
-        # Update assets with site OIDs using index-based mapping
-        assets_copy = assets.copy()
-        site_oid_map = dict(zip(range(len(sites)), sites_oids))
-        assets_copy['_site_oid'] = assets_copy['_site_oid'].map(site_oid_map)
-
-        # Keep using SQLAlchemy approach for aggregation tags
-        # (needed for conflict resolution)
-        tags_oids = AggregationTagRepository.insert_many(
-            session, aggregationtags)
-
-        # Update associations with tag OIDs using index-based mapping
-        assoc_copy = assoc_assets_tags.copy()
-        tag_oid_map = dict(zip(range(len(aggregationtags)), tags_oids))
-        assoc_copy['aggregationtag'] = \
-            assoc_copy['aggregationtag'].map(tag_oid_map)
-
-        # Use bulk insert for assets with pre-allocated OIDs
-        assets_oids = AssetRepository.insert_many_bulk(session, assets_copy)
-
-        # Update associations with asset OIDs using index-based mapping
-        asset_oid_map = dict(zip(range(len(assets)), assets_oids))
-        assoc_copy['asset'] = assoc_copy['asset'].map(asset_oid_map)
-
-        # Use bulk insert for associations
-        AssetAggregationTagRepository.insert_many(session, assoc_copy)
-
-        # Refresh materialized views after asset insertion
-        session.execute(
-            text('REFRESH MATERIALIZED VIEW CONCURRENTLY '
-                 'loss_buildings_per_municipality'))
+        Args:
+            session: SQLAlchemy session.
+            exposuremodel_oid: OID of the exposure model.
+        """
+        session.execute(delete(buildingcount).where(
+            buildingcount.c._exposuremodel_oid == exposuremodel_oid))
+        session.execute(text(f"""
+            INSERT INTO {buildingcount.name} (
+                _exposuremodel_oid, aggregationtype,
+                aggregationtag, buildingcount)
+            SELECT ast._exposuremodel_oid, assoc.aggregationtype,
+                assoc.aggregationtag, SUM(ast.buildingcount)
+            FROM {AssetORM.__table__.name} ast
+            JOIN {asset_aggregationtag.name} assoc
+                ON assoc.asset = ast._oid
+            WHERE ast._exposuremodel_oid = :exposuremodel_oid
+            GROUP BY ast._exposuremodel_oid, assoc.aggregationtype,
+                assoc.aggregationtag;
+        """), {'exposuremodel_oid': exposuremodel_oid})
         session.commit()
 
-        return assets_oids, sites_oids
-
     @classmethod
     def count_by_exposuremodel(cls, session: Session,
                                exposuremodel_oid: int) -> int:
@@ -197,7 +237,7 @@ class SiteRepository(repository_factory(
 
     @classmethod
     def insert_many_bulk(cls, session: Session,
-                         sites: pd.DataFrame) -> list[int]:
+                         sites: pd.DataFrame) -> np.ndarray:
         """Bulk insert sites using COPY and pre-allocated OIDs.
 
         Args:
@@ -205,13 +245,14 @@ class SiteRepository(repository_factory(
             sites: DataFrame containing site data.
 
         Returns:
-            List of OIDs of the inserted sites in the same order as input.
+            Contiguous OIDs of the inserted sites in the same order as input.
         """
         with db_cursor_from_session(session) as cursor:
-            db_indexes = allocate_oids(cursor,
-                                       SiteORM.__table__.name,
-                                       '_oid',
-                                       len(sites))
+            start = reserve_oids(cursor,
+                                 SiteORM.__table__.name,
+                                 '_oid',
+                                 len(sites))
+        db_indexes = start + np.arange(len(sites), dtype=np.int64)
 
         # Create a copy and assign pre-allocated OIDs
         sites_copy = sites.copy()
@@ -260,17 +301,55 @@ class AggregationTagRepository(repository_factory(
 
     @classmethod
     def insert_many(cls, session: Session,
-                    aggregationtags: pd.DataFrame) -> list[int]:
-
-        stmt = insert(AggregationTagORM) \
-            .values(aggregationtags.to_dict(orient='records')) \
-            .on_conflict_do_update(
-                index_elements=['name', 'type', '_exposuremodel_oid'],
-                set_={'name': AggregationTagORM.name}) \
-            .returning(AggregationTagORM._oid)
-        result = session.execute(stmt)
-        session.commit()
-        return [row._oid for row in result]
+                    aggregationtags: pd.DataFrame) -> np.ndarray:
+        """Insert aggregation tags, keeping the tags which already exist.
+
+        The tags are copied into a staging table and upserted from there,
+        the OIDs are returned ordered by the staging row.
+
+        Args:
+            session: SQLAlchemy session.
+            aggregationtags: DataFrame with unique 'type', 'name' and
+                '_exposuremodel_oid' rows.
+
+        Returns:
+            OIDs of the inserted or existing tags in the same order as input.
+        """
+        table = AggregationTagORM.__table__.name
+        staged = pd.DataFrame({
+            'row': np.arange(len(aggregationtags), dtype=np.int64),
+            'type': aggregationtags['type'].to_numpy(),
+            'name': aggregationtags['name'].to_numpy(),
+            '_exposuremodel_oid':
+                aggregationtags['_exposuremodel_oid'].to_numpy()})
+
+        with db_cursor_from_session(session) as cursor:
+            cursor.execute("""
+                CREATE TEMPORARY TABLE tmp_aggregationtag (
+                    row bigint,
+                    type varchar,
+                    name varchar,
+                    _exposuremodel_oid bigint
+                ) ON COMMIT DROP;
+            """)
+            copy_from_dataframe(cursor, staged, 'tmp_aggregationtag')
+            cursor.execute(f"""
+                WITH upserted AS (
+                    INSERT INTO {table} (type, name, _exposuremodel_oid)
+                    SELECT type, name, _exposuremodel_oid
+                    FROM tmp_aggregationtag
+                    ORDER BY row
+                    ON CONFLICT (name, type, _exposuremodel_oid)
+                    DO UPDATE SET name = EXCLUDED.name
+                    RETURNING _oid, type, name, _exposuremodel_oid
+                )
+                SELECT array_agg(upserted._oid ORDER BY tmp.row)
+                FROM tmp_aggregationtag tmp
+                JOIN upserted USING (type, name, _exposuremodel_oid);
+            """)
+            oids = cursor.fetchone()[0]
+
+        return np.asarray(oids or [], dtype=np.int64)
 
 
 class AggregationGeometryRepository(repository_factory(
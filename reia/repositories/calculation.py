@@ -20,7 +20,7 @@ from reia.schemas.calculation_schemas import (Calculation, CalculationBranch,
                                               LossCalculation,
                                               LossCalculationBranch,
                                               RiskAssessment)
-from reia.schemas.enums import ECalculationType, EStatus
+from reia.schemas.enums import ECalculationType, EResultsLayout, EStatus
 from reia.services.logger import LoggerService
 
 logger = LoggerService.get_logger(__name__)
@@ -155,6 +155,14 @@ class CalculationRepository(repository_factory(
         result = session.execute(stmt).unique().scalars().all()
         return [Calculation.model_validate(row) for row in result]
 
+    @classmethod
+    def get_results_layout(cls, session: Session,
+                           oid: int) -> EResultsLayout:
+        """Get the storage layout of the results of a calculation."""
+        stmt = select(CalculationORM.resultslayout).where(
+            CalculationORM._oid == oid)
+        return session.execute(stmt).scalar_one()
+
     @classmethod
     def update_status(
             cls, session: Session, oid: int, status: EStatus) -> Calculation:
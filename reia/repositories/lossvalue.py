@@ -1,14 +1,115 @@
 import pandas as pd
+from sqlalchemy import delete, select, text, update
 from sqlalchemy.orm import Session
 
+from reia.config.settings import get_settings
 from reia.datamodel.lossvalues import DamageValue as DamageValueORM
 from reia.datamodel.lossvalues import LossValue as LossValueORM
 from reia.datamodel.lossvalues import RiskValue as RiskValueORM
-from reia.datamodel.lossvalues import riskvalue_aggregationtag
+from reia.datamodel.lossvalues import (aggregationkey_aggregationtag,
+                                       event, ingestledger, riskarray,
+                                       riskarraystaging, riskstatistics,
+                                       riskvalue_aggregationtag, totalweight)
 from reia.repositories.base import repository_factory
-from reia.repositories.utils import (allocate_oids, copy_pooled,
-                                     db_cursor_from_session)
+from reia.repositories.utils import (CALCULATION_PARTITIONS,
+                                     attach_calculation_partitions,
+                                     calculation_leaves, copy_from_dataframe,
+                                     copy_pooled, copy_to_leaves,
+                                     create_calculation_leaves,
+                                     db_cursor_from_session,
+                                     detach_calculation_partitions,
+                                     drop_empty_calculation_leaves,
+                                     get_riskvalue_storage,
+                                     get_table_persistence, is_staging_lost,
+                                     reserve_oids, set_riskvalue_storage)
+from reia.schemas.calculation_schemas import CalculationBranch
+from reia.schemas.enums import EResultsLayout, EResultsStorage, ERiskType
 from reia.schemas.lossvalue_schemas import DamageValue, LossValue, RiskValue
+from reia.services.logger import LoggerService
+
+logger = LoggerService.get_logger(__name__)
+
+# Joins from the risk values `rv` of a calculation to their aggregation
+# tags `lat`, depending on the results layout of the calculation.
+RISKVALUE_TAG_JOINS = {
+    EResultsLayout.ASSOCIATION: """
+        INNER JOIN loss_assoc_riskvalue_aggregationtag assoc ON
+            rv._oid = assoc.riskvalue
+            AND rv._calculation_oid = assoc._calculation_oid
+            AND rv.losscategory = assoc.losscategory
+        INNER JOIN loss_aggregationtag lat ON
+            assoc.aggregationtag = lat._oid
+            AND assoc.aggregationtype = lat.type
+        WHERE
+            assoc._calculation_oid = :calculation_oid
+    """,
+    EResultsLayout.AGGREGATIONKEY: """
+        INNER JOIN loss_assoc_aggregationkey_aggregationtag akey ON
+            rv._calculationbranch_oid = akey._calculationbranch_oid
+            AND rv.aggregationkey = akey.aggregationkey
+        INNER JOIN loss_aggregationtag lat ON
+            akey.aggregationtag = lat._oid
+            AND akey.aggregationtype = lat.type
+        WHERE
+            akey._calculation_oid = :calculation_oid
+    """
+}
+
+RISK_STATISTICS_QUANTITIES = {
+    ERiskType.LOSS: ['loss'],
+    ERiskType.DAMAGE: ['dg1', 'dg2', 'dg3', 'dg4', 'dg5']
+}
+
+# Statistics of every array of a calculation with the EVENTARRAY layout,
+# the event weight missing from an array is prepended as a zero value.
+EVENT_ARRAY_STATISTICS = """
+    WITH total_weight AS (
+        SELECT losscategory, SUM(weight) AS weight
+        FROM loss_totalweight
+        WHERE _calculation_oid = :calculation_oid
+        GROUP BY losscategory
+    ),
+    arrays AS (
+        SELECT
+            ra.losscategory,
+            ra.aggregationtype,
+            lat.name AS tagname,
+            ra.quantity,
+            CASE WHEN ra.weight < (1 - 1e-6) * tw.weight
+                THEN ARRAY[0]::real[] || ra.riskvalues
+                ELSE ra.riskvalues END AS riskvalues,
+            CASE WHEN ra.weight < (1 - 1e-6) * tw.weight
+                THEN ARRAY[tw.weight - ra.weight]::real[] || ra.weights
+                ELSE ra.weights END AS weights
+        FROM loss_riskarray ra
+        INNER JOIN loss_aggregationtag lat ON
+            ra.aggregationtag = lat._oid
+            AND ra.aggregationtype = lat.type
+        LEFT JOIN total_weight tw ON
+            ra.losscategory = tw.losscategory
+        WHERE
+            ra._calculation_oid = :calculation_oid
+    )
+    SELECT
+        losscategory,
+        aggregationtype,
+        tagname,
+        quantity,
+        weighted_mean(riskvalues, weights) AS mean,
+        weighted_quantile(riskvalues, weights,
+                          ARRAY[0.1, 0.9]) AS quantiles
+    FROM arrays
+"""
+
+INSERT_LEDGER_ENTRY = f"""
+    INSERT INTO {ingestledger.name} (
+        _calculation_oid, _calculationbranch_oid, chunk, jobid, chunksize,
+        oidstart, rows, losscategories, committed)
+    VALUES (
+        %(_calculation_oid)s, %(_calculationbranch_oid)s, %(chunk)s,
+        %(jobid)s, %(chunksize)s, %(oidstart)s, %(rows)s,
+        %(losscategories)s, %(committed)s)
+"""
 
 
 class RiskValueRepository(repository_factory(RiskValue, RiskValueORM)):
@@ -16,20 +117,495 @@ class RiskValueRepository(repository_factory(RiskValue, RiskValueORM)):
     def insert_many(cls,
                     session: Session,
                     risk_values: pd.DataFrame,
-                    df_agg_val: pd.DataFrame) -> None:
+                    df_agg_val: pd.DataFrame | None = None,
+                    ledger_entry: dict | None = None,
+                    events: pd.DataFrame | None = None) -> None:
+        """Insert risk values and their aggregation tag mappings.
+
+        The rows are copied straight into the loss category leaves of
+        the calculation's partitions, which can be detached for bulk
+        loading by `begin_bulk_load`.
+
+        Args:
+            session: SQLAlchemy session.
+            risk_values: Risk values with local `_oid`s numbered 1..n.
+            df_agg_val: Aggregation tag mappings referencing the local
+                `_oid`s in `riskvalue`, None if the risk values reference
+                their aggregation tags by `aggregationkey`.
+            ledger_entry: Chunk of the risk values in the ingestion
+                ledger. Recorded with the reserved oids before copying
+                and marked as committed once all values are copied.
+            events: Events of the risk values as returned by
+                `prepare_events_for_storage`, events already stored by
+                another chunk of the branch are skipped.
+        """
+        calculation_oid = int(risk_values['_calculation_oid'].iloc[0])
+        riskvalue_partition, assoc_partition = (
+            CALCULATION_PARTITIONS[table].format(calculation_oid)
+            for table in (RiskValueORM.__table__.name,
+                          riskvalue_aggregationtag.name))
+
+        with db_cursor_from_session(session) as cursor:
+            start = reserve_oids(cursor,
+                                 RiskValueORM.__table__.name,
+                                 '_oid',
+                                 len(risk_values))
+            if ledger_entry is not None:
+                cursor.execute(INSERT_LEDGER_ENTRY, ledger_entry | {
+                    'oidstart': start,
+                    'rows': len(risk_values),
+                    'committed': False})
+            if events is not None:
+                cursor.execute(f"""
+                    CREATE TEMPORARY TABLE tmp_event
+                    (LIKE {event.name}) ON COMMIT DROP;
+                """)
+                copy_from_dataframe(cursor, events, 'tmp_event')
+                cursor.execute(f"""
+                    INSERT INTO {event.name}
+                    SELECT * FROM tmp_event
+                    ON CONFLICT DO NOTHING;
+                """)
+
+        # local oids 1..n map to the reserved block start..start+n-1
+        risk_values['_oid'] = risk_values['_oid'].to_numpy() + (start - 1)
+        copy_to_leaves(risk_values, riskvalue_partition)
+
+        if df_agg_val is not None:
+            df_agg_val['riskvalue'] = \
+                df_agg_val['riskvalue'].to_numpy() + (start - 1)
+            copy_to_leaves(df_agg_val, assoc_partition)
+
+        if ledger_entry is not None:
+            branch_oid = ledger_entry['_calculationbranch_oid']
+            session.execute(update(ingestledger).where(
+                ingestledger.c._calculationbranch_oid == branch_oid,
+                ingestledger.c.chunk == ledger_entry['chunk'])
+                .values(committed=True))
+            session.commit()
+
+    @classmethod
+    def insert_ledger_entries(cls,
+                              session: Session,
+                              ledger_entries: list[dict]) -> None:
+        """Record chunks without risk values as committed."""
         with db_cursor_from_session(session) as cursor:
-            db_indexes = allocate_oids(cursor,
-                                       RiskValueORM.__table__.name,
-                                       '_oid',
-                                       len(risk_values))
+            cursor.executemany(INSERT_LEDGER_ENTRY, [
+                entry | {'oidstart': None, 'rows': 0, 'committed': True}
+                for entry in ledger_entries])
+
+    @classmethod
+    def resume_ingestion(cls,
+                         session: Session,
+                         calculationbranch: CalculationBranch,
+                         jobid: str | None,
+                         chunksize: int) -> int:
+        """Prepare saving the risk values of a branch.
+
+        Removes the risk values of chunks whose copy was interrupted, so
+        that the ingestion can continue after the last committed chunk.
+
+        Args:
+            session: SQLAlchemy session.
+            calculationbranch: The calculation branch object.
+            jobid: OpenQuake job of the results to be saved.
+            chunksize: Number of rows per chunk read from the results.
+
+        Returns:
+            Index of the first chunk which still needs to be saved.
+
+        Raises:
+            ValueError: If the committed chunks were read from another job
+                or with another chunk size.
+        """
+        # staged UNLOGGED leaves are emptied by a crash of the database
+        # server, all branches of the calculation are saved again
+        calculation_oid = calculationbranch.calculation_oid
+        if session.execute(select(ingestledger.c.chunk).where(
+                ingestledger.c._calculation_oid == calculation_oid,
+                ingestledger.c.committed, ingestledger.c.rows > 0)
+                .limit(1)).first() is not None and \
+                is_staging_lost(session.connection(), calculation_oid):
+            logger.warning('Staged results of calculation '
+                           f'{calculation_oid} were lost, saving again.')
+            session.execute(delete(ingestledger).where(
+                ingestledger.c._calculation_oid == calculation_oid))
+
+        # so are the staged event arrays, the branch is saved again
+        branch_ledger = ingestledger.c._calculationbranch_oid \
+            == calculationbranch.oid
+        if session.execute(select(ingestledger.c.chunk).where(
+                branch_ledger, ingestledger.c.committed,
+                ingestledger.c.oidstart.is_(None), ingestledger.c.rows > 0)
+                .limit(1)).first() is not None and \
+                session.execute(select(riskarraystaging.c.chunk).where(
+                    riskarraystaging.c._calculationbranch_oid
+                    == calculationbranch.oid).limit(1)).first() is None:
+            logger.warning('Staged event arrays of calculation branch '
+                           f'{calculationbranch.oid} were lost, saving again.')
+            session.execute(delete(ingestledger).where(branch_ledger))
+
+        entries = session.execute(select(ingestledger).where(branch_ledger)
+                                  ).all()
+
+        committed = [e for e in entries if e.committed]
+        if any(e.jobid != jobid or e.chunksize != chunksize
+               for e in committed):
+            raise ValueError(
+                f'Results of calculation branch {calculationbranch.oid} '
+                'were partially saved from another job or chunk size.')
+
+        for entry in entries:
+            if entry.committed:
+                continue
+            # the leaves of the calculation are used directly, they can
+            # be detached while bulk loading
+            for table, column in ((riskvalue_aggregationtag.name,
+                                   'riskvalue'),
+                                  (RiskValueORM.__table__.name, '_oid')):
+                partition = CALCULATION_PARTITIONS[table].format(
+                    entry._calculation_oid)
+                for leaf in calculation_leaves(partition):
+                    if get_table_persistence(
+                            session.connection(), leaf) is None:
+                        continue
+                    session.execute(text(f"""
+                        DELETE FROM {leaf} WHERE {column} >= :oidstart
+                        AND {column} < :oidstart + :rows
+                    """), {'oidstart': entry.oidstart, 'rows': entry.rows})
+            session.execute(delete(ingestledger).where(
+                ingestledger.c._calculationbranch_oid == calculationbranch.oid,
+                ingestledger.c.chunk == entry.chunk))
+        session.commit()
+
+        return max((e.chunk for e in committed), default=-1) + 1
+
+    @classmethod
+    def create_partitions(cls,
+                          session: Session,
+                          calculation_oid: int,
+                          losscategories: list[str]) -> None:
+        """Create the loss category partitions of a calculation.
+
+        The partitions of the calculation only have leaves for the loss
+        categories of its saved results, existing leaves are kept.
+
+        Args:
+            session: SQLAlchemy session.
+            calculation_oid: Oid of the calculation.
+            losscategories: `ELossCategory` names of the results to save.
+        """
+        session.commit()
+        with session.get_bind().begin() as connection:
+            create_calculation_leaves(connection, calculation_oid,
+                                      losscategories,
+                                      get_settings().results_bulk_unlogged)
+
+    @classmethod
+    def drop_empty_partitions(cls, session: Session) -> list[str]:
+        """Drop the loss category partitions without risk values.
+
+        Args:
+            session: SQLAlchemy session.
+
+        Returns:
+            Names of the dropped partitions.
+        """
+        session.commit()
+        return drop_empty_calculation_leaves(session.get_bind())
+
+    @classmethod
+    def get_storage(cls, session: Session) -> EResultsStorage:
+        """Get the column types of the stored risk values."""
+        return get_riskvalue_storage(session.connection())
+
+    @classmethod
+    def set_storage(cls, session: Session, storage: EResultsStorage) -> None:
+        """Convert the column types of the stored risk values.
+
+        Rewrites the risk values of all calculations, nothing is done if
+        they already use `storage`.
+
+        Args:
+            session: SQLAlchemy session.
+            storage: Storage profile to convert to.
+
+        Raises:
+            ValueError: If partitions are detached for bulk loading.
+        """
+        session.commit()
+        with session.get_bind().begin() as connection:
+            set_riskvalue_storage(connection, storage)
+
+    @classmethod
+    def begin_bulk_load(cls, session: Session, calculation_oid: int) -> None:
+        """Detach the partitions of a calculation for `insert_many`.
+
+        Args:
+            session: SQLAlchemy session.
+            calculation_oid: Oid of the calculation.
+        """
+        # locks held by the session would block detaching
+        session.commit()
+        detach_calculation_partitions(session.get_bind(), calculation_oid,
+                                      get_settings().results_bulk_unlogged)
+
+    @classmethod
+    def finish_bulk_load(cls, session: Session, calculation_oid: int) -> None:
+        """Index, validate, attach and analyze bulk loaded partitions.
+
+        Does nothing if the partitions of the calculation are attached.
+
+        Args:
+            session: SQLAlchemy session.
+            calculation_oid: Oid of the calculation.
+        """
+        config = get_settings()
+        session.commit()
+        attach_calculation_partitions(
+            session.get_bind(), calculation_oid,
+            config.results_ingest_workers,
+            config.results_bulk_maintenance_work_mem)
+
+    @classmethod
+    def insert_aggregation_keys(cls,
+                                session: Session,
+                                aggregation_keys: pd.DataFrame) -> None:
+        """Insert the aggregation key dictionary of a calculation branch.
+
+        Replaces the keys of a previous, interrupted attempt.
+
+        Args:
+            session: SQLAlchemy session.
+            aggregation_keys: One row per (aggregationkey, aggregationtag).
+        """
+        if aggregation_keys.empty:
+            return
+        branch_oid = int(aggregation_keys['_calculationbranch_oid'].iloc[0])
+        session.execute(delete(aggregationkey_aggregationtag).where(
+            aggregationkey_aggregationtag.c._calculationbranch_oid
+            == branch_oid))
+        session.commit()
+        copy_pooled(aggregation_keys, aggregationkey_aggregationtag.name)
+
+    @classmethod
+    def stage_event_arrays(cls,
+                           session: Session,
+                           event_arrays: pd.DataFrame,
+                           ledger_entry: dict) -> None:
+        """Stage the event arrays of a chunk of a branch.
+
+        The arrays are merged into the arrays of the calculation by
+        `merge_event_arrays` once all chunks of the branch are staged.
+
+        Args:
+            session: SQLAlchemy session.
+            event_arrays: Arrays as returned by
+                `prepare_event_arrays_for_storage`.
+            ledger_entry: Chunk the arrays were built from, recorded as
+                committed in the same transaction as the arrays.
+        """
+        event_arrays = event_arrays.assign(
+            _calculationbranch_oid=ledger_entry['_calculationbranch_oid'],
+            chunk=ledger_entry['chunk'])
+        with db_cursor_from_session(session) as cursor:
+            copy_from_dataframe(cursor, event_arrays, riskarraystaging.name)
+            cursor.execute(INSERT_LEDGER_ENTRY, ledger_entry | {
+                'oidstart': None,
+                'rows': len(event_arrays),
+                'committed': True})
+
+    @classmethod
+    def merge_event_arrays(cls,
+                           session: Session,
+                           calculationbranch: CalculationBranch) -> None:
+        """Merge the staged event arrays of a branch.
+
+        The staged arrays of every tag are combined into one sorted array
+        and merged into the arrays of the other branches of the
+        calculation, so that every stored array is rewritten once per
+        branch. The staged arrays are removed and the ledger entries of
+        the branch no longer count them.
+
+        Args:
+            session: SQLAlchemy session.
+            calculationbranch: The calculation branch object.
+        """
+        keys = ', '.join(c.name for c in riskarray.primary_key)
+        session.execute(text(f"""
+            INSERT INTO {riskarray.name}
+            SELECT {keys},
+                sum(CASE WHEN n = 1 THEN weight ELSE 0 END),
+                array_agg(v ORDER BY v), array_agg(w ORDER BY v)
+            FROM {riskarraystaging.name},
+                unnest(riskvalues, weights) WITH ORDINALITY AS s(v, w, n)
+            WHERE _calculationbranch_oid = :calculationbranch_oid
+            GROUP BY {keys}
+            -- branches merged concurrently lock their shared rows in the
+            -- same order
+            ORDER BY {keys}
+            ON CONFLICT ({keys}) DO UPDATE SET
+                weight = {riskarray.name}.weight + EXCLUDED.weight,
+                (riskvalues, weights) = (
+                    SELECT array_agg(v ORDER BY v),
+                        array_agg(w ORDER BY v)
+                    FROM unnest(
+                        {riskarray.name}.riskvalues || EXCLUDED.riskvalues,
+                        {riskarray.name}.weights || EXCLUDED.weights
+                    ) AS merged(v, w))
+        """), {'calculationbranch_oid': calculationbranch.oid})
+        session.execute(delete(riskarraystaging).where(
+            riskarraystaging.c._calculationbranch_oid
+            == calculationbranch.oid))
+        session.execute(update(ingestledger).where(
+            ingestledger.c._calculationbranch_oid == calculationbranch.oid)
+            .values(rows=0))
+        session.commit()
+
+    @classmethod
+    def insert_total_weights(cls,
+                             session: Session,
+                             calculationbranch: CalculationBranch,
+                             weight: float) -> None:
+        """Record the total event weight of a calculation branch.
+
+        The loss categories of the branch are taken from the committed
+        chunks in the ingestion ledger.
+
+        Args:
+            session: SQLAlchemy session.
+            calculationbranch: The calculation branch object.
+            weight: Weight of all events times the branch weight.
+        """
+        session.execute(text(f"""
+            INSERT INTO {totalweight.name} (
+                _calculation_oid, _calculationbranch_oid,
+                losscategory, weight)
+            SELECT DISTINCT :calculation_oid, :calculationbranch_oid,
+                CAST(losscategory AS elosscategory), :weight
+            FROM {ingestledger.name},
+                unnest(losscategories) AS losscategory
+            WHERE _calculationbranch_oid = :calculationbranch_oid
+            AND committed
+            ON CONFLICT DO NOTHING
+        """), {'calculation_oid': calculationbranch.calculation_oid,
+               'calculationbranch_oid': calculationbranch.oid,
+               'weight': weight})
+        session.commit()
+
+    @classmethod
+    def insert_statistics(cls,
+                          session: Session,
+                          calculation_oid: int,
+                          risk_type: ERiskType,
+                          layout: EResultsLayout) -> int:
+        """Precompute the weighted statistics per aggregation tag.
+
+        Uses the same weighted mean and quantiles over all branches as the
+        live webservice queries, replacing previously computed values.
+
+        Args:
+            session: SQLAlchemy session.
+            calculation_oid: Oid of the completed calculation.
+            risk_type: Risk type of the calculation.
+            layout: Results layout of the calculation.
+
+        Returns:
+            Number of inserted statistics rows.
+        """
+        quantities = RISK_STATISTICS_QUANTITIES[risk_type]
+
+        values = ', '.join(f'rv.{q}_value' for q in quantities)
+        zeros = ', '.join('0' for _ in quantities)
+        aggregates = ',\n'.join(
+            f'weighted_mean(array_agg({q}_value), array_agg(weight)) '
+            f'AS {q}_mean,\n'
+            f'weighted_quantile(array_agg({q}_value), '
+            f'array_agg(weight), ARRAY[0.1, 0.9]) AS {q}_quantiles'
+            for q in quantities)
+        columns = ', '.join(f'{q}_mean, {q}_pc10, {q}_pc90'
+                            for q in quantities)
+        statistics = ', '.join(
+            f'{q}_mean, {q}_quantiles[1], {q}_quantiles[2]'
+            for q in quantities)
+
+        session.execute(text(f"""
+            DELETE FROM {riskstatistics.name}
+            WHERE _calculation_oid = :calculation_oid
+        """), {'calculation_oid': calculation_oid})
 
-        oid_map = dict(zip(risk_values['_oid'], db_indexes))
+        if layout == EResultsLayout.EVENTARRAY:
+            # one row per quantity, pivoted into the statistics columns
+            pivot = ', '.join(
+                f"MAX({statistic}) FILTER (WHERE quantity = '{q}')"
+                for q in quantities
+                for statistic in ('mean', 'quantiles[1]', 'quantiles[2]'))
+            result = session.execute(text(f"""
+                INSERT INTO {riskstatistics.name} (
+                    _calculation_oid, losscategory, aggregationtype,
+                    tagname, {columns})
+                SELECT :calculation_oid, losscategory, aggregationtype,
+                    tagname, {pivot}
+                FROM ({EVENT_ARRAY_STATISTICS}) statistics
+                GROUP BY losscategory, aggregationtype, tagname
+            """), {'calculation_oid': calculation_oid})
+            session.commit()
+            return result.rowcount
 
-        risk_values['_oid'] = db_indexes
-        df_agg_val['riskvalue'] = df_agg_val['riskvalue'].map(oid_map)
+        # the event weight missing from the stored values of a tag
+        # is added as a zero value, unless it is only the rounding of
+        # weights stored as real
+        result = session.execute(text(f"""
+            WITH risk_data AS (
+                SELECT
+                    rv.losscategory,
+                    lat.type AS aggregationtype,
+                    lat.name AS tagname,
+                    ev.weight,
+                    {values}
+                FROM loss_riskvalue rv
+                INNER JOIN {event.name} ev ON
+                    rv._calculationbranch_oid = ev._calculationbranch_oid
+                    AND rv.eventid = ev.eventid
+                {RISKVALUE_TAG_JOINS[layout]}
+                    AND rv._calculation_oid = :calculation_oid
+            ),
+            total_weight AS (
+                SELECT losscategory, SUM(weight) AS weight
+                FROM {totalweight.name}
+                WHERE _calculation_oid = :calculation_oid
+                GROUP BY losscategory
+            ),
+            padded_data AS (
+                SELECT * FROM risk_data
+                UNION ALL
+                SELECT rd.losscategory, rd.aggregationtype, rd.tagname,
+                    tw.weight - SUM(rd.weight::float8), {zeros}
+                FROM risk_data rd
+                INNER JOIN total_weight tw ON
+                    rd.losscategory = tw.losscategory
+                GROUP BY rd.losscategory, rd.aggregationtype, rd.tagname,
+                    tw.weight
+                HAVING SUM(rd.weight::float8) < (1 - 1e-6) * tw.weight
+            )
+            INSERT INTO {riskstatistics.name} (
+                _calculation_oid, losscategory, aggregationtype, tagname,
+                {columns})
+            SELECT :calculation_oid, losscategory, aggregationtype, tagname,
+                {statistics}
+            FROM (
+                SELECT
+                    losscategory,
+                    aggregationtype,
+                    tagname,
+                    {aggregates}
+                FROM padded_data
+                GROUP BY losscategory, aggregationtype, tagname
+            ) aggregated
+        """), {'calculation_oid': calculation_oid})
+        session.commit()
 
-        copy_pooled(risk_values, RiskValueORM.__table__.name)
-        copy_pooled(df_agg_val, riskvalue_aggregationtag.name)
+        return result.rowcount
 
 
 class LossValueRepository(repository_factory(LossValue, LossValueORM)):
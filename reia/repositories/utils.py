@@ -1,22 +1,28 @@
+import hashlib
+import os
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
-from io import StringIO
-from multiprocessing import Pool
+from io import BytesIO, StringIO
 
 import numpy as np
 import pandas as pd
 import psycopg2
 from psycopg2 import sql
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
-from sqlalchemy.engine import Connection
+from psycopg2.pool import ThreadedConnectionPool
+from sqlalchemy.engine import Connection, Engine
 from sqlalchemy.sql import text
 
 from reia.config.settings import get_settings
+from reia.schemas.enums import ELossCategory, EResultsStorage
 from reia.services.logger import LoggerService
 
 logger = LoggerService.get_logger(__name__)
 
 
-def make_connection():
+def make_connection(**kwargs):
     config = get_settings()
     return psycopg2.connect(
         dbname=config.db_name,
@@ -24,21 +30,130 @@ def make_connection():
         host=config.postgres_host,
         port=config.postgres_port,
         password=config.db_password,
+        **kwargs
     )
 
 
-def copy_pooled(df, tablename, max_entries=750_000):
-    config = get_settings()
-    max_procs = config.max_processes
+# connections which can still be opened by non-superusers
+AVAILABLE_CONNECTIONS = """
+    SELECT current_setting('max_connections')::int
+        - current_setting('superuser_reserved_connections')::int
+        - (SELECT count(*) FROM pg_stat_activity
+           WHERE backend_type = 'client backend')
+"""
+
+
+class CopyLoader:
+    """Long-lived parallel loader for COPY.
+
+    Keeps a thread pool together with a pool of persistent autocommit
+    connections, so that neither processes nor connections have to be
+    created per COPY. Chunks are passed to the threads as DataFrame
+    slices and the GIL is released while waiting for the server.
+
+    Args:
+        max_workers: Number of concurrent COPY connections, bounded by
+            the connections the server has left.
+    """
+
+    def __init__(self, max_workers: int):
+        config = get_settings()
+        self.pid = os.getpid()
+        self.connections = ThreadedConnectionPool(
+            0, max_workers,
+            dbname=config.db_name,
+            user=config.db_user,
+            host=config.postgres_host,
+            port=config.postgres_port,
+            password=config.db_password,
+            options='-c synchronous_commit=off')
+
+        # don't open more connections than the server has left, the
+        # connection asking is kept by the pool
+        conn = self.connections.getconn()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(AVAILABLE_CONNECTIONS)
+                available = cursor.fetchone()[0] + 1
+        finally:
+            conn.rollback()
+            self.connections.putconn(conn)
+
+        self.max_workers = max(1, min(max_workers, available))
+        self.executor = ThreadPoolExecutor(self.max_workers,
+                                           thread_name_prefix='copy')
+
+    def _copy_chunk(self, df: pd.DataFrame, tablename: str):
+        conn = self.connections.getconn()
+        # connections closed by the server are replaced
+        while conn.closed:
+            self.connections.putconn(conn, close=True)
+            conn = self.connections.getconn()
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                copy_from_dataframe(cursor, df, tablename)
+        finally:
+            self.connections.putconn(conn, close=bool(conn.closed))
+
+    def copy(self, df: pd.DataFrame, tablename: str, max_entries: int):
+        """Copy `df` to `tablename` in parallel chunks.
+
+        The number of chunks is the number of `max_entries` sized
+        chunks needed, but at most the number of workers.
+        """
+        self.copy_many([(df, tablename)], max_entries)
+
+    def copy_many(self,
+                  dfs: list[tuple[pd.DataFrame, str]],
+                  max_entries: int):
+        """Copy several DataFrames to their tables concurrently.
+
+        Every DataFrame is split into chunks as by `copy`, the chunks
+        of all tables share the workers.
+        """
+        futures = []
+        for df, tablename in dfs:
+            nchunks = max(1, min(self.max_workers,
+                                 int(np.ceil(len(df) / max_entries))))
+            bounds = np.linspace(0, len(df), nchunks + 1).astype(int)
+            futures += [self.executor.submit(self._copy_chunk,
+                                             df.iloc[start:end], tablename)
+                        for start, end in zip(bounds[:-1], bounds[1:])]
+        for future in futures:
+            future.result()
+
+    def close(self):
+        self.executor.shutdown()
+        self.connections.closeall()
 
-    nprocs = max(1, min(max_procs, int(np.ceil(len(df) / max_entries))))
 
-    chunks = np.array_split(df, nprocs)
+_copy_loader: CopyLoader | None = None
+_copy_loader_lock = threading.Lock()
 
-    pool_args = [(chunk, tablename) for chunk in chunks]
 
-    with Pool(nprocs) as pool:
-        pool.starmap(copy_raw, pool_args)
+def get_copy_loader() -> CopyLoader:
+    """Get the CopyLoader of this process, creating it on first use."""
+    global _copy_loader
+    with _copy_loader_lock:
+        # connections can't be shared with a forked child process
+        if _copy_loader is None or _copy_loader.pid != os.getpid():
+            _copy_loader = CopyLoader(get_settings().max_processes)
+        return _copy_loader
+
+
+def close_copy_loader():
+    """Close the connections and threads of the CopyLoader."""
+    global _copy_loader
+    with _copy_loader_lock:
+        if _copy_loader is not None and _copy_loader.pid == os.getpid():
+            _copy_loader.close()
+        _copy_loader = None
+
+
+def copy_pooled(df, tablename, max_entries=750_000):
+    logger.info(f"Copying {len(df)} rows to {tablename}...")
+    get_copy_loader().copy(df, tablename, max_entries)
 
 
 def copy_raw(df, tablename):
@@ -53,31 +168,289 @@ def copy_raw(df, tablename):
         conn.close()
 
 
-def copy_from_dataframe(cursor, df: pd.DataFrame, table: str):
+def copy_from_dataframe(cursor, df: pd.DataFrame, table: str,
+                        copy_format: str | None = None):
+    """Copy a DataFrame into a table using COPY FROM STDIN.
+
+    The binary COPY format is used by default, if all target columns
+    have a type supported by `encode_binary_copy`. Otherwise, or if
+    `copy_format` is 'csv', the rows are rendered as CSV text.
+
+    Args:
+        cursor: psycopg2 cursor.
+        df: DataFrame, column names have to match the table columns.
+        table: Name of the target table.
+        copy_format: 'binary' or 'csv', defaults to
+            `REIASettings.copy_format`.
+    """
+    copy_format = copy_format or get_settings().copy_format
     try:
-        with StringIO() as buffer:
+        columns = sql.SQL(', ').join(map(sql.Identifier, df.columns))
+        pg_types = None
+        if copy_format == 'binary':
+            pg_types = get_binary_column_types(cursor, table, df.columns)
+
+        if pg_types is not None:
+            buffer = BytesIO(encode_binary_copy(df, pg_types))
+            stmt = sql.SQL(
+                "COPY {} ({}) FROM STDIN WITH (FORMAT binary)").format(
+                sql.Identifier(table), columns)
+        else:
+            buffer = StringIO()
             df.to_csv(buffer, header=False, index=False, encoding='utf-8')
             buffer.seek(0)
-            columns = sql.SQL(', ').join(map(sql.Identifier, df.columns))
             stmt = sql.SQL("COPY {} ({}) FROM STDIN WITH CSV").format(
                 sql.Identifier(table), columns
             )
+        with buffer:
             cursor.copy_expert(stmt, buffer)
-            logger.info(f"Successfully copied {len(df)} rows to {table}.")
+        logger.info(f"Successfully copied {len(df)} rows to {table}.")
     except Exception as err:
         logger.error(f"Error copying to {table}: {err}")
         raise
 
 
-def allocate_oids(cursor, table: str, column: str, count: int) -> list[int]:
+# PostgreSQL types which can be written by `encode_binary_copy`, fixed
+# width types map to their big endian numpy dtype
+BINARY_COPY_DTYPES = {'bool': np.dtype('?'),
+                      'int2': np.dtype('>i2'),
+                      'int4': np.dtype('>i4'),
+                      'int8': np.dtype('>i8'),
+                      'oid': np.dtype('>u4'),
+                      'float4': np.dtype('>f4'),
+                      'float8': np.dtype('>f8')}
+BINARY_COPY_TEXT = {'text', 'varchar', 'bpchar', 'name'}
+
+PGCOPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('!ii', 0, 0)
+PGCOPY_TRAILER = struct.pack('!h', -1)
+# rows of equal field lengths assembled at once by `encode_binary_copy`
+BINARY_COPY_BLOCK_ROWS = 65_536
+
+
+def get_binary_column_types(cursor,
+                            table: str,
+                            columns: list[str]
+                            ) -> list[tuple[str, int | None]] | None:
+    """Get the types of table columns for binary COPY.
+
+    Args:
+        cursor: psycopg2 cursor.
+        table: Name of the table.
+        columns: Names of the columns, in the order they are copied.
+
+    Returns:
+        List of (type name, element type oid) per column, where the type
+        name is 'text' for text and enum columns and '<element>[]' for
+        one dimensional arrays. None if a column type is not supported.
+    """
     cursor.execute(
         """
-        SELECT nextval(pg_get_serial_sequence(%s, %s))
-        FROM generate_series(1, %s)
+        SELECT a.attname, t.typname, t.typtype, e.typname, e.oid
+        FROM pg_attribute a
+        JOIN pg_type t ON t.oid = a.atttypid
+        LEFT JOIN pg_type e ON e.oid = t.typelem AND t.typcategory = 'A'
+        WHERE a.attrelid = %s::regclass
+            AND a.attnum > 0 AND NOT a.attisdropped
         """,
-        (table, column, count)
+        (table,)
     )
-    return [row[0] for row in cursor.fetchall()]
+    types = {}
+    for name, typname, typtype, elemname, elemoid in cursor.fetchall():
+        if typname in BINARY_COPY_TEXT or typtype == 'e':
+            types[name] = ('text', None)
+        elif typname in BINARY_COPY_DTYPES:
+            types[name] = (typname, None)
+        elif elemname in BINARY_COPY_DTYPES:
+            types[name] = (f'{elemname}[]', elemoid)
+
+    if not all(c in types for c in columns):
+        return None
+    return [types[c] for c in columns]
+
+
+def _encode_fixed(values: pd.Series, dtype: np.dtype):
+    null = values.isna().to_numpy()
+    data = values.to_numpy(dtype=dtype.newbyteorder('='), na_value=0)
+    if dtype.kind in 'iu' and not np.array_equal(
+            data, values.to_numpy(na_value=0)):
+        raise ValueError(f'Column {values.name} out of range for {dtype}.')
+    data = data.astype(dtype, copy=False).view(np.uint8) \
+        .reshape(len(values), dtype.itemsize)
+    lengths = np.where(null, -1, dtype.itemsize).astype(np.int32)
+    return lengths, lambda rows: data[rows]
+
+
+def _encode_text(values: pd.Series):
+    # only the distinct values have to be encoded
+    codes, uniques = pd.factorize(values)
+    encoded = [str(u).encode('utf-8') for u in uniques]
+    unique_lengths = np.array([len(e) for e in encoded] + [-1],
+                              dtype=np.int32)
+    width = max(unique_lengths.max(), 0)
+    padded = np.frombuffer(b''.join(e.ljust(width, b'\0') for e in encoded),
+                           dtype=np.uint8).reshape(len(encoded), width)
+
+    # NULL values have code -1, pointing to the last length
+    return unique_lengths[codes], \
+        lambda rows: padded[codes[rows], :unique_lengths[codes[rows[0]]]]
+
+
+def _encode_array(values: pd.Series, dtype: np.dtype, elem_oid: int):
+    # every element is written as (length, value)
+    element = np.dtype([('length', '>i4'), ('value', dtype)])
+    encoded = []
+    for value in values:
+        if value is None or (np.isscalar(value) and pd.isna(value)):
+            encoded.append(b'')
+            continue
+        elements = np.empty(len(value), dtype=element)
+        elements['length'] = dtype.itemsize
+        elements['value'] = value
+        if len(value) == 0:
+            encoded.append(struct.pack('!iii', 0, 0, elem_oid))
+        else:
+            encoded.append(struct.pack('!iiiii', 1, 0, elem_oid,
+                                       len(value), 1) + elements.tobytes())
+    lengths = np.array([len(e) for e in encoded], dtype=np.int32)
+    lengths[[v is None or (np.isscalar(v) and pd.isna(v))
+             for v in values]] = -1
+    return lengths, lambda rows: np.frombuffer(
+        b''.join(encoded[r] for r in rows), dtype=np.uint8) \
+        .reshape(len(rows), -1)
+
+
+def encode_binary_copy(df: pd.DataFrame,
+                       pg_types: list[tuple[str, int | None]]
+                       ) -> bytearray:
+    """Encode a DataFrame in the PostgreSQL binary COPY format.
+
+    Every column is encoded as a whole from its NumPy array, floats are
+    written bit-exact. Missing values (None, NaN) are written as NULL.
+    Text values are encoded once per distinct value.
+
+    Rows with the same field lengths are assembled together as one
+    fixed width block, which is then written to the positions of its
+    rows, so that the rows keep the order of `df`.
+
+    Args:
+        df: DataFrame to encode.
+        pg_types: Column types as returned by `get_binary_column_types`.
+
+    Returns:
+        The COPY data, including header and trailer.
+    """
+    fields = []
+    for (_, values), (pg_type, elem_oid) in zip(df.items(), pg_types):
+        if pg_type == 'text':
+            fields.append(_encode_text(values))
+        elif pg_type.endswith('[]'):
+            fields.append(_encode_array(
+                values, BINARY_COPY_DTYPES[pg_type[:-2]], elem_oid))
+        else:
+            fields.append(_encode_fixed(values, BINARY_COPY_DTYPES[pg_type]))
+
+    # each row is the field count followed by (length, data) per field
+    row_widths = np.full(len(df), 2, dtype=np.int64)
+    for lengths, _ in fields:
+        row_widths += 4 + np.maximum(lengths, 0)
+    offsets = len(PGCOPY_HEADER) + np.cumsum(row_widths) - row_widths
+
+    data = bytearray(len(PGCOPY_HEADER) + len(PGCOPY_TRAILER)
+                     + int(row_widths.sum()))
+    data[:len(PGCOPY_HEADER)] = PGCOPY_HEADER
+    data[-len(PGCOPY_TRAILER):] = PGCOPY_TRAILER
+    buffer = np.frombuffer(data, dtype=np.uint8)
+
+    # group the rows by the combination of their field lengths
+    layout = np.zeros(len(df), dtype=np.int64)
+    for lengths, _ in fields:
+        codes, uniques = pd.factorize(lengths)
+        if len(uniques) > 1:
+            layout, _ = pd.factorize(layout * len(uniques) + codes)
+    order = np.argsort(layout, kind='stable')
+    bounds = np.flatnonzero(np.diff(layout[order])) + 1
+
+    field_count = np.frombuffer(struct.pack('!h', len(fields)), np.uint8)
+    for group in np.split(order, bounds):
+        if len(group) == 0:
+            continue
+        widths = [lengths[group[0]] for lengths, _ in fields]
+        row_width = row_widths[group[0]]
+
+        for start in range(0, len(group), BINARY_COPY_BLOCK_ROWS):
+            rows = group[start:start + BINARY_COPY_BLOCK_ROWS]
+            block = np.empty((len(rows), row_width), dtype=np.uint8)
+            block[:, :2] = field_count
+            position = 2
+            for width, (_, fill) in zip(widths, fields):
+                block[:, position:position + 4] = np.frombuffer(
+                    struct.pack('!i', width), np.uint8)
+                position += 4
+                if width > 0:
+                    block[:, position:position + width] = fill(rows)
+                    position += width
+
+            # the rows of a group are ascending, consecutive rows are
+            # written as one slice
+            if rows[-1] - rows[0] == len(rows) - 1:
+                buffer[offsets[rows[0]]:
+                       offsets[rows[0]] + block.size] = block.ravel()
+            else:
+                buffer[offsets[rows][:, None] + np.arange(row_width)] = block
+
+    return data
+
+
+def get_database_identity(connection: Connection) -> str:
+    """Digest identifying the database and the instance of its schema.
+
+    Includes the oid of the exposure model table, which changes when the
+    schema is created again, e.g. by `reia db downgrade base` and
+    `reia db migrate`, so that model oids are unique per identity.
+    """
+    config = get_settings()
+    table_oid = connection.execute(text(
+        "SELECT CAST(to_regclass('loss_exposuremodel') AS oid)")).scalar()
+    return hashlib.sha256(
+        f'{config.postgres_host}:{config.postgres_port}/{config.db_name}'
+        f'/{table_oid}'.encode()).hexdigest()[:12]
+
+
+def reserve_oids(cursor, table: str, column: str, count: int) -> int:
+    """Reserve a contiguous block of values of a serial column.
+
+    The sequence is advanced by `count` in one statement, the reserved
+    values are `start + np.arange(count)`.
+
+    Values of the sequence must only be drawn by inserts into `table`,
+    which wait for the reservation.
+
+    Args:
+        cursor: psycopg2 cursor, the lock on `table` is held until its
+            transaction ends.
+        table: Name of the table.
+        column: Name of the serial column.
+        count: Number of values to reserve.
+
+    Returns:
+        The first reserved value, 0 if `count` is not positive.
+    """
+    if count <= 0:
+        return 0
+
+    cursor.execute("SELECT pg_get_serial_sequence(%s, %s)", (table, column))
+    sequence = cursor.fetchone()[0]
+
+    # nextval of inserts into the table and of concurrent reservations
+    # could interleave between nextval and setval, the lock conflicts
+    # with both until the end of the transaction
+    cursor.execute(sql.SQL(
+        "LOCK TABLE ONLY {} IN SHARE ROW EXCLUSIVE MODE").format(
+            sql.Identifier(table)))
+    cursor.execute(
+        "SELECT setval(%(seq)s, nextval(%(seq)s) + %(n)s - 1) - %(n)s + 1",
+        {'seq': sequence, 'n': count})
+    return cursor.fetchone()[0]
 
 
 @contextmanager
@@ -122,3 +495,367 @@ def drop_partition_table(connection: Connection,
             DROP TABLE {partition_table};
         """))
         conn.commit()
+
+
+# Columns of loss_riskvalue whose type depends on the storage profile,
+# OpenQuake computes the values in single precision.
+RISKVALUE_STORAGE_COLUMNS = ['loss_value', 'dg1_value', 'dg2_value',
+                             'dg3_value', 'dg4_value', 'dg5_value']
+RISKVALUE_STORAGE_TYPES = {EResultsStorage.DOUBLE: 'double precision',
+                           EResultsStorage.COMPACT: 'real'}
+
+
+def get_riskvalue_storage(connection: Connection) -> EResultsStorage:
+    """Get the storage profile of the risk value table."""
+    data_type = connection.execute(text("""
+        SELECT data_type FROM information_schema.columns
+        WHERE table_name = 'loss_riskvalue' AND column_name = 'loss_value'
+    """)).scalar_one()
+    return next(storage for storage, type_ in RISKVALUE_STORAGE_TYPES.items()
+                if type_ == data_type)
+
+
+def get_detached_riskvalue_partitions(connection: Connection) -> list[str]:
+    """Risk value partitions and leaves which are currently detached."""
+    return connection.execute(text("""
+        SELECT relname FROM pg_class
+        WHERE relname ~ '^loss_riskvalue_[0-9]+'
+        AND relkind IN ('r', 'p') AND NOT relispartition
+        ORDER BY relname
+    """)).scalars().all()
+
+
+def set_riskvalue_storage(connection: Connection,
+                          storage: EResultsStorage) -> None:
+    """
+    Changes the column types of the risk value table and all its
+    partitions, which rewrites all stored risk values. Partitions
+    detached for bulk loading would keep their types and could not be
+    attached again, the conversion is refused while there are any.
+    """
+    if get_riskvalue_storage(connection) == storage:
+        return
+    detached = get_detached_riskvalue_partitions(connection)
+    if detached:
+        raise ValueError(
+            'Risk value partitions are detached for bulk loading, finish '
+            f'or resume their calculations first: {", ".join(detached)}.')
+    logger.info(f'Converting risk values to {storage.value} storage.')
+    alter = ', '.join(
+        f'ALTER COLUMN {column} TYPE {RISKVALUE_STORAGE_TYPES[storage]}'
+        for column in RISKVALUE_STORAGE_COLUMNS)
+    connection.execute(text(f'ALTER TABLE loss_riskvalue {alter};'))
+
+
+# Partitions of a calculation, in the order in which they are attached,
+# the association references the risk values.
+CALCULATION_PARTITIONS = {'loss_riskvalue': 'loss_riskvalue_{}',
+                          'loss_assoc_riskvalue_aggregationtag':
+                          'loss_assoc_{}'}
+
+
+def calculation_leaves(partition: str) -> dict[str, str]:
+    """Leaf partitions of a calculation partition and their loss category."""
+    return {f'{partition}_{category.value}': category.name
+            for category in ELossCategory if category != ELossCategory.NULL}
+
+
+def is_partition_attached(connection: Connection, table_name: str) -> bool:
+    return connection.execute(text("""
+        SELECT relispartition FROM pg_class
+        WHERE oid = CAST(:table AS regclass)
+    """), {'table': table_name}).scalar_one()
+
+
+def get_table_persistence(connection: Connection,
+                          table_name: str) -> str | None:
+    """'p' for permanent, 'u' for unlogged, None if the table is missing."""
+    return connection.execute(text("""
+        SELECT relpersistence FROM pg_class
+        WHERE oid = to_regclass(:table)
+    """), {'table': table_name}).scalar_one_or_none()
+
+
+def create_calculation_leaves(connection: Connection,
+                              calculation_oid: int,
+                              losscategories: list[str],
+                              unlogged: bool = False) -> None:
+    """
+    Creates the missing loss category leaves of the risk value partitions
+    of a calculation. If `unlogged` and the partitions are detached for
+    bulk loading, the leaves are created as UNLOGGED staging tables.
+    """
+    # the branches of a calculation are saved concurrently
+    connection.execute(text('SELECT pg_advisory_xact_lock(:oid);'),
+                       {'oid': calculation_oid})
+    for partition in CALCULATION_PARTITIONS.values():
+        partition = partition.format(calculation_oid)
+        staged = unlogged and not is_partition_attached(connection, partition)
+        for leaf, category in calculation_leaves(partition).items():
+            if category not in losscategories \
+                    or get_table_persistence(connection, leaf) is not None:
+                continue
+            if staged:
+                connection.execute(text(
+                    f'CREATE UNLOGGED TABLE {leaf} (LIKE {partition});'))
+            else:
+                connection.execute(text(
+                    f'CREATE TABLE {leaf} PARTITION OF {partition} '
+                    f"FOR VALUES IN ('{category}');"))
+
+
+def drop_empty_calculation_leaves(engine: Engine) -> list[str]:
+    """
+    Drops the loss category leaves of the risk value partitions which
+    don't contain any rows, except the leaves of calculations which are
+    executing. The association leaves are dropped before the risk value
+    leaves they reference.
+
+    Returns:
+        Names of the dropped leaves.
+    """
+    dropped = []
+    for parent, template in reversed(CALCULATION_PARTITIONS.items()):
+        prefix = template.format('')
+        with engine.connect() as conn:
+            leaves = conn.execute(text("""
+                SELECT CAST(relid AS text), CAST(parentrelid AS text)
+                FROM pg_partition_tree(CAST(:table AS regclass))
+                WHERE isleaf AND level = 2
+            """), {'table': parent}).all()
+
+        for leaf, partition in leaves:
+            with engine.begin() as conn:
+                conn.execute(text(
+                    f'LOCK TABLE {leaf} IN ACCESS EXCLUSIVE MODE;'))
+                executing = conn.execute(text("""
+                    SELECT status = 'EXECUTING' FROM loss_calculation
+                    WHERE _oid = :oid
+                """), {'oid': int(partition.removeprefix(prefix))}) \
+                    .scalar_one_or_none()
+                if executing or conn.execute(text(
+                        f'SELECT EXISTS (SELECT 1 FROM {leaf});')) \
+                        .scalar_one():
+                    continue
+                conn.execute(text(f'ALTER TABLE {partition} '
+                                  f'DETACH PARTITION {leaf};'))
+                conn.execute(text(f'DROP TABLE {leaf};'))
+            dropped.append(leaf)
+    return dropped
+
+
+def detach_calculation_partitions(engine: Engine,
+                                  calculation_oid: int,
+                                  unlogged: bool = False) -> None:
+    """
+    Detaches the risk value partitions of a calculation and drops their
+    keys and indexes, so that COPY into them doesn't need to maintain
+    indexes or check foreign keys row by row. If `unlogged`, the leaves
+    are detached as well and staged as UNLOGGED tables.
+    """
+    with engine.begin() as conn:
+        for parent, partition in reversed(CALCULATION_PARTITIONS.items()):
+            partition = partition.format(calculation_oid)
+            if is_partition_attached(conn, partition):
+                logger.info(f'Detaching {partition} for bulk loading.')
+                conn.execute(text(
+                    f'ALTER TABLE {parent} DETACH PARTITION {partition};'))
+
+                # detached, the inherited constraints and indexes are its
+                # own, dropping them drops them from the leaves as well
+                constraints = conn.execute(text("""
+                    SELECT conname FROM pg_constraint
+                    WHERE conrelid = CAST(:table AS regclass)
+                    AND contype IN ('p', 'u', 'f')
+                """), {'table': partition}).scalars().all()
+                for constraint in constraints:
+                    conn.execute(text(f'ALTER TABLE {partition} '
+                                      f'DROP CONSTRAINT {constraint};'))
+                indexes = conn.execute(text("""
+                    SELECT CAST(CAST(indexrelid AS regclass) AS text)
+                    FROM pg_index WHERE indrelid = CAST(:table AS regclass)
+                """), {'table': partition}).scalars().all()
+                for index in indexes:
+                    conn.execute(text(f'DROP INDEX {index};'))
+
+            if not unlogged:
+                continue
+            for leaf in calculation_leaves(partition):
+                if get_table_persistence(conn, leaf) is None:
+                    continue
+                if is_partition_attached(conn, leaf):
+                    conn.execute(text(f'ALTER TABLE {partition} '
+                                      f'DETACH PARTITION {leaf};'))
+                conn.execute(text(f'ALTER TABLE {leaf} SET UNLOGGED;'))
+
+
+def is_staging_lost(connection: Connection, calculation_oid: int) -> bool:
+    """
+    Whether the UNLOGGED staging leaves of a calculation exist and are all
+    empty, which they are after a crash of the database server.
+    """
+    partition = CALCULATION_PARTITIONS['loss_riskvalue'] \
+        .format(calculation_oid)
+    leaves = [leaf for leaf in calculation_leaves(partition)
+              if get_table_persistence(connection, leaf) == 'u']
+    return bool(leaves) and not any(
+        connection.execute(text(
+            f'SELECT EXISTS (SELECT 1 FROM {leaf});')).scalar_one()
+        for leaf in leaves)
+
+
+def _partition_index_statements(conn: Connection,
+                                parent: str,
+                                leaves: list[str]) -> list[str]:
+    """
+    Statements creating the indexes and keys of `parent` on detached
+    `leaves` which don't have them yet.
+    """
+    indexes = conn.execute(text("""
+        SELECT pg_get_indexdef(i.indexrelid), pg_get_constraintdef(c.oid)
+        FROM pg_index i
+        LEFT JOIN pg_constraint c ON c.conindid = i.indexrelid
+            AND c.conrelid = i.indrelid AND c.contype IN ('p', 'u')
+        WHERE i.indrelid = CAST(:table AS regclass)
+    """), {'table': parent}).all()
+
+    def index_method(definition: str) -> str:
+        return definition.split(' USING ', 1)[1]
+
+    statements = []
+    for leaf in leaves:
+        # indexes built by a previous, failed attempt are kept
+        existing = {index_method(d) for d in conn.execute(text("""
+            SELECT pg_get_indexdef(indexrelid) FROM pg_index
+            WHERE indrelid = CAST(:table AS regclass)
+        """), {'table': leaf}).scalars()}
+        for definition, constraint in indexes:
+            if index_method(definition) in existing:
+                continue
+            if constraint is not None:
+                # attaching requires the constraint, not only its index
+                statements.append(f'ALTER TABLE {leaf} ADD {constraint};')
+            else:
+                unique = 'UNIQUE ' if \
+                    definition.startswith('CREATE UNIQUE') else ''
+                statements.append(f'CREATE {unique}INDEX ON {leaf} '
+                                  f'USING {index_method(definition)};')
+    return statements
+
+
+def _execute_maintenance(statement: str, maintenance_work_mem: str) -> None:
+    conn = make_connection()
+    conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SET maintenance_work_mem TO %s;",
+                           (maintenance_work_mem,))
+            cursor.execute(statement)
+    finally:
+        conn.close()
+
+
+def _execute_maintenance_parallel(statements: list[str],
+                                  max_workers: int,
+                                  maintenance_work_mem: str) -> None:
+    """Execute every statement on its own connection."""
+    with ThreadPoolExecutor(max_workers) as executor:
+        for future in [executor.submit(_execute_maintenance, statement,
+                                       maintenance_work_mem)
+                       for statement in statements]:
+            future.result()
+
+
+def attach_calculation_partitions(engine: Engine,
+                                  calculation_oid: int,
+                                  max_workers: int,
+                                  maintenance_work_mem: str) -> None:
+    """
+    Builds the indexes of the detached risk value partitions of a
+    calculation in parallel and attaches them again in one transaction.
+    Staged UNLOGGED leaves are switched to LOGGED first. Attaching reuses
+    the built indexes and validates the foreign keys of the parent in
+    one pass per partition. The attached partitions are analyzed.
+    """
+    with engine.connect() as conn:
+        partitions = {
+            parent: partition.format(calculation_oid)
+            for parent, partition in CALCULATION_PARTITIONS.items()
+            if not is_partition_attached(
+                conn, partition.format(calculation_oid))}
+        if not partitions:
+            return
+
+        staged, unlogged, statements = {}, [], []
+        for parent, partition in partitions.items():
+            staged[partition] = {
+                leaf: category
+                for leaf, category in calculation_leaves(partition).items()
+                if get_table_persistence(conn, leaf) is not None
+                and not is_partition_attached(conn, leaf)}
+            unlogged += [leaf for leaf in staged[partition]
+                         if get_table_persistence(conn, leaf) == 'u']
+            leaves = conn.execute(text("""
+                SELECT CAST(relid AS text) FROM pg_partition_tree(:table)
+                WHERE isleaf AND level > 0
+            """), {'table': partition}).scalars().all()
+            statements += _partition_index_statements(
+                conn, parent, leaves + list(staged[partition]))
+
+    # switching to LOGGED rewrites the table including its indexes
+    _execute_maintenance_parallel(
+        [f'ALTER TABLE {leaf} SET LOGGED;' for leaf in unlogged],
+        max_workers, maintenance_work_mem)
+
+    logger.info(f'Building {len(statements)} indexes of calculation '
+                f'{calculation_oid} with {max_workers} workers.')
+    _execute_maintenance_parallel(statements, max_workers,
+                                  maintenance_work_mem)
+
+    # the results become visible all at once
+    with engine.begin() as conn:
+        conn.execute(text('SELECT set_config('
+                          "'maintenance_work_mem', :value, true);"),
+                     {'value': maintenance_work_mem})
+        for parent, partition in partitions.items():
+            for leaf, category in staged[partition].items():
+                conn.execute(text(
+                    f'ALTER TABLE {partition} ATTACH PARTITION {leaf} '
+                    f"FOR VALUES IN ('{category}');"))
+            logger.info(f'Attaching {partition} after bulk loading.')
+            conn.execute(text(
+                f'ALTER TABLE {parent} ATTACH PARTITION {partition} '
+                f'FOR VALUES IN ({calculation_oid});'))
+
+    for partition in partitions.values():
+        _execute_maintenance(f'ANALYZE {partition};', maintenance_work_mem)
+
+
+def split_by_column(df: pd.DataFrame,
+                    column: str) -> list[tuple[object, pd.DataFrame]]:
+    """Split `df` into one DataFrame per value of `column`.
+
+    The rows are grouped with a stable partition of the value codes, the
+    order of the rows within a group is kept.
+
+    Returns:
+        Tuples of (value, rows with the value), in order of appearance.
+    """
+    codes, values = pd.factorize(df[column])
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(1, len(values)))
+    return [(value, df.take(rows))
+            for value, rows in zip(values, np.split(order, bounds))]
+
+
+def copy_to_leaves(df: pd.DataFrame,
+                   partition: str,
+                   max_entries: int = 750_000) -> None:
+    """
+    COPY the rows of `df` straight into the leaves of a calculation
+    partition by their loss category, without routing them through the
+    partitioned tables. The leaves are loaded concurrently.
+    """
+    leaves = [(rows, f'{partition}_{ELossCategory[category].value}')
+              for category, rows in split_by_column(df, 'losscategory')]
+    get_copy_loader().copy_many(leaves, max_entries)
@@ -6,7 +6,8 @@ import uuid
 from pydantic import Field
 
 from reia.schemas.base import CreationInfoMixin, Model
-from reia.schemas.enums import ECalculationType, EEarthquakeType, EStatus
+from reia.schemas.enums import (ECalculationType, EEarthquakeType,
+                                EResultsLayout, EStatus)
 from reia.schemas.lossvalue_schemas import DamageValue, LossValue
 
 
@@ -71,6 +72,7 @@ class Calculation(CreationInfoMixin):
     status: EStatus | None = None
     description: str | None = None
     type: ECalculationType | None = Field(default=None, alias='_type')
+    resultslayout: EResultsLayout | None = None
 
 
 class LossCalculation(Calculation):
@@ -33,3 +33,14 @@ class ECalculationType(str, enum.Enum):
 class ERiskType(str, enum.Enum):
     LOSS = 'scenario_risk'
     DAMAGE = 'scenario_damage'
+
+
+class EResultsLayout(str, enum.Enum):
+    ASSOCIATION = 'association'
+    AGGREGATIONKEY = 'aggregationkey'
+    EVENTARRAY = 'eventarray'
+
+
+class EResultsStorage(str, enum.Enum):
+    DOUBLE = 'double'
+    COMPACT = 'compact'
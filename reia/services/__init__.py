@@ -2,11 +2,17 @@ import io
 from abc import ABC
 from pathlib import Path
 
+from reia.config.settings import get_settings
+from reia.io.input_cache import InputCache, template_version
 from reia.repositories.types import SessionType
 from reia.schemas.base import Model
 
 
 class DataService(ABC):
+    # model type and template of the exported files, keying the input cache
+    input_type: str | None = None
+    input_template: str | None = None
+
     @classmethod
     def import_from_file(cls,
                          session: SessionType,
@@ -29,3 +35,49 @@ class DataService(ABC):
                          oid: int) -> io.StringIO:
         """Return a file-like object containing the data."""
         raise NotImplementedError
+
+    @classmethod
+    def export_to_buffer_cached(cls,
+                                session: SessionType,
+                                oid: int) -> io.StringIO:
+        """Return `export_to_buffer`, using the input cache if enabled.
+
+        Models don't change once imported, their exported files are
+        cached on the first export.
+        """
+        cache = get_input_cache(session)
+        if cache is None or cls.input_type is None:
+            return cls.export_to_buffer(session, oid)
+
+        version = template_version(cls.input_template)
+        files = cache.get(cls.input_type, oid, version)
+        if files is None:
+            exported = cls.export_to_buffer(session, oid)
+            files = list(exported) if isinstance(exported, tuple) \
+                else [exported]
+            cache.put(cls.input_type, oid, version, files)
+
+        return tuple(files) if len(files) > 1 else files[0]
+
+    @classmethod
+    def purge_cached(cls, session: SessionType, oid: int) -> None:
+        """Remove the cached files of a deleted model."""
+        cache = get_input_cache(session)
+        if cache is not None and cls.input_type is not None:
+            cache.purge(cls.input_type, oid)
+
+
+def get_input_cache(session: SessionType) -> InputCache | None:
+    """Get the input cache configured in the settings, if enabled.
+
+    Args:
+        session: Session of the database the cached models belong to.
+    """
+    # repositories.utils imports the logger of this package
+    from reia.repositories.utils import get_database_identity
+
+    config = get_settings()
+    if not config.input_cache_dir:
+        return None
+    return InputCache(config.input_cache_dir, config.input_cache_size,
+                      get_database_identity(session.connection()))
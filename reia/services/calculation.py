@@ -8,16 +8,17 @@ from reia.io.calculation import (create_calculation, create_calculation_branch,
                                  validate_calculation_input)
 from reia.repositories.calculation import (CalculationBranchRepository,
                                            CalculationRepository)
+from reia.repositories.lossvalue import RiskValueRepository
 from reia.repositories.types import SessionType
 from reia.schemas.calculation_schemas import (Calculation,
                                               CalculationBranchSettings)
-from reia.schemas.enums import EStatus
+from reia.schemas.enums import ECalculationType, EStatus
 from reia.services import DataService
 from reia.services.exposure import ExposureService
 from reia.services.fragility import FragilityService
 from reia.services.logger import LoggerService
 from reia.services.oq_api import OQCalculationAPI
-from reia.services.results import ResultsService
+from reia.services.results import ResultsIngestExecutor, ResultsService
 from reia.services.status_tracker import StatusTracker
 from reia.services.taxonomy import TaxonomyService
 from reia.services.vulnerability import VulnerabilityService
@@ -65,17 +66,47 @@ class CalculationService:
                 EStatus.EXECUTING,
                 "Starting calculation processing")
 
-            # Process each calculation branch
-            for i, b in enumerate(branch_settings):
-                self.logger.info(
-                    "Executing calculation branch "
-                    f"{i}/{len(branch_settings)} (ID: {b.branch.oid})")
-                b = self._run_single_calculation(b)
+            if self.config.results_bulk_load:
+                RiskValueRepository.begin_bulk_load(
+                    self.session, calculation.oid)
+
+            # Process each calculation branch, saving the results of
+            # completed branches in the background
+            try:
+                with ResultsIngestExecutor(
+                        self.session,
+                        self.config.results_ingest_workers) as ingest:
+                    for i, b in enumerate(branch_settings):
+                        self.logger.info(
+                            "Executing calculation branch "
+                            f"{i}/{len(branch_settings)} "
+                            f"(ID: {b.branch.oid})")
+                        b = self._run_single_calculation(b, ingest)
+
+                    errors = ingest.wait()
+            finally:
+                RiskValueRepository.finish_bulk_load(
+                    self.session, calculation.oid)
+
+            for b in branch_settings:
+                if b.branch.oid not in errors:
+                    continue
+                if errors[b.branch.oid] is None:
+                    b.branch = self.status_tracker.update_status(
+                        b.branch, EStatus.COMPLETE, "Results saved")
+                else:
+                    b.branch = self.status_tracker.update_status(
+                        b.branch, EStatus.FAILED,
+                        f"Saving results failed: {errors[b.branch.oid]!r}")
 
             # Determine final status
             status = self.status_tracker.validate_calculation_completion(
                 [b.branch for b in branch_settings])
 
+            if status == EStatus.COMPLETE:
+                ResultsService(self.session).save_calculation_statistics(
+                    calculation)
+
             calculation = self.status_tracker.update_status(
                 calculation,
                 status,
@@ -99,13 +130,88 @@ class CalculationService:
                     self.session.commit()
             raise e
 
+    def resume_results(self,
+                       branch_oid: int,
+                       job_id: int | None = None,
+                       dstore_path: str | None = None) -> Calculation:
+        """Continue saving the results of an interrupted branch.
+
+        Chunks which were committed before the interruption are skipped,
+        the statistics are computed once all branches are complete.
+
+        Args:
+            branch_oid: Oid of the calculation branch.
+            job_id: OpenQuake job id of the branch calculation.
+            dstore_path: Path to the datastore if no job id is given.
+
+        Returns:
+            The updated calculation object.
+        """
+        branch = CalculationBranchRepository.get_by_id(
+            self.session, branch_oid)
+        calculation = CalculationRepository.get_by_id(
+            self.session, branch.calculation_oid)
+
+        if calculation.status != EStatus.COMPLETE:
+            calculation = self.status_tracker.update_status(
+                calculation, EStatus.EXECUTING, "Resuming saving results")
+
+        if branch.status != EStatus.COMPLETE:
+            api_client = None
+            if job_id is not None:
+                api_client = OQCalculationAPI(self.config)
+                api_client.id = job_id
+
+            branch = self.status_tracker.update_status(
+                branch, EStatus.EXECUTING, "Resuming saving results")
+            if self.config.results_bulk_load:
+                RiskValueRepository.begin_bulk_load(
+                    self.session, calculation.oid)
+            try:
+                ResultsService(self.session, api_client, dstore_path) \
+                    .save_calculation_results(branch)
+            except BaseException as e:
+                self.session.rollback()
+                RiskValueRepository.finish_bulk_load(
+                    self.session, calculation.oid)
+                self.status_tracker.update_status(
+                    branch, EStatus.FAILED, f"Saving results failed: {e!r}")
+                self.status_tracker.update_status(
+                    calculation, EStatus.FAILED, "Resuming results failed")
+                raise
+            RiskValueRepository.finish_bulk_load(
+                self.session, calculation.oid)
+            self.status_tracker.update_status(
+                branch, EStatus.COMPLETE, "Results saved")
+
+        if calculation.status == EStatus.COMPLETE:
+            return calculation
+
+        calculation = CalculationRepository.get_by_id(
+            self.session, calculation.oid)
+        status = self.status_tracker.validate_calculation_completion(
+            calculation.losscalculationbranches
+            if calculation.type == ECalculationType.LOSS
+            else calculation.damagecalculationbranches)
+
+        if status == EStatus.COMPLETE:
+            ResultsService(self.session).save_calculation_statistics(
+                calculation)
+
+        self.status_tracker.update_status(
+            calculation, status, "All calculation branches completed")
+
+        return CalculationRepository.get_by_id(self.session, calculation.oid)
+
     def _run_single_calculation(self,
-                                setting: CalculationBranchSettings
+                                setting: CalculationBranchSettings,
+                                ingest: ResultsIngestExecutor
                                 ) -> CalculationBranchSettings:
         """Run a single calculation branch using OQCalculationAPI.
 
         Args:
             setting: Configuration for the calculation
+            ingest: Executor saving the results of completed branches
 
         Returns:
             Updated branch object
@@ -140,19 +246,24 @@ class CalculationService:
                 "OpenQuake calculation failed for "
                 f"branch {setting.branch.oid}")
 
-        setting.branch = self.status_tracker.update_status(
-            setting.branch,
-            status,
-            f"OpenQuake calculation completed with status: {final_status}")
+        # Save results if calculation completed successfully, the branch
+        # is only COMPLETE once its results are saved
+        if status == EStatus.COMPLETE:
+            setting.branch = self.status_tracker.update_status(
+                setting.branch,
+                EStatus.EXECUTING,
+                "OpenQuake calculation completed, saving results")
 
-        # Save results if calculation completed successfully
-        if setting.branch.status == EStatus.COMPLETE:
             self.logger.info(
                 f'Saving results for calculation branch {setting.branch.oid} '
                 f'with weight {setting.weight}')
-            results_service = ResultsService(self.session,
-                                             api_client=api_client)
-            results_service.save_calculation_results(setting.branch)
+            ingest.submit(setting.branch, api_client=api_client)
+        else:
+            setting.branch = self.status_tracker.update_status(
+                setting.branch,
+                status,
+                "OpenQuake calculation completed with status: "
+                f"{final_status}")
 
         return setting
 
@@ -303,7 +414,7 @@ class CalculationDataService(DataService):
         calculation_files = []
 
         # Generate exposure files
-        exposure_xml, exposure_csv = ExposureService.export_to_buffer(
+        exposure_xml, exposure_csv = ExposureService.export_to_buffer_cached(
             session, working_job['exposure']['exposure_file'])
         exposure_xml.name = 'exposure.xml'
         working_job['exposure']['exposure_file'] = exposure_xml.name
@@ -314,10 +425,11 @@ class CalculationDataService(DataService):
         if 'vulnerability' in working_job.keys():
             for k, v in working_job['vulnerability'].items():
                 if k == 'taxonomy_mapping_csv':
-                    file = TaxonomyService.export_to_buffer(session, v)
+                    file = TaxonomyService.export_to_buffer_cached(session, v)
                     file.name = "{}.csv".format(k.replace('_file', ''))
                 else:
-                    file = VulnerabilityService.export_to_buffer(session, v)
+                    file = VulnerabilityService.export_to_buffer_cached(
+                        session, v)
                     file.name = "{}.xml".format(k.replace('_file', ''))
                 working_job['vulnerability'][k] = file.name
                 calculation_files.append(file)
@@ -325,10 +437,10 @@ class CalculationDataService(DataService):
         elif 'fragility' in working_job.keys():
             for k, v in working_job['fragility'].items():
                 if k == 'taxonomy_mapping_csv':
-                    file = TaxonomyService.export_to_buffer(session, v)
+                    file = TaxonomyService.export_to_buffer_cached(session, v)
                     file.name = "{}.csv".format(k.replace('_file', ''))
                 else:
-                    file = FragilityService.export_to_buffer(session, v)
+                    file = FragilityService.export_to_buffer_cached(session, v)
                     file.name = "{}.xml".format(k.replace('_file', ''))
                 working_job['fragility'][k] = file.name
                 calculation_files.append(file)
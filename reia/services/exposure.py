@@ -7,12 +7,15 @@ from reia.repositories.asset import (AggregationGeometryRepository,
                                      AssetRepository, ExposureModelRepository)
 from reia.repositories.types import SessionType
 from reia.schemas.exposure_schema import ExposureModel
-from reia.services import DataService
+from reia.services import DataService, get_input_cache
 from reia.services.logger import LoggerService
+from reia.utils import prefetch
 
 
 class ExposureService(DataService):
     logger = LoggerService.get_logger(__name__)
+    input_type = 'exposure'
+    input_template = 'exposure.xml'
 
     @classmethod
     def import_from_file(
@@ -32,25 +35,26 @@ class ExposureService(DataService):
         """
         cls.logger.info(f"Importing exposure model '{name}' from {file_path}")
         with open(file_path, 'r') as f:
-            exposure, sites, assets, aggregationtags, assoc_table = \
-                parse_exposure(f)
+            exposure, chunks = parse_exposure(f)
 
         exposure.name = name
 
         exposuremodel = ExposureModelRepository.create(session, exposure)
         cls.logger.debug(f"Created exposure model with OID {exposuremodel.oid}")
 
-        # Add the exposure model OID to all DataFrames
-        sites['_exposuremodel_oid'] = exposuremodel.oid
-        assets['_exposuremodel_oid'] = exposuremodel.oid
-        aggregationtags['_exposuremodel_oid'] = exposuremodel.oid
-
-        AssetRepository.insert_from_exposuremodel(
-            session, sites, assets, aggregationtags, assoc_table)
+        # the next chunk is parsed while the current one is copied
+        assets_oids, _ = AssetRepository.insert_from_exposuremodel(
+            session, exposuremodel.oid, prefetch(chunks))
 
         cls.logger.info(
             f"Successfully imported exposure model '{name}' "
-            f"with {len(assets)} assets")
+            f"with {len(assets_oids)} assets")
+
+        # rendering the exposure files is the slowest part of preparing a
+        # calculation, they are cached right away instead of on first use
+        if get_input_cache(session) is not None:
+            cls.export_to_buffer_cached(session, exposuremodel.oid)
+
         return exposuremodel
 
     @classmethod
@@ -12,6 +12,8 @@ from reia.services.logger import LoggerService
 
 class FragilityService(DataService):
     logger = LoggerService.get_logger(__name__)
+    input_type = 'fragility'
+    input_template = 'fragility.xml'
 
     @classmethod
     def import_from_file(
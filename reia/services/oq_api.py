@@ -1,7 +1,9 @@
+import hashlib
 import io
 import logging
 import sys
 import time
+from pathlib import Path
 
 import requests
 from openquake.calculators.extract import WebExtractor
@@ -11,6 +13,8 @@ from openquake.server import dbserver
 
 from reia.config.settings import REIASettings
 
+DOWNLOAD_CHUNK_SIZE = 4 * 1024**2
+
 
 class APIConnection():
     def __init__(self, server: str, auth: dict, logger_name: str = '__name__'):
@@ -173,9 +177,13 @@ class OQCalculationAPI(APIConnection):
         self.files = self.files | {
             f'input_model_{i + 1}': v for i, v in enumerate(args)}
 
-    def get_result(self) -> datastore.DataStore:
+    def get_result(self) -> 'datastore.DataStore | RemoteDataStore':
         """Get calculation results as datastore.
 
+        Remote calculations are read through a `RemoteDataStore` without
+        registering them in the local OpenQuake database, unless
+        `oq_register_remote` is set.
+
         Returns:
             OpenQuake datastore with calculation results
         """
@@ -183,10 +191,128 @@ class OQCalculationAPI(APIConnection):
 
         # if id doesn not exist locally, try getting it on remote
         job = logs.dbcmd('get_job', self.id)
-        if job is None:
+        if job is not None:
+            return datastore.read(self.id)
+
+        if self.config.oq_register_remote:
             oqapi_import_remote_calculation(self.id, self.config)
+            return datastore.read(self.id)
+
+        return RemoteDataStore(self)
+
+    def download_datastore(self, directory: str | None = None) -> Path:
+        """Download the datastore of the calculation from the server.
+
+        The file is streamed to disk and a partial download is resumed
+        with a HTTP Range request if the server supports it, otherwise
+        it is downloaded again from the start.
+
+        Args:
+            directory: Target directory, defaults to `oq_download_dir`.
+                The datastores of every server are kept in their own
+                subdirectory, as job ids are only unique per server.
+
+        Returns:
+            Path to the downloaded datastore.
+        """
+        if self.id is None:
+            raise ValueError('No calculation dispatched yet.')
+
+        server = hashlib.sha256(self.server.encode()).hexdigest()[:12]
+        directory = Path(directory or self.config.oq_download_dir) / server
+        directory.mkdir(parents=True, exist_ok=True)
 
-        return datastore.read(self.id)
+        path = directory / f'calc_{self.id}.hdf5'
+        if path.exists():
+            return path
+
+        partial = path.with_suffix('.hdf5.part')
+        offset = partial.stat().st_size if partial.exists() else 0
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+
+        with self.session.get(f'{self.url}/{self.id}/datastore',
+                              headers=headers, stream=True) as response:
+            if response.status_code == 416:  # partial file is complete
+                partial.rename(path)
+                return path
+            response.raise_for_status()
+
+            if response.status_code != 206:
+                offset = 0  # range not supported, start over
+            self.logger.info(
+                f'Downloading datastore of calculation {self.id} '
+                f'to {path}' + (f' from byte {offset}' if offset else ''))
+
+            with open(partial, 'ab' if offset else 'wb') as f:
+                for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+
+            expected = offset + int(response.headers['Content-Length']) \
+                if 'Content-Length' in response.headers else None
+
+        if expected is not None and partial.stat().st_size != expected:
+            raise IOError(
+                f'Incomplete download of calculation {self.id}: '
+                f'{partial.stat().st_size} of {expected} bytes.')
+
+        partial.rename(path)
+        return path
+
+
+class RemoteDataStore:
+    """Results of a calculation on a remote OpenQuake server.
+
+    `oqparam` and the datasets in `EXTRACTED` are fetched through the
+    extract API of the server. The datastore is only downloaded, see
+    `OQCalculationAPI.download_datastore`, once another dataset is read,
+    and is deleted by `close(remove=True)`.
+    """
+    EXTRACTED = ('agg_keys', 'events', 'weights')
+
+    def __init__(self, api: OQCalculationAPI):
+        self.api = api
+        auth = api.config.oq_api_auth
+        self.extractor = WebExtractor(api.id,
+                                      api.server,
+                                      auth['username'],
+                                      auth['password'])
+        self.extracted = {}
+        self.path = None
+        self._dstore = None
+
+    @property
+    def dstore(self) -> datastore.DataStore:
+        """The downloaded datastore."""
+        if self._dstore is None:
+            self.path = self.api.download_datastore()
+            self._dstore = datastore.read(str(self.path))
+        return self._dstore
+
+    def __getitem__(self, key: str):
+        if key == 'oqparam':
+            return self.extractor.oqparam
+        if key in self.EXTRACTED:
+            if key not in self.extracted:
+                self.extracted[key] = self.extractor.get(key).array
+            return self.extracted[key]
+        return self.dstore[key]
+
+    def read_df(self, *args, **kwargs):
+        return self.dstore.read_df(*args, **kwargs)
+
+    def close(self, remove: bool = False) -> None:
+        """Close the datastore.
+
+        Args:
+            remove: Delete the downloaded datastore, otherwise it is
+                reused when the results are read again.
+        """
+        self.extractor.close()
+        if self._dstore is not None:
+            self._dstore.close()
+            self._dstore = None
+        if remove and self.path is not None:
+            self.path.unlink(missing_ok=True)
 
 
 def oqapi_import_remote_calculation(
@@ -1,15 +1,31 @@
+from collections.abc import Iterator
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
 from openquake.commonlib.datastore import read
+from sqlalchemy.orm import sessionmaker
 
 from reia.config.settings import get_settings
-from reia.io.results import (extract_risk_from_datastore,
+from reia.io.results import (LOSSCATEGORY_NAMES, build_aggregation_lookup,
+                             drop_zero_losses,
+                             extract_metadata_from_datastore,
+                             iter_risk_from_datastore,
+                             prepare_aggregation_keys_for_storage,
+                             prepare_event_arrays_for_storage,
+                             prepare_events_for_storage,
                              prepare_risk_data_for_storage)
+from reia.io.results_cache import ResultsCache
 from reia.repositories.asset import AggregationTagRepository
+from reia.repositories.calculation import CalculationRepository
 from reia.repositories.lossvalue import RiskValueRepository
 from reia.repositories.types import SessionType
-from reia.schemas.calculation_schemas import CalculationBranch
-from reia.schemas.enums import ERiskType
+from reia.schemas.calculation_schemas import Calculation, CalculationBranch
+from reia.schemas.enums import EResultsLayout, ERiskType
 from reia.services.logger import LoggerService
-from reia.services.oq_api import OQCalculationAPI
+from reia.services.oq_api import OQCalculationAPI, RemoteDataStore
+from reia.utils import prefetch
 
 
 class ResultsService:
@@ -24,6 +40,7 @@ class ResultsService:
         self.config = get_settings()
         self.api_client = api_client
         self.dstore_path = dstore_path
+        self.dstore = None
 
     def save_calculation_results(
             self,
@@ -40,45 +57,288 @@ class ResultsService:
         self.logger.info("Retrieving results for calculation "
                          f"branch {calculationbranch.oid}")
 
+        # Continue after the chunks saved by a previous, interrupted attempt
+        job_id = self._job_id()
+        chunk_size = self.config.results_chunk_size
+        start_chunk = RiskValueRepository.resume_ingestion(
+            self.session, calculationbranch, job_id, chunk_size)
+        if start_chunk > 0:
+            self.logger.info(f"Resuming results of calculation branch "
+                             f"{calculationbranch.oid} at chunk {start_chunk}")
+
+        metadata, agg_keys, raw_chunks = self._load_results(start_chunk)
+        risk_type = ERiskType(metadata['calculation_mode'])
+
+        # Bulk fetch aggregation tags once per exposuremodel
+        aggregation_tags_list = AggregationTagRepository.get_by_exposuremodel(
+            self.session, calculationbranch.exposuremodel_oid,
+            types=metadata['aggregation_types'])
+
+        # Resolve every agg_id to its tags once per datastore
+        aggregation_lookup = build_aggregation_lookup(
+            agg_keys, aggregation_tags_list)
+
+        layout = CalculationRepository.get_results_layout(
+            self.session, calculationbranch.calculation_oid)
+
+        if layout != EResultsLayout.EVENTARRAY:
+            RiskValueRepository.create_partitions(
+                self.session, calculationbranch.calculation_oid,
+                metadata['loss_categories'])
+
+        if layout == EResultsLayout.AGGREGATIONKEY and start_chunk == 0:
+            RiskValueRepository.insert_aggregation_keys(
+                self.session, prepare_aggregation_keys_for_storage(
+                    calculationbranch, aggregation_lookup))
+
+        # Extract and prepare risk values slice by slice in the background
+        # while the previous slice is copied to the database
+        self.logger.debug(f"Streaming {risk_type.name} risk values")
+
+        sparse = self.config.results_sparse and risk_type == ERiskType.LOSS
+
+        def ledger_chunks():
+            for chunk, raw_risk_values in enumerate(raw_chunks, start_chunk):
+                losscategory_counts = np.bincount(
+                    raw_risk_values['losscategory'].cat.codes,
+                    minlength=len(LOSSCATEGORY_NAMES))
+                ledger_entry = {
+                    '_calculation_oid': calculationbranch.calculation_oid,
+                    '_calculationbranch_oid': calculationbranch.oid,
+                    'chunk': chunk,
+                    'jobid': job_id,
+                    'chunksize': chunk_size,
+                    'losscategories': [
+                        LOSSCATEGORY_NAMES[i]
+                        for i in np.flatnonzero(losscategory_counts)]}
+                if sparse:
+                    raw_risk_values = drop_zero_losses(raw_risk_values)
+                yield ledger_entry, raw_risk_values
+
+        n_risk_values = 0
+        if layout == EResultsLayout.EVENTARRAY:
+            # the arrays of every chunk are staged together with the
+            # chunk's ledger entry and merged once all chunks are saved
+            def prepared_arrays():
+                for ledger_entry, chunk in ledger_chunks():
+                    if chunk.empty:
+                        yield ledger_entry, 0, None
+                        continue
+                    yield ledger_entry, len(chunk), \
+                        prepare_event_arrays_for_storage(
+                            chunk, calculationbranch, risk_type,
+                            aggregation_lookup)
+
+            for ledger_entry, n_chunk, event_arrays in prefetch(
+                    prepared_arrays(), self.config.results_queue_size):
+                if event_arrays is None or event_arrays.empty:
+                    RiskValueRepository.insert_ledger_entries(
+                        self.session, [ledger_entry])
+                    continue
+
+                self.logger.debug(
+                    f"Staging {n_chunk} risk values as event arrays")
+
+                RiskValueRepository.stage_event_arrays(
+                    self.session, event_arrays, ledger_entry)
+                n_risk_values += n_chunk
+
+            RiskValueRepository.merge_event_arrays(
+                self.session, calculationbranch)
+        else:
+            def prepared_chunks():
+                for ledger_entry, chunk in ledger_chunks():
+                    if chunk.empty:
+                        yield ledger_entry, None, None, None
+                        continue
+                    risk_values, df_agg_val = prepare_risk_data_for_storage(
+                        chunk, calculationbranch, risk_type,
+                        aggregation_lookup, layout)
+                    yield ledger_entry, risk_values, df_agg_val, \
+                        prepare_events_for_storage(chunk, calculationbranch)
+
+            for ledger_entry, risk_values, df_agg_val, events in prefetch(
+                    prepared_chunks(), self.config.results_queue_size):
+                if risk_values is None:
+                    RiskValueRepository.insert_ledger_entries(
+                        self.session, [ledger_entry])
+                    continue
+
+                self.logger.debug(
+                    f"Saving {len(risk_values)} risk values to database")
+
+                RiskValueRepository.insert_many(
+                    self.session, risk_values, df_agg_val, ledger_entry,
+                    events)
+                n_risk_values += len(risk_values)
+
+        self.logger.debug(f"Saved {n_risk_values} risk value records")
+
+        # The statistics treat the event weight missing from the stored
+        # values as zero values, record the total to complete it
+        RiskValueRepository.insert_total_weights(
+            self.session, calculationbranch,
+            metadata['event_weight'] * calculationbranch.weight)
+
+        # a downloaded remote datastore isn't needed once its results
+        # are saved, it is kept for a resume if saving fails
+        if isinstance(self.dstore, RemoteDataStore):
+            self.dstore.close(remove=True)
+
+        self.logger.info("Successfully saved results for "
+                         f"calculation branch {calculationbranch.oid}")
+
+    def _job_id(self) -> str | None:
+        """OpenQuake job id of the results, if known without reading them."""
+        if self.api_client is not None and self.api_client.id is not None:
+            return str(self.api_client.id)
+        if self.dstore_path is not None:
+            return Path(self.dstore_path).stem.removeprefix('calc_')
+        return None
+
+    def _results_source(self) -> str | None:
+        """Where the results are read from, the server URL or the path."""
+        if self.api_client is not None:
+            return self.api_client.server
+        if self.dstore_path is not None:
+            return str(Path(self.dstore_path).resolve())
+        return None
+
+    def _load_results(self, start_chunk: int = 0
+                      ) -> tuple[dict, np.ndarray, Iterator[pd.DataFrame]]:
+        """Load the extracted risk values, from the cache if possible.
+
+        Args:
+            start_chunk: Index of the first chunk of
+                `results_chunk_size` rows to load.
+
+        Returns:
+            Tuple of (metadata as returned by
+            `extract_metadata_from_datastore`, agg_keys, risk value chunks
+            as returned by `iter_risk_from_datastore`).
+        """
+        job_id = self._job_id()
+        source = self._results_source()
+        chunk_size = self.config.results_chunk_size
+        cache = None
+        if self.config.results_cache_dir and job_id is not None:
+            cache = ResultsCache(self.config.results_cache_dir,
+                                 self.config.results_cache_size)
+
+            cached = cache.get(job_id, source, start_chunk=start_chunk)
+            # the cached chunks need the same boundaries as the ledger
+            if cached is not None and \
+                    cached[0].get('chunk_size') == chunk_size:
+                self.logger.info(f"Loading results of job {job_id} "
+                                 "from the results cache")
+                return cached
+
         if self.api_client is not None:
             dstore = self.api_client.get_result()
         elif self.dstore_path is not None:
             dstore = read(self.dstore_path)
         else:
             raise ValueError("No API client or datastore path provided")
+        self.dstore = dstore
 
-        oq_parameter_inputs = dstore['oqparam']
+        metadata = extract_metadata_from_datastore(dstore)
+        agg_keys = dstore['agg_keys'][:]
+        chunks = iter_risk_from_datastore(
+            dstore, ERiskType(metadata['calculation_mode']),
+            chunk_size, start_chunk)
 
-        # Flatten and deduplicate types
-        all_types = {
-            it for sub in oq_parameter_inputs.aggregate_by for it in sub}
+        if cache is not None and start_chunk == 0:
+            chunks = cache.put(job_id, source,
+                               metadata | {'chunk_size': chunk_size},
+                               agg_keys, chunks)
 
-        # Bulk fetch aggregation tags once per exposuremodel
-        aggregation_tags_list = AggregationTagRepository.get_by_exposuremodel(
-            self.session, calculationbranch.exposuremodel_oid,
-            types=list(all_types))
-        aggregation_tag_by_name = {
-            tag.name: tag for tag in aggregation_tags_list}
-
-        risk_type = ERiskType(oq_parameter_inputs.calculation_mode)
-
-        # Extract and prepare risk values using IO functions
-        self.logger.debug(f"Extracting {risk_type.name} risk "
-                          "values from OpenQuake datastore")
-        raw_risk_values = extract_risk_from_datastore(dstore, risk_type)
-        self.logger.debug(
-            f"Retrieved {len(raw_risk_values)} risk value records")
-        risk_values, df_agg_val = prepare_risk_data_for_storage(
-            raw_risk_values, calculationbranch, risk_type,
-            aggregation_tag_by_name)
-
-        # Save to database
-        self.logger.debug(
-            f"Saving {len(risk_values)} risk values and "
-            f"{len(df_agg_val)} aggregation mappings to database")
-
-        RiskValueRepository.insert_many(
-            self.session, risk_values, df_agg_val)
+        return metadata, agg_keys, chunks
 
-        self.logger.info("Successfully saved results for "
-                         f"calculation branch {calculationbranch.oid}")
+    def save_calculation_statistics(self, calculation: Calculation) -> None:
+        """Precompute the per tag statistics of a completed calculation.
+
+        Args:
+            calculation: The calculation object, all its branches
+                need to be COMPLETE.
+        """
+        self.logger.info("Computing statistics for "
+                         f"calculation {calculation.oid}")
+
+        layout = CalculationRepository.get_results_layout(
+            self.session, calculation.oid)
+
+        n_statistics = RiskValueRepository.insert_statistics(
+            self.session, calculation.oid,
+            ERiskType[calculation.type.name], layout)
+
+        self.logger.debug(f"Saved {n_statistics} statistics records")
+
+
+class ResultsIngestExecutor:
+    """Save the results of several calculation branches in parallel.
+
+    Every branch is ingested in a worker thread with its own database
+    session. The COPY streams of all branches share the process wide
+    copy loader, which bounds the number of concurrent streams.
+    """
+
+    def __init__(self,
+                 session: SessionType,
+                 max_workers: int | None = None):
+        self.logger = LoggerService.get_logger(__name__)
+        self.session_factory = sessionmaker(session.get_bind(),
+                                            expire_on_commit=True)
+        self.executor = ThreadPoolExecutor(
+            max_workers or get_settings().results_ingest_workers,
+            thread_name_prefix='ingest')
+        self.futures: dict[int, Future] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # don't start queued branches if the calculation was interrupted
+        self.executor.shutdown(wait=True,
+                               cancel_futures=exc_type is not None)
+
+    def submit(self,
+               calculationbranch: CalculationBranch,
+               api_client: OQCalculationAPI | None = None,
+               dstore_path: str | None = None) -> None:
+        """Queue the results of a completed branch for saving.
+
+        Args:
+            calculationbranch: The calculation branch object
+            api_client: OpenQuake API client of the branch calculation
+            dstore_path: Path to the datastore if no API client is given
+        """
+        self.futures[calculationbranch.oid] = self.executor.submit(
+            self._save, calculationbranch, api_client, dstore_path)
+
+    def _save(self,
+              calculationbranch: CalculationBranch,
+              api_client: OQCalculationAPI | None,
+              dstore_path: str | None) -> None:
+        with self.session_factory() as session:
+            ResultsService(session, api_client, dstore_path) \
+                .save_calculation_results(calculationbranch)
+
+    def wait(self) -> dict[int, BaseException | None]:
+        """Wait for all queued branches to be saved.
+
+        Returns:
+            The exception raised while saving each branch, by branch
+            oid, or None if its results were saved successfully.
+        """
+        wait(self.futures.values())
+
+        errors = {oid: future.exception()
+                  for oid, future in self.futures.items()}
+        for oid, error in errors.items():
+            if error is not None:
+                self.logger.error(
+                    f"Saving results for calculation branch {oid} "
+                    f"failed: {error!r}", exc_info=error)
+        self.futures = {}
+
+        return errors
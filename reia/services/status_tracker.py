@@ -82,10 +82,10 @@ class StatusTracker:
                 EStatus.FAILED, EStatus.ABORTED},
             EStatus.EXECUTING: {
                 EStatus.COMPLETE, EStatus.FAILED, EStatus.ABORTED},
-            # Terminal states cannot transition
             EStatus.COMPLETE: set(),
-            EStatus.FAILED: set(),
-            EStatus.ABORTED: set(),
+            # Saving the results can be resumed after a failure
+            EStatus.FAILED: {EStatus.EXECUTING},
+            EStatus.ABORTED: {EStatus.EXECUTING},
         }
 
         # Allow staying in the same status (idempotent updates)
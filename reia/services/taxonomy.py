@@ -14,6 +14,7 @@ from reia.services.logger import LoggerService
 
 class TaxonomyService(DataService):
     logger = LoggerService.get_logger(__name__)
+    input_type = 'taxonomy'
 
     @classmethod
     def import_from_file(
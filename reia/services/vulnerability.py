@@ -12,6 +12,8 @@ from reia.services.logger import LoggerService
 
 class VulnerabilityService(DataService):
     logger = LoggerService.get_logger(__name__)
+    input_type = 'vulnerability'
+    input_template = 'vulnerability.xml'
 
     @classmethod
     def import_from_file(
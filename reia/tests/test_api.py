@@ -1,9 +1,10 @@
 import signal
 from io import StringIO
 from pathlib import Path
+from unittest.mock import MagicMock, patch
 
 from reia.config.settings import get_settings
-from reia.services.oq_api import OQCalculationAPI
+from reia.services.oq_api import OQCalculationAPI, RemoteDataStore
 
 
 def test_api():
@@ -43,5 +44,106 @@ def test_api():
 
         assert final_status == 'complete', "Expected 'complete' " \
             f"but got '{final_status}'"
+
     finally:
         signal.alarm(0)  # Disable the alarm
+
+
+def datastore_server(content: bytes, supports_range: bool = True):
+    """Fake `/datastore` endpoint answering HTTP Range requests."""
+    def get(url, headers=None, stream=False):
+        offset = int(headers['Range'][6:-1]) \
+            if headers and supports_range else 0
+        body = content[offset:]
+
+        response = MagicMock()
+        response.__enter__.return_value = response
+        response.headers = {'Content-Length': str(len(body))}
+        if offset >= len(content):
+            response.status_code = 416
+        else:
+            response.status_code = 206 if offset else 200
+        response.iter_content.side_effect = lambda size: (
+            body[i:i + size] for i in range(0, len(body), size))
+        return response
+    return MagicMock(side_effect=get)
+
+
+def test_download_datastore(tmp_path):
+    content = bytes(range(256)) * 100
+
+    with patch.object(OQCalculationAPI, 'authenticate'):
+        api = OQCalculationAPI(get_settings())
+    api.id = 42
+
+    api.session.get = datastore_server(content)
+    path = api.download_datastore(tmp_path)
+    partial = path.with_suffix('.hdf5.part')
+    assert path.name == 'calc_42.hdf5'
+    assert path.parent.parent == tmp_path
+    assert path.read_bytes() == content
+    assert api.session.get.call_args.kwargs['headers'] == {}
+
+    # an existing datastore is not downloaded again
+    assert api.download_datastore(tmp_path) == path
+    assert api.session.get.call_count == 1
+
+    # resume a partial download
+    path.unlink()
+    partial.write_bytes(content[:1000])
+    assert api.download_datastore(tmp_path) == path
+    assert path.read_bytes() == content
+    assert not partial.exists()
+    assert api.session.get.call_args.kwargs['headers'] == {
+        'Range': 'bytes=1000-'}
+
+    # a complete partial download is only renamed
+    path.rename(partial)
+    assert api.download_datastore(tmp_path) == path
+    assert path.read_bytes() == content
+
+    # start over if the server ignores the range
+    path.unlink()
+    partial.write_bytes(b'x' * 1000)
+    api.session.get = datastore_server(content, supports_range=False)
+    assert api.download_datastore(tmp_path) == path
+    assert path.read_bytes() == content
+
+    # the same job id on another server
+    api.server = 'http://other:8800'
+    assert api.download_datastore(tmp_path).parent != path.parent
+
+
+def test_remote_datastore(tmp_path):
+    with patch.object(OQCalculationAPI, 'authenticate'):
+        api = OQCalculationAPI(get_settings())
+    api.id = 42
+    path = tmp_path / 'calc_42.hdf5'
+    path.write_bytes(b'datastore')
+    api.download_datastore = MagicMock(return_value=path)
+
+    with patch('reia.services.oq_api.WebExtractor') as extractor:
+        extractor.return_value.get.side_effect = \
+            lambda what: MagicMock(array=f'extracted {what}')
+        dstore = RemoteDataStore(api)
+
+        assert dstore['oqparam'] is extractor.return_value.oqparam
+        assert dstore['agg_keys'] == 'extracted agg_keys'
+        assert dstore['weights'] == 'extracted weights'
+        assert dstore['events'] == 'extracted events'
+        assert dstore['events'] == 'extracted events'
+
+        # the small datasets are extracted once, without downloading
+        assert extractor.return_value.get.call_count == 3
+        api.download_datastore.assert_not_called()
+
+        with patch('reia.services.oq_api.datastore.read') as read:
+            dstore.read_df('risk_by_event')
+            read.assert_called_once_with(str(path))
+
+            # the downloaded datastore is kept unless it is removed
+            dstore.close()
+            assert path.exists()
+            dstore.read_df('risk_by_event')
+            dstore.close(remove=True)
+            assert not path.exists()
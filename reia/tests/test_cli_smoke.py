@@ -58,6 +58,15 @@ def test_cli_function_imports():
     assert callable(cli.list_risk_assessment)
     assert callable(cli.run_risk_assessment)
 
+    # Cache commands
+    assert callable(cli.list_cache)
+    assert callable(cli.purge_cache)
+    assert callable(cli.list_input_cache)
+    assert callable(cli.purge_input_cache)
+
+    # Database commands
+    assert callable(cli.riskvalue_storage)
+
 
 def test_cli_help_commands():
     """Test that CLI help commands work without crashing."""
@@ -90,6 +99,9 @@ def test_cli_help_commands():
     result = runner.invoke(cli.app, ["risk-assessment", "--help"])
     assert result.exit_code == 0
 
+    result = runner.invoke(cli.app, ["cache", "--help"])
+    assert result.exit_code == 0
+
 
 def test_cli_command_help():
     """Test individual command help without executing."""
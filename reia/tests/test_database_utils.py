@@ -1,10 +1,16 @@
+import numpy as np
 import pandas as pd
 import pytest
+from psycopg2.errors import LockNotAvailable
 from psycopg2.extensions import connection
 
 from reia.repositories.utils import (copy_from_dataframe, copy_pooled,
                                      copy_raw, db_cursor_from_session,
-                                     drop_dynamic_table, make_connection)
+                                     drop_dynamic_table,
+                                     get_binary_column_types,
+                                     get_copy_loader, get_database_identity,
+                                     make_connection,
+                                     reserve_oids, split_by_column)
 
 
 @pytest.fixture(scope='function')
@@ -47,6 +53,98 @@ def test_copy_from_dataframe(db_session, test_table):
         assert rows == [(1, 'A', 10.5), (2, 'B', 20.0), (3, 'C', 30.5)]
 
 
+@pytest.mark.parametrize('copy_format', ['binary', 'csv'])
+def test_copy_from_dataframe_formats(db_session, copy_format):
+    with db_cursor_from_session(db_session) as cursor:
+        cursor.execute("""
+            CREATE TABLE test_types (
+                id BIGINT,
+                category elosscategory,
+                name TEXT,
+                value DOUBLE PRECISION,
+                ratio REAL
+            );
+        """)
+
+    df = pd.DataFrame({
+        'id': [1, 2, 3],
+        'category': pd.Categorical(['STRUCTURAL', 'CONTENTS', None]),
+        'name': ['A', None, 'Ä'],
+        'value': [0.1, np.nan, 1 / 3],
+        'ratio': [0.5, 1.0, 0.25]
+    })
+
+    try:
+        with db_cursor_from_session(db_session) as cursor:
+            copy_from_dataframe(cursor, df, 'test_types', copy_format)
+
+        with db_cursor_from_session(db_session) as cursor:
+            cursor.execute("SELECT * FROM test_types ORDER BY id;")
+            rows = cursor.fetchall()
+            assert rows == [
+                (1, 'STRUCTURAL', 'A', 0.1, 0.5),
+                (2, 'CONTENTS', None, None, 1.0),
+                (3, None, 'Ä', 1 / 3, 0.25)]
+    finally:
+        with db_cursor_from_session(db_session) as cursor:
+            cursor.execute("DROP TABLE IF EXISTS test_types;")
+
+
+def test_copy_from_dataframe_binary_array(db_session):
+    with db_cursor_from_session(db_session) as cursor:
+        cursor.execute(
+            "CREATE TABLE test_arrays (id INTEGER, values_array REAL[]);")
+
+    df = pd.DataFrame({'id': [1, 2, 3],
+                       'values_array': [np.array([1.0, 2.5]), [], None]})
+
+    try:
+        with db_cursor_from_session(db_session) as cursor:
+            copy_from_dataframe(cursor, df, 'test_arrays', 'binary')
+
+        with db_cursor_from_session(db_session) as cursor:
+            cursor.execute("SELECT * FROM test_arrays ORDER BY id;")
+            assert cursor.fetchall() == [(1, [1.0, 2.5]), (2, []), (3, None)]
+    finally:
+        with db_cursor_from_session(db_session) as cursor:
+            cursor.execute("DROP TABLE IF EXISTS test_arrays;")
+
+
+def test_copy_from_dataframe_binary_order(db_session):
+    with db_cursor_from_session(db_session) as cursor:
+        cursor.execute(
+            "CREATE TABLE test_order (name TEXT, value DOUBLE PRECISION);")
+
+    # rows of different field lengths alternate
+    df = pd.DataFrame({'name': ['a', None, 'ccc', 'bb', None, 'a', 'dddd'],
+                       'value': [1.0, 2.0, np.nan, 4.0, np.nan, 6.0, 7.0]})
+
+    try:
+        with db_cursor_from_session(db_session) as cursor:
+            copy_from_dataframe(cursor, df, 'test_order', 'binary')
+
+        with db_cursor_from_session(db_session) as cursor:
+            cursor.execute("SELECT name, value FROM test_order ORDER BY ctid;")
+            assert cursor.fetchall() == [
+                ('a', 1.0), (None, 2.0), ('ccc', None), ('bb', 4.0),
+                (None, None), ('a', 6.0), ('dddd', 7.0)]
+    finally:
+        with db_cursor_from_session(db_session) as cursor:
+            cursor.execute("DROP TABLE IF EXISTS test_order;")
+
+
+def test_get_binary_column_types(db_session, test_table):
+    with db_cursor_from_session(db_session) as cursor:
+        assert get_binary_column_types(
+            cursor, test_table, ['value', 'name', 'id']) == \
+            [('float8', None), ('text', None), ('int4', None)]
+
+        # unsupported types fall back to CSV
+        cursor.execute("ALTER TABLE test_table ADD COLUMN created DATE;")
+        assert get_binary_column_types(
+            cursor, test_table, ['id', 'created']) is None
+
+
 def test_copy_pooled(db_session, test_table):
     """
     Test the copy_from_dataframe function with a pooled connection.
@@ -65,6 +163,83 @@ def test_copy_pooled(db_session, test_table):
         assert rows == [(1, 'A', 10.5), (2, 'B', 20.0), (3, 'C', 30.5)]
 
 
+def test_copy_loader_is_reused(db_session, test_table):
+    loader = get_copy_loader()
+    assert get_copy_loader() is loader
+
+    df = pd.DataFrame({'id': [1, 2], 'name': ['A', 'B'], 'value': [1.0, 2.0]})
+    copy_pooled(df, test_table, max_entries=1)
+    assert get_copy_loader() is loader
+
+    with db_cursor_from_session(db_session) as cursor:
+        cursor.execute("SELECT count(*) FROM test_table;")
+        assert cursor.fetchone()[0] == 2
+
+
+def test_split_by_column():
+    df = pd.DataFrame({
+        'category': pd.Categorical(['B', 'A', 'B', 'C', 'A']),
+        'value': [0, 1, 2, 3, 4]})
+
+    groups = split_by_column(df, 'category')
+
+    assert [value for value, _ in groups] == ['B', 'A', 'C']
+    assert [rows['value'].tolist() for _, rows in groups] == \
+        [[0, 2], [1, 4], [3]]
+
+
+def test_reserve_oids(db_session, test_table):
+    with db_cursor_from_session(db_session) as cursor:
+        first = reserve_oids(cursor, test_table, 'id', 10)
+    with db_cursor_from_session(db_session) as cursor:
+        second = reserve_oids(cursor, test_table, 'id', 3)
+        cursor.execute("SELECT nextval(pg_get_serial_sequence(%s, 'id'));",
+                       (test_table,))
+        after = cursor.fetchone()[0]
+
+    assert second == first + 10
+    assert after == second + 3
+
+    # nothing to reserve, the sequence is not advanced
+    with db_cursor_from_session(db_session) as cursor:
+        assert reserve_oids(cursor, test_table, 'id', 0) == 0
+        cursor.execute("SELECT nextval(pg_get_serial_sequence(%s, 'id'));",
+                       (test_table,))
+        assert cursor.fetchone()[0] == after + 1
+
+
+def test_reserve_oids_blocks_inserts(db_session, test_table):
+    reserving, inserting = make_connection(), make_connection()
+    try:
+        with reserving.cursor() as cursor:
+            start = reserve_oids(cursor, test_table, 'id', 3)
+
+        # inserts drawing from the sequence wait for the reservation
+        with inserting.cursor() as cursor:
+            cursor.execute("SET lock_timeout = '100ms';")
+            with pytest.raises(LockNotAvailable):
+                cursor.execute(
+                    f"INSERT INTO {test_table} (name) VALUES ('A');")
+        inserting.rollback()
+        reserving.commit()
+
+        with inserting.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {test_table} (name) VALUES ('A') "
+                           "RETURNING id;")
+            assert cursor.fetchone()[0] == start + 3
+        inserting.commit()
+    finally:
+        reserving.close()
+        inserting.close()
+
+
+def test_database_identity(db_session):
+    identity = get_database_identity(db_session.connection())
+
+    assert len(identity) == 12
+    assert get_database_identity(db_session.connection()) == identity
+
+
 def test_make_connection():
     conn = make_connection()
     assert isinstance(conn, connection)
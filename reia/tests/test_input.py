@@ -1,8 +1,13 @@
+import io
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
+from sqlalchemy import text
 
+from reia.io.read import (_normalize_tags, iter_exposure_assets,
+                          parse_exposure)
+from reia.repositories.asset import AggregationTagRepository
 from reia.services.exposure import ExposureService
 from reia.services.fragility import FragilityService
 from reia.services.vulnerability import VulnerabilityService
@@ -65,6 +70,142 @@ def test_exposuremodel(db_session):
         "Database-generated exposure model does not match original CSV data"
 
 
+def test_building_counts(db_session):
+    exposure_model = ExposureService.import_from_file(
+        db_session,
+        file_path=DATAFOLDER / 'exposure_test.xml',
+        name='Test Exposure Model'
+    )
+
+    query = text("""
+        SELECT bc.aggregationtype, lat.name, bc.buildingcount
+        FROM loss_buildingcount bc
+        JOIN loss_aggregationtag lat ON lat._oid = bc.aggregationtag
+            AND lat.type = bc.aggregationtype
+        WHERE bc._exposuremodel_oid = :oid
+    """)
+    counts = {(tagtype, name): count for tagtype, name, count in
+              db_session.execute(query, {'oid': exposure_model.oid})}
+
+    exposure_raw = pd.read_csv(DATAFOLDER / 'exposure_test.csv')
+    expected = {
+        (tagtype, name): count
+        for tagtype in ['Canton', 'CantonGemeinde']
+        for name, count in exposure_raw.groupby(tagtype)['number'].sum()
+        .items()}
+    assert counts == expected
+
+
+def test_insert_aggregationtags(db_session):
+    exposure_model = ExposureService.import_from_file(
+        db_session,
+        file_path=DATAFOLDER / 'exposure_test.xml',
+        name='Test Exposure Model'
+    )
+    existing = {(tag.type, tag.name): tag.oid for tag in
+                AggregationTagRepository.get_by_exposuremodel(
+                    db_session, exposure_model.oid)}
+    (type_a, name_a), (type_b, name_b) = sorted(existing)[:2]
+
+    # new and existing tags in shuffled order
+    aggregationtags = pd.DataFrame({
+        'type': ['Canton', type_b, 'CantonGemeinde', type_a],
+        'name': ['NEW', name_b, 'NEW-Gemeinde', name_a],
+        '_exposuremodel_oid': exposure_model.oid})
+
+    oids = AggregationTagRepository.insert_many(db_session, aggregationtags)
+
+    assert len(oids) == 4
+    assert oids[1] == existing[(type_b, name_b)]
+    assert oids[3] == existing[(type_a, name_a)]
+
+    tags = AggregationTagRepository.get_by_exposuremodel(
+        db_session, exposure_model.oid)
+    assert len(tags) == len(existing) + 2
+    inserted = {(tag.type, tag.name): tag.oid for tag in tags}
+    assert oids[0] == inserted[('Canton', 'NEW')]
+    assert oids[2] == inserted[('CantonGemeinde', 'NEW-Gemeinde')]
+
+    # inserting the same tags again returns the same oids
+    np.testing.assert_array_equal(
+        AggregationTagRepository.insert_many(
+            db_session, aggregationtags.iloc[::-1]),
+        oids[::-1])
+    assert len(AggregationTagRepository.get_by_exposuremodel(
+        db_session, exposure_model.oid)) == len(existing) + 2
+
+
+def test_parse_exposure_chunks():
+    with open(DATAFOLDER / 'exposure_test.xml', 'r') as f:
+        _, chunks = parse_exposure(f, chunksize=7)
+    chunks = list(chunks)
+
+    with open(DATAFOLDER / 'exposure_test.xml', 'r') as f:
+        _, single = parse_exposure(f, chunksize=10_000)
+    (sites, assets, aggregationtags, assoc), = single
+
+    assert len(chunks) == int(np.ceil(len(assets) / 7))
+
+    # sites and tags are only returned by the first chunk using them
+    sites_chunked = pd.concat([c[0] for c in chunks], ignore_index=True)
+    pd.testing.assert_frame_equal(sites_chunked, sites)
+    tags_chunked = pd.concat([c[2] for c in chunks], ignore_index=True)
+    assert len(tags_chunked) == len(aggregationtags)
+
+    assets_chunked = pd.concat([c[1] for c in chunks])
+    np.testing.assert_array_equal(assets_chunked['_site_oid'],
+                                  assets['_site_oid'])
+    assert assets_chunked['buildingcount'].dtype == 'Int64'
+    assert assets_chunked['taxonomy_concept'].dtype == 'category'
+
+    def resolve(assoc, tags, offset=0):
+        names = tags['name'].to_numpy()[assoc['aggregationtag']]
+        return list(zip(assoc['asset'] + offset,
+                        assoc['aggregationtype'], names))
+
+    offsets = np.cumsum([0] + [len(c[1]) for c in chunks[:-1]])
+    assoc_chunked = [row for c, offset in zip(chunks, offsets)
+                     for row in resolve(c[3], tags_chunked, offset)]
+    assert sorted(assoc_chunked) == sorted(resolve(assoc, aggregationtags))
+
+
+def test_iter_exposure_assets_target_names():
+    file = io.StringIO(
+        'id,longitude,latitude,taxonomy_concept,buildingcount,'
+        'structural,Canton\n'
+        'A1,8.5,47.3,MUR,2,100.0,ZH\n'
+        'A2,7.4,46.9,CR,1,200.0,BE\n')
+
+    df, = iter_exposure_assets(file, ['Canton'], chunksize=10)
+
+    assert list(df['longitude']) == [8.5, 7.4]
+    assert list(df['latitude']) == [47.3, 46.9]
+    assert list(df['taxonomy_concept']) == ['MUR', 'CR']
+    assert df['taxonomy_concept'].dtype == 'category'
+    assert df['buildingcount'].dtype == 'Int64'
+    assert list(df['structuralvalue']) == [100.0, 200.0]
+    assert list(df['Canton']) == ['ZH', 'BE']
+
+
+def test_normalize_tags():
+    assets = pd.DataFrame({
+        'value': [1.0, 2.0, 3.0],
+        'Canton': pd.Categorical(['ZH', 'BE', 'ZH']),
+        'Gemeinde': ['ZH1', None, 'ZH2']})
+
+    values, tags, assoc = _normalize_tags(
+        assets, ['value'], ['Canton', 'Gemeinde'])
+
+    assert list(values.columns) == ['value']
+    assert list(tags.itertuples(index=False, name=None)) == [
+        ('Canton', 'ZH'), ('Canton', 'BE'),
+        ('Gemeinde', 'ZH1'), ('Gemeinde', 'ZH2')]
+    # assets without a tag of a type aren't associated with it
+    assert list(assoc.itertuples(index=False, name=None)) == [
+        (0, 'Canton', 0), (1, 'Canton', 1), (2, 'Canton', 0),
+        (0, 'Gemeinde', 2), (2, 'Gemeinde', 3)]
+
+
 def test_fragilitymodel(db_session):
     fragility_model = FragilityService.import_from_file(
         db_session,
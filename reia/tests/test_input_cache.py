@@ -0,0 +1,80 @@
+import io
+import os
+
+from reia.io.input_cache import InputCache, template_version
+
+
+def buffer(content, name):
+    file = io.StringIO(content)
+    file.name = name
+    return file
+
+
+def test_input_cache_roundtrip(tmp_path):
+    cache = InputCache(tmp_path, max_size=1024**2, database='db1')
+    version = template_version('exposure.xml')
+
+    assert cache.get('exposure', 1, version) is None
+
+    cache.put('exposure', 1, version, [buffer('<xml/>', 'exposure.xml'),
+                                       buffer('id,lon\n', 'assets.csv')])
+    files = cache.get('exposure', 1, version)
+
+    assert [f.name for f in files] == ['exposure.xml', 'assets.csv']
+    assert [f.getvalue() for f in files] == ['<xml/>', 'id,lon\n']
+    assert cache.get('exposure', 1, template_version()) is None
+    assert version != template_version()
+
+
+def test_input_cache_shared_content(tmp_path):
+    cache = InputCache(tmp_path, max_size=1024**2, database='db1')
+    version = template_version()
+
+    cache.put('taxonomy', 1, version, [buffer('a,b\n', 'map.csv')])
+    cache.put('taxonomy', 2, version, [buffer('a,b\n', 'map.csv')])
+
+    # identical files are stored once
+    assert cache.size() == 4
+    assert cache.purge(oid=1) == [cache.key('taxonomy', 1, version)]
+    assert cache.get('taxonomy', 2, version)[0].getvalue() == 'a,b\n'
+    assert cache.purge(model_type='taxonomy') == \
+        [cache.key('taxonomy', 2, version)]
+    assert cache.size() == 0
+
+
+def test_input_cache_databases(tmp_path):
+    cache = InputCache(tmp_path, max_size=1024**2, database='db1')
+    other = InputCache(tmp_path, max_size=1024**2, database='db2')
+    version = template_version()
+
+    cache.put('exposure', 1, version, [buffer('db1', 'assets.csv')])
+    other.put('exposure', 1, version, [buffer('db2', 'assets.csv')])
+
+    # the same oid in another database is another model
+    assert cache.get('exposure', 1, version)[0].getvalue() == 'db1'
+    assert other.get('exposure', 1, version)[0].getvalue() == 'db2'
+
+    # deleting a model only removes the entry of its database
+    assert other.purge('exposure', 1) == [other.key('exposure', 1, version)]
+    assert other.get('exposure', 1, version) is None
+    assert cache.get('exposure', 1, version)[0].getvalue() == 'db1'
+
+
+def test_input_cache_eviction(tmp_path):
+    cache = InputCache(tmp_path, max_size=1024**2, database='db1')
+    version = template_version()
+
+    for i, oid in enumerate([1, 2, 3]):
+        cache.put('taxonomy', oid, version,
+                  [buffer(f'{oid}' * 100, 'map.csv')])
+        # distinct access times, model 1 is accessed last
+        os.utime(tmp_path / 'entries'
+                 / f"{cache.key('taxonomy', oid, version)}.json", (i, i))
+    cache.get('taxonomy', 1, version)
+
+    cache.max_size = 200
+    cache.evict()
+
+    assert [e['key'] for e in cache.entries()] == \
+        [cache.key('taxonomy', 3, version), cache.key('taxonomy', 1, version)]
+    assert cache.size() == 200
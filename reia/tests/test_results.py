@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from reia.io.results import _expand_to_tags, build_aggregation_lookup
+from reia.schemas.asset_schemas import AggregationTag
+
+AGGREGATION_TAGS = [
+    AggregationTag(oid=10, type='Canton', name='GR'),
+    AggregationTag(oid=11, type='Canton', name='ZH'),
+    AggregationTag(oid=20, type='CantonGemeinde', name='GR-Chur'),
+    AggregationTag(oid=21, type='CantonGemeinde', name='ZH-Zurich'),
+]
+
+
+def test_build_aggregation_lookup():
+    agg_keys = np.array([b'GR,GR-Chur', b'ZH', b'ZH,ZH-Zurich'])
+
+    offsets, tags = build_aggregation_lookup(agg_keys, AGGREGATION_TAGS)
+
+    np.testing.assert_array_equal(offsets, [0, 2, 3, 5])
+    assert tags['aggregationtag'].tolist() == [10, 20, 11, 11, 21]
+    assert tags['aggregationtype'].tolist() == [
+        'Canton', 'CantonGemeinde', 'Canton', 'Canton', 'CantonGemeinde']
+
+
+def test_build_aggregation_lookup_unknown_tag():
+    agg_keys = np.array([b'GR', b'BE,BE-Bern'])
+
+    with pytest.raises(ValueError, match=r"\['BE', 'BE-Bern'\]"):
+        build_aggregation_lookup(agg_keys, AGGREGATION_TAGS)
+
+
+def test_expand_to_tags():
+    agg_keys = np.array([b'GR,GR-Chur', b'ZH', b'ZH,ZH-Zurich'])
+    offsets, tags = build_aggregation_lookup(agg_keys, AGGREGATION_TAGS)
+
+    # agg_id of every risk value
+    values_agg_id = np.array([2, 0, 1, 2])
+
+    rows, tag_rows = _expand_to_tags(values_agg_id, offsets)
+
+    # each value is repeated once per tag of its agg_id, in order
+    np.testing.assert_array_equal(rows, [0, 0, 1, 1, 2, 3, 3])
+    np.testing.assert_array_equal(tag_rows, [3, 4, 0, 1, 2, 3, 4])
+    assert tags['aggregationtag'].to_numpy()[tag_rows].tolist() == [
+        11, 21, 10, 20, 11, 11, 21]
+
+
+def test_expand_to_tags_empty():
+    offsets = np.array([0, 2, 3])
+
+    rows, tag_rows = _expand_to_tags(np.array([], dtype=np.int64), offsets)
+
+    assert len(rows) == 0
+    assert len(tag_rows) == 0
@@ -0,0 +1,95 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from reia.io.results import LOSSCATEGORY_NAMES
+from reia.io.results_cache import ResultsCache
+
+SOURCE = 'http://localhost:8800'
+
+
+def risk_chunks(n_chunks=2, n_rows=5):
+    for i in range(n_chunks):
+        yield pd.DataFrame({
+            'eventid': np.arange(n_rows, dtype=np.uint32) + i * n_rows,
+            'aggregationkey': np.full(n_rows, i, dtype=np.uint16),
+            'losscategory': pd.Categorical.from_codes(
+                np.full(n_rows, i, dtype=np.int8),
+                categories=LOSSCATEGORY_NAMES),
+            'loss_value': np.linspace(0, 1, n_rows, dtype=np.float32),
+            'weight': np.full(n_rows, 0.1)})
+
+
+def test_results_cache_roundtrip(tmp_path):
+    cache = ResultsCache(tmp_path, max_size=1024**2)
+    agg_keys = np.array([b'GR', b'ZH'])
+    metadata = {'calculation_mode': 'scenario_risk',
+                'aggregation_types': ['Canton']}
+
+    assert cache.get(1, SOURCE) is None
+
+    passed = list(cache.put(1, SOURCE, metadata, agg_keys, risk_chunks()))
+    expected = pd.concat(risk_chunks(), ignore_index=True)
+    assert_frame_equal(pd.concat(passed, ignore_index=True), expected)
+
+    cached_metadata, cached_agg_keys, chunks = cache.get(
+        1, SOURCE, chunk_size=4)
+    chunks = list(chunks)
+
+    assert cached_metadata['aggregation_types'] == ['Canton']
+    assert cached_metadata['rows'] == 10
+    np.testing.assert_array_equal(cached_agg_keys, agg_keys)
+    assert [len(c) for c in chunks] == [4, 4, 2]
+    assert_frame_equal(pd.concat(chunks, ignore_index=True), expected)
+
+
+def test_results_cache_source(tmp_path):
+    cache = ResultsCache(tmp_path, max_size=1024**2)
+    list(cache.put(1, SOURCE, {}, np.array([b'GR']), risk_chunks()))
+
+    # the same job id on another server or in a local datastore
+    assert cache.get(1, 'http://other:8800') is None
+    assert cache.get(1, '/data/calc_1.hdf5') is None
+    assert cache.get(1, SOURCE) is not None
+
+    # entries whose metadata doesn't match the source are not used
+    with open(tmp_path / cache.key(1, SOURCE) / 'metadata.json', 'r+') as f:
+        metadata = json.load(f)
+        f.seek(0)
+        f.truncate()
+        json.dump(metadata | {'source': 'http://other:8800'}, f)
+    assert cache.get(1, SOURCE) is None
+
+
+def test_results_cache_incomplete(tmp_path):
+    cache = ResultsCache(tmp_path, max_size=1024**2)
+
+    chunks = cache.put(1, SOURCE, {}, np.array([b'GR']), risk_chunks())
+    next(chunks)
+    chunks.close()
+
+    assert cache.get(1, SOURCE) is None
+    assert cache.entries() == []
+
+
+def test_results_cache_eviction(tmp_path):
+    cache = ResultsCache(tmp_path, max_size=1024**2)
+
+    for i, job_id in enumerate([1, 2, 3]):
+        list(cache.put(job_id, SOURCE, {}, np.array([b'GR']),
+                       risk_chunks()))
+        # distinct access times, job 1 is accessed last
+        os.utime(tmp_path / cache.key(job_id, SOURCE) / 'metadata.json', (i, i))
+    cache.get(1, SOURCE)
+
+    entry_size = cache.entries()[0]['size']
+    cache.max_size = 2 * entry_size
+    cache.evict()
+
+    assert [e['key'] for e in cache.entries()] == \
+        [cache.key(3, SOURCE), cache.key(1, SOURCE)]
+    assert cache.purge(job_id=3) == [cache.key(3, SOURCE)]
+    assert cache.size() == entry_size
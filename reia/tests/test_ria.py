@@ -1,12 +1,24 @@
 import pytest
 from numpy.testing import assert_almost_equal
+from sqlalchemy import text
 
+from reia.config.settings import get_settings
 from reia.repositories.asset import (AggregationTagRepository, AssetRepository,
                                      SiteRepository)
 from reia.repositories.calculation import (CalculationBranchRepository,
                                            CalculationRepository,
                                            RiskAssessmentRepository)
-from reia.schemas.enums import ECalculationType, EStatus
+from reia.repositories.lossvalue import RiskValueRepository
+from reia.repositories.utils import (attach_calculation_partitions,
+                                     detach_calculation_partitions,
+                                     get_riskvalue_storage,
+                                     set_riskvalue_storage)
+from reia.schemas.calculation_schemas import CalculationBranch
+from reia.schemas.enums import (ECalculationType, ELossCategory,
+                                EResultsLayout, EResultsStorage, EStatus)
+from reia.services.calculation import (CalculationDataService,
+                                       CalculationService)
+from reia.services.results import ResultsIngestExecutor
 from reia.services.riskassessment import RiskAssessmentService
 
 
@@ -198,6 +210,24 @@ def test_damage_results(damage_calculation):
     assert_almost_equal(dg1_canton_gr, 2.73759E-03, 5)
 
 
+def test_event_weights(loss_calculation, db_session):
+    query = text("""
+        SELECT count(*), count(DISTINCT eventid), sum(weight)
+        FROM loss_event WHERE _calculation_oid = :oid""")
+    n_events, n_eventids, weight = db_session.execute(
+        query, {'oid': loss_calculation.oid}).one()
+    query = text("""
+        SELECT max(weight) FROM loss_totalweight
+        WHERE _calculation_oid = :oid""")
+    total_weight = db_session.execute(
+        query, {'oid': loss_calculation.oid}).scalar()
+
+    # one row per event of the single branch, referenced by the values
+    assert n_events == n_eventids > 0
+    assert weight <= total_weight * (1 + 1e-6)
+    assert all(ls.weight is not None for ls in loss_calculation.losses)
+
+
 def test_get_calculation_branches(
         db_session,
         loss_calculation,
@@ -213,6 +243,320 @@ def test_get_calculation_branches(
     assert damage_branch.type == ECalculationType.DAMAGE
 
 
+def test_aggregationkey_layout(loss_config, db_session, monkeypatch):
+    monkeypatch.setattr(get_settings(), 'results_layout', 'aggregationkey')
+
+    calculation, branch_settings = CalculationDataService.import_from_file(
+        db_session, [loss_config], [1])
+    calculation = CalculationService(db_session).run_calculations(
+        calculation, branch_settings)
+
+    assert calculation.status == EStatus.COMPLETE
+    assert CalculationRepository.get_results_layout(
+        db_session, calculation.oid) == EResultsLayout.AGGREGATIONKEY
+
+    # no association rows, the tags are resolved by the dictionary
+    n_assoc = db_session.execute(text("""
+        SELECT count(*) FROM loss_assoc_riskvalue_aggregationtag
+        WHERE _calculation_oid = :oid"""), {'oid': calculation.oid}).scalar()
+    assert n_assoc == 0
+
+    query = text("""
+        SELECT akey.aggregationtype, lat.name,
+               sum(rv.loss_value * ev.weight)
+        FROM loss_riskvalue rv
+        JOIN loss_event ev ON
+            rv._calculationbranch_oid = ev._calculationbranch_oid
+            AND rv.eventid = ev.eventid
+        JOIN loss_assoc_aggregationkey_aggregationtag akey ON
+            rv._calculationbranch_oid = akey._calculationbranch_oid
+            AND rv.aggregationkey = akey.aggregationkey
+        JOIN loss_aggregationtag lat ON akey.aggregationtag = lat._oid
+        WHERE rv._calculation_oid = :oid
+        GROUP BY akey.aggregationtype, lat.name""")
+    losses = {(tp, name): value for tp, name, value in
+              db_session.execute(query, {'oid': calculation.oid})}
+
+    assert_almost_equal(losses[('Canton', 'GR')], 325.357, 2)
+    assert_almost_equal(sum(v for (tp, _), v in losses.items()
+                            if tp == 'CantonGemeinde'), 325.357, 2)
+
+
+def test_eventarray_layout(loss_config, loss_calculation, db_session,
+                           monkeypatch):
+    monkeypatch.setattr(get_settings(), 'results_layout', 'eventarray')
+    # the arrays of several chunks are merged
+    monkeypatch.setattr(get_settings(), 'results_chunk_size', 1000)
+
+    calculation, branch_settings = CalculationDataService.import_from_file(
+        db_session, [loss_config], [1])
+    calculation = CalculationService(db_session).run_calculations(
+        calculation, branch_settings)
+
+    assert calculation.status == EStatus.COMPLETE
+    assert CalculationRepository.get_results_layout(
+        db_session, calculation.oid) == EResultsLayout.EVENTARRAY
+
+    # one committed ledger entry per chunk, the staged arrays are merged
+    query = text("""
+        SELECT count(*), bool_and(committed), sum(rows)
+        FROM loss_ingestledger WHERE _calculation_oid = :oid""")
+    n_chunks, committed, staged = db_session.execute(
+        query, {'oid': calculation.oid}).one()
+    assert n_chunks > 1 and committed and staged == 0
+    query = text("""
+        SELECT count(*) FROM loss_riskarraystaging
+        WHERE _calculation_oid = :oid""")
+    assert db_session.execute(query, {'oid': calculation.oid}).scalar() == 0
+
+    # no rows per risk value, one sorted array per tag
+    query = text("""
+        SELECT count(*) FROM loss_riskvalue
+        WHERE _calculation_oid = :oid""")
+    assert db_session.execute(query, {'oid': calculation.oid}).scalar() == 0
+
+    query = text("""
+        SELECT lat.type, lat.name, ra.riskvalues, ra.weights
+        FROM loss_riskarray ra
+        JOIN loss_aggregationtag lat ON ra.aggregationtag = lat._oid
+        WHERE ra._calculation_oid = :oid AND ra.quantity = 'loss'""")
+    losses = {}
+    for tp, name, values, weights in db_session.execute(
+            query, {'oid': calculation.oid}):
+        assert values == sorted(values)
+        losses[(tp, name)] = sum(v * w for v, w in zip(values, weights))
+
+    assert_almost_equal(losses[('Canton', 'GR')], 325.357, 2)
+    assert_almost_equal(sum(v for (tp, _), v in losses.items()
+                            if tp == 'CantonGemeinde'), 325.357, 2)
+
+    query = text("""
+        SELECT losscategory, aggregationtype, tagname,
+               loss_mean, loss_pc10, loss_pc90
+        FROM loss_riskstatistics WHERE _calculation_oid = :oid
+        ORDER BY losscategory, aggregationtype, tagname""")
+    arrays = db_session.execute(query, {'oid': calculation.oid}).all()
+    values = db_session.execute(query, {'oid': loss_calculation.oid}).all()
+
+    assert len(arrays) == len(values) > 0
+    for a, v in zip(arrays, values):
+        assert a[:3] == v[:3]
+        assert_almost_equal(a[3:], v[3:], 2)
+
+
+def test_sparse_results(loss_config, loss_calculation, db_session,
+                        monkeypatch):
+    monkeypatch.setattr(get_settings(), 'results_sparse', True)
+
+    calculation, branch_settings = CalculationDataService.import_from_file(
+        db_session, [loss_config], [1])
+    calculation = CalculationService(db_session).run_calculations(
+        calculation, branch_settings)
+    assert calculation.status == EStatus.COMPLETE
+
+    query = text("""
+        SELECT count(*) FROM loss_riskvalue
+        WHERE _calculation_oid = :oid AND loss_value = 0""")
+    n_zero = db_session.execute(query, {'oid': calculation.oid}).scalar()
+    assert n_zero == 0
+
+    # the total event weight makes up for the dropped zero losses
+    query = text("""
+        SELECT losscategory, aggregationtype, tagname,
+               loss_mean, loss_pc10, loss_pc90
+        FROM loss_riskstatistics WHERE _calculation_oid = :oid
+        ORDER BY losscategory, aggregationtype, tagname""")
+    sparse = db_session.execute(query, {'oid': calculation.oid}).all()
+    dense = db_session.execute(query, {'oid': loss_calculation.oid}).all()
+
+    assert len(sparse) == len(dense) > 0
+    for s, d in zip(sparse, dense):
+        assert s[:3] == d[:3]
+        assert_almost_equal(s[3:], d[3:], 5)
+
+
+def test_compact_storage(loss_config, loss_calculation, db_session):
+    db_session.commit()
+    with db_session.get_bind().begin() as connection:
+        set_riskvalue_storage(connection, EResultsStorage.COMPACT)
+        assert get_riskvalue_storage(connection) == EResultsStorage.COMPACT
+
+    try:
+        calculation, branch_settings = \
+            CalculationDataService.import_from_file(
+                db_session, [loss_config], [1])
+        calculation = CalculationService(db_session).run_calculations(
+            calculation, branch_settings)
+        assert calculation.status == EStatus.COMPLETE
+
+        query = text("""
+            SELECT loss_mean, loss_pc10, loss_pc90
+            FROM loss_riskstatistics WHERE _calculation_oid = :oid
+            ORDER BY losscategory, aggregationtype, tagname""")
+        compact = db_session.execute(query, {'oid': calculation.oid}).all()
+        double = db_session.execute(
+            query, {'oid': loss_calculation.oid}).all()
+        assert len(compact) == len(double) > 0
+        assert_almost_equal(compact, double, 2)
+    finally:
+        db_session.commit()
+        with db_session.get_bind().begin() as connection:
+            set_riskvalue_storage(connection, EResultsStorage.DOUBLE)
+
+
+def test_storage_with_detached_partitions(loss_calculation, db_session):
+    db_session.commit()
+    engine = db_session.get_bind()
+    detach_calculation_partitions(engine, loss_calculation.oid)
+    try:
+        with engine.begin() as connection:
+            with pytest.raises(ValueError,
+                               match=f'loss_riskvalue_{loss_calculation.oid}'):
+                set_riskvalue_storage(connection, EResultsStorage.COMPACT)
+            assert get_riskvalue_storage(connection) == \
+                EResultsStorage.DOUBLE
+    finally:
+        attach_calculation_partitions(engine, loss_calculation.oid, 1, '64MB')
+
+
+@pytest.mark.parametrize('unlogged', [False, True])
+def test_bulk_load(loss_config, loss_calculation, db_session, monkeypatch,
+                   unlogged):
+    monkeypatch.setattr(get_settings(), 'results_bulk_load', True)
+    monkeypatch.setattr(get_settings(), 'results_bulk_unlogged', unlogged)
+
+    calculation, branch_settings = CalculationDataService.import_from_file(
+        db_session, [loss_config], [1])
+    calculation = CalculationService(db_session).run_calculations(
+        calculation, branch_settings)
+    assert calculation.status == EStatus.COMPLETE
+
+    # attached again as logged tables, with the indexes and keys of the
+    # parent tables
+    query = text("""
+        SELECT count(*) FROM pg_class c
+        JOIN pg_index i ON i.indrelid = c.oid
+        WHERE c.relname IN (:riskvalue, :assoc) AND c.relispartition
+        AND c.relpersistence = 'p'""")
+    n_indexes = [db_session.execute(query, {
+        'riskvalue': f'loss_riskvalue_{oid}_structural',
+        'assoc': f'loss_assoc_{oid}_structural'}).scalar()
+        for oid in (calculation.oid, loss_calculation.oid)]
+    assert n_indexes[0] == n_indexes[1] > 0
+
+    query = text("""
+        SELECT last_analyze FROM pg_stat_user_tables
+        WHERE relname = :table""")
+    assert db_session.execute(query, {
+        'table': f'loss_riskvalue_{calculation.oid}_structural'}
+    ).scalar() is not None
+
+    query = text("""
+        SELECT loss_mean, loss_pc10, loss_pc90
+        FROM loss_riskstatistics WHERE _calculation_oid = :oid
+        ORDER BY losscategory, aggregationtype, tagname""")
+    bulk = db_session.execute(query, {'oid': calculation.oid}).all()
+    regular = db_session.execute(query, {'oid': loss_calculation.oid}).all()
+    assert len(bulk) == len(regular) > 0
+    assert_almost_equal(bulk, regular, 5)
+
+
+def test_losscategory_partitions(loss_calculation, db_session):
+    oid = loss_calculation.oid
+
+    # only the loss categories of the results have a partition
+    query = text("""
+        SELECT CAST(relid AS text) FROM pg_partition_tree(
+            CAST(:table AS regclass))
+        WHERE isleaf""")
+    leaves = set(db_session.execute(
+        query, {'table': f'loss_riskvalue_{oid}'}).scalars())
+    query = text("""
+        SELECT DISTINCT losscategory FROM loss_riskvalue
+        WHERE _calculation_oid = :oid""")
+    categories = db_session.execute(query, {'oid': oid}).scalars().all()
+    assert leaves == {f'loss_riskvalue_{oid}_{ELossCategory[c].value}'
+                      for c in categories}
+
+    RiskValueRepository.create_partitions(db_session, oid, ['CONTENTS'])
+    dropped = RiskValueRepository.drop_empty_partitions(db_session)
+    assert {f'loss_riskvalue_{oid}_contents',
+            f'loss_assoc_{oid}_contents'}.issubset(dropped)
+    assert not leaves.intersection(dropped)
+
+
+def test_tag_clustered_order(loss_calculation, db_session):
+    oid = loss_calculation.oid
+
+    # the rows of a tag are stored together, in the order of the index
+    query = text(f"""
+        SELECT aggregationtype, aggregationtag, riskvalue
+        FROM loss_assoc_{oid}_structural ORDER BY ctid""")
+    physical = db_session.execute(query).all()
+    assert len(physical) > 0
+    assert physical == sorted(physical)
+
+    query = text(f"""
+        SELECT eventid FROM loss_riskvalue_{oid}_structural rv
+        JOIN loss_assoc_{oid}_structural assoc ON rv._oid = assoc.riskvalue
+        WHERE assoc.aggregationtype = 'Canton'
+        ORDER BY rv._oid""")
+    eventids = db_session.execute(query).scalars().all()
+    assert eventids == sorted(eventids)
+
+
+def test_resume_ingestion(loss_config, db_session, monkeypatch):
+    monkeypatch.setattr(get_settings(), 'results_chunk_size', 1000)
+
+    calculation, branch_settings = CalculationDataService.import_from_file(
+        db_session, [loss_config], [1])
+    calculation = CalculationService(db_session).run_calculations(
+        calculation, branch_settings)
+    assert calculation.status == EStatus.COMPLETE
+
+    branch = calculation.losscalculationbranches[0]
+    query = text("""
+        SELECT chunk, jobid, rows FROM loss_ingestledger
+        WHERE _calculationbranch_oid = :oid ORDER BY chunk""")
+    ledger = db_session.execute(query, {'oid': branch.oid}).all()
+    assert len(ledger) > 1
+    jobid = ledger[0].jobid
+
+    count = text("""SELECT count(*) FROM loss_riskvalue
+                    WHERE _calculation_oid = :oid""")
+    n_values = db_session.execute(count, {'oid': calculation.oid}).scalar()
+    assert n_values == sum(entry.rows for entry in ledger)
+
+    assert RiskValueRepository.resume_ingestion(
+        db_session, branch, jobid, 1000) == len(ledger)
+    with pytest.raises(ValueError):
+        RiskValueRepository.resume_ingestion(db_session, branch, jobid, 500)
+
+    # the values of an interrupted chunk are removed to be saved again
+    query = text("""
+        UPDATE loss_ingestledger SET committed = false
+        WHERE _calculationbranch_oid = :oid AND chunk = :chunk""")
+    db_session.execute(query, {'oid': branch.oid, 'chunk': ledger[-1].chunk})
+    db_session.commit()
+
+    assert RiskValueRepository.resume_ingestion(
+        db_session, branch, jobid, 1000) == ledger[-1].chunk
+    assert db_session.execute(count, {'oid': calculation.oid}).scalar() \
+        == n_values - ledger[-1].rows
+
+
+def test_results_ingest_executor_errors(db_session):
+    with ResultsIngestExecutor(db_session, max_workers=2) as ingest:
+        ingest.submit(CalculationBranch(oid=-1))
+        ingest.submit(CalculationBranch(oid=-2),
+                      dstore_path='/nonexistent/calc_1.hdf5')
+        errors = ingest.wait()
+
+    assert set(errors) == {-1, -2}
+    assert isinstance(errors[-1], ValueError)
+    assert errors[-2] is not None
+
+
 def test_get_calculation_by_type(db_session):
     loss_calc = CalculationRepository.get_all_by_type(
         db_session, ECalculationType.LOSS)
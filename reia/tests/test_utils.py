@@ -0,0 +1,81 @@
+import threading
+import time
+
+import pytest
+
+from reia.utils import prefetch
+
+
+def _counting(produced: list, threads: list, n: int | None = None):
+    threads.append(threading.current_thread())
+    i = 0
+    while n is None or i < n:
+        produced.append(i)
+        yield i
+        i += 1
+
+
+def _wait_for(condition, timeout: float = 5) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class TestPrefetch:
+    def test_order_preserved(self):
+        assert list(prefetch(range(100), maxsize=3)) == list(range(100))
+
+    def test_producer_in_background_thread(self):
+        produced, threads = [], []
+
+        result = list(prefetch(_counting(produced, threads, 5)))
+
+        assert result == [0, 1, 2, 3, 4]
+        assert threads[0] is not threading.current_thread()
+
+    def test_producer_exception_reraised(self):
+        def failing():
+            yield 1
+            yield 2
+            raise ValueError('producer failed')
+
+        received = []
+        with pytest.raises(ValueError, match='producer failed'):
+            for item in prefetch(failing()):
+                received.append(item)
+
+        assert received == [1, 2]
+
+    def test_close_with_full_queue(self):
+        produced, threads = [], []
+        items = prefetch(_counting(produced, threads), maxsize=2)
+
+        assert next(items) == 0
+        # the producer blocks once the queue is full
+        assert _wait_for(lambda: len(produced) >= 4)
+
+        closer = threading.Thread(target=items.close, daemon=True)
+        closer.start()
+        closer.join(timeout=5)
+
+        assert not closer.is_alive()
+        assert not threads[0].is_alive()
+        assert len(produced) <= 4
+
+    def test_early_break_stops_producer(self):
+        produced, threads = [], []
+
+        def consume():
+            for item in prefetch(_counting(produced, threads), maxsize=1):
+                if item == 2:
+                    break
+
+        consumer = threading.Thread(target=consume, daemon=True)
+        consumer.start()
+        consumer.join(timeout=5)
+
+        assert not consumer.is_alive()
+        assert _wait_for(lambda: not threads[0].is_alive())
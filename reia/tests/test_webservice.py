@@ -3,6 +3,10 @@ from pathlib import Path
 
 import numpy as np
 import pytest
+from sqlalchemy import text
+
+from reia.repositories.lossvalue import RiskValueRepository
+from reia.schemas.enums import EResultsLayout, ERiskType
 
 
 def load_expected_response(endpoint_name):
@@ -92,6 +96,33 @@ async def test_loss_endpoint(test_client, loss_calculation):
         tolerance=0.01)
 
 
+@pytest.mark.asyncio
+async def test_loss_endpoint_precomputed(test_client, loss_calculation,
+                                         db_session):
+    """Precomputed statistics match the statistics computed on the fly."""
+    params = {'oid': loss_calculation.oid}
+    n_statistics = db_session.execute(text("""
+        SELECT count(*) FROM loss_riskstatistics
+        WHERE _calculation_oid = :oid"""), params).scalar()
+    assert n_statistics > 0
+
+    url = f"/v1/loss/{loss_calculation.oid}/structural/CantonGemeinde"
+    precomputed = await test_client.get(url)
+
+    db_session.execute(text("""
+        DELETE FROM loss_riskstatistics
+        WHERE _calculation_oid = :oid"""), params)
+    db_session.commit()
+    live = await test_client.get(url)
+
+    RiskValueRepository.insert_statistics(
+        db_session, loss_calculation.oid,
+        ERiskType.LOSS, EResultsLayout.ASSOCIATION)
+
+    assert precomputed.status_code == live.status_code == 200
+    assert precomputed.json() == live.json()
+
+
 @pytest.mark.asyncio
 async def test_damage_endpoint(test_client, damage_calculation):
     """Test /damage endpoint structure, keys and values."""
@@ -1,8 +1,11 @@
 import ast
 import configparser
 import io
+import queue
 import re
 import sys
+import threading
+from collections.abc import Iterable, Iterator
 from datetime import datetime
 from pathlib import Path
 from typing import Any, TextIO
@@ -56,6 +59,60 @@ def import_string(import_name: str, silent: bool = False) -> Any:
     return None
 
 
+def prefetch(iterable: Iterable, maxsize: int = 1) -> Iterator:
+    """Consume an iterable in a background thread.
+
+    Items are handed over through a bounded queue, so that producing the
+    next items overlaps with processing the current one, while never more
+    than `maxsize` items are held in the queue.
+
+    Args:
+        iterable: Iterable to be consumed in the background.
+        maxsize: Maximum number of items waiting to be processed.
+
+    Yields:
+        The items of `iterable`, in order. Exceptions raised while
+        producing an item are re-raised in the consuming thread.
+    """
+    buffer = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+    done = object()
+
+    def _put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce():
+        try:
+            for item in iterable:
+                if not _put((item, None)):
+                    return
+        except BaseException as e:
+            _put((None, e))
+        else:
+            _put((done, None))
+
+    thread = threading.Thread(target=_produce, daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            item, error = buffer.get()
+            if error is not None:
+                raise error
+            if item is done:
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
 def flatten_config(file: TextIO) -> dict:
 
     if not isinstance(file, configparser.ConfigParser):
@@ -2,34 +2,106 @@ import pandas as pd
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from reia.schemas.enums import EResultsLayout
 from reia.webservice.schemas import WSRiskCategory
 
-
-class AggregationRepository:
-    """
-    Repository for aggregation-related queries with database-side statistics
+# Joins from the risk values `rv` to their aggregation tags `lat`,
+# depending on the results layout of the calculation.
+RISKVALUE_TAG_JOINS = {
+    EResultsLayout.ASSOCIATION: """
+            INNER JOIN loss_assoc_riskvalue_aggregationtag assoc ON
+                rv._oid = assoc.riskvalue
+                AND rv._calculation_oid = assoc._calculation_oid
+                AND rv.losscategory = assoc.losscategory
+            INNER JOIN loss_aggregationtag lat ON
+                         assoc.aggregationtag = lat._oid
+            WHERE
+                assoc.aggregationtype = :aggregation_type
+    """,
+    EResultsLayout.AGGREGATIONKEY: """
+            INNER JOIN loss_assoc_aggregationkey_aggregationtag akey ON
+                rv._calculationbranch_oid = akey._calculationbranch_oid
+                AND rv.aggregationkey = akey.aggregationkey
+            INNER JOIN loss_aggregationtag lat ON
+                         akey.aggregationtag = lat._oid
+            WHERE
+                akey._calculation_oid = :calculation_id
+                AND akey.aggregationtype = :aggregation_type
     """
+}
 
-    @classmethod
-    async def get_damage_statistics(
-        cls,
-        session: AsyncSession,
-        calculation_id: int,
-        aggregation_type: str,
-        loss_category: WSRiskCategory,
-        filter_like_tag: str | None = None
-    ) -> pd.DataFrame:
-        """
-        Get damage statistics with weighted mean and percentiles
-        calculated in database
-        """
+# Statistics precomputed at ingest time, read into the same format as
+# the DAMAGE_STATISTICS and LOSS_STATISTICS CTEs computed on the fly.
+PRECOMPUTED_STATISTICS = """
+        {name} AS (
+            SELECT
+                tagname as tag_name,
+                {columns}
+            FROM loss_riskstatistics
+            WHERE
+                _calculation_oid = :calculation_id
+                AND losscategory = CAST(:loss_category_str AS elosscategory)
+                AND aggregationtype = :aggregation_type
+                AND tagname LIKE :name_pattern
+        )
+"""
 
-        loss_category_str = loss_category.name  # Use the enum name (uppercase)
-        name_pattern = f'%{filter_like_tag}%' if filter_like_tag else '%'
+# Statistics computed on the fly from the sorted arrays of the EVENTARRAY
+# layout, one lookup per tag and quantity. The event weight missing from
+# an array is prepended as a zero value.
+EVENT_ARRAY_STATISTICS = """
+        {name}_total_weight AS (
+            SELECT SUM(weight) AS weight
+            FROM loss_totalweight
+            WHERE
+                _calculation_oid = :calculation_id
+                AND losscategory = CAST(:loss_category_str AS elosscategory)
+        ),
+        {name}_arrays AS (
+            SELECT
+                lat.name as tag_name,
+                ra.quantity,
+                weighted_mean(ra.riskvalues, ra.weights) as mean,
+                weighted_quantile(ra.riskvalues, ra.weights,
+                                  ARRAY[0.1, 0.9]) as quantiles
+            FROM (
+                SELECT
+                    ra.aggregationtag,
+                    ra.aggregationtype,
+                    ra.quantity,
+                    CASE WHEN ra.weight < (1 - 1e-6) * tw.weight
+                        THEN ARRAY[0]::real[] || ra.riskvalues
+                        ELSE ra.riskvalues END AS riskvalues,
+                    CASE WHEN ra.weight < (1 - 1e-6) * tw.weight
+                        THEN ARRAY[tw.weight - ra.weight]::real[]
+                            || ra.weights
+                        ELSE ra.weights END AS weights
+                FROM loss_riskarray ra
+                CROSS JOIN {name}_total_weight tw
+                WHERE
+                    ra._calculation_oid = :calculation_id
+                    AND ra.losscategory =
+                        CAST(:loss_category_str AS elosscategory)
+                    AND ra.aggregationtype = :aggregation_type
+            ) ra
+            INNER JOIN loss_aggregationtag lat ON
+                ra.aggregationtag = lat._oid
+                AND ra.aggregationtype = lat.type
+            WHERE
+                lat.name LIKE :name_pattern
+        ),
+        {name} AS (
+            SELECT
+                tag_name,
+                {columns}
+            FROM {name}_arrays
+            GROUP BY tag_name
+        )
+"""
 
-        # Complete SQL query that returns exact webservice format
-        sql_query = text("""
-        WITH damage_data AS (
+# Statistics computed on the fly from the stored risk values.
+DAMAGE_STATISTICS = """
+        damage_data AS (
             SELECT
                 lat.name as tag_name,
                 rv.dg1_value,
@@ -37,21 +109,41 @@ class AggregationRepository:
                 rv.dg3_value,
                 rv.dg4_value,
                 rv.dg5_value,
-                rv.weight
+                ev.weight
             FROM loss_riskvalue rv
-            INNER JOIN loss_assoc_riskvalue_aggregationtag assoc ON
-                rv._oid = assoc.riskvalue
-                AND rv._calculation_oid = assoc._calculation_oid
-                AND rv.losscategory = assoc.losscategory
-            INNER JOIN loss_aggregationtag lat ON
-                         assoc.aggregationtag = lat._oid
-            WHERE
-                rv._calculation_oid = :calculation_id
+            INNER JOIN loss_event ev ON
+                rv._calculationbranch_oid = ev._calculationbranch_oid
+                AND rv.eventid = ev.eventid
+            {tag_joins}
+                AND rv._calculation_oid = :calculation_id
                 AND rv.losscategory = CAST(:loss_category_str AS elosscategory)
-                AND assoc.aggregationtype = :aggregation_type
                 AND lat.type = :aggregation_type
                 AND lat.name LIKE :name_pattern
         ),
+        damage_total_weight AS (
+            SELECT SUM(weight) AS weight
+            FROM loss_totalweight
+            WHERE
+                _calculation_oid = :calculation_id
+                AND losscategory = CAST(:loss_category_str AS elosscategory)
+        ),
+        padded_damage_data AS (
+            SELECT * FROM damage_data
+            UNION ALL
+            -- event weight without stored values, e.g. dropped zero losses
+            SELECT
+                d.tag_name,
+                0,
+                0,
+                0,
+                0,
+                0,
+                tw.weight - SUM(d.weight::float8)
+            FROM damage_data d
+            CROSS JOIN damage_total_weight tw
+            GROUP BY d.tag_name, tw.weight
+            HAVING SUM(d.weight::float8) < (1 - 1e-6) * tw.weight
+        ),
         damage_statistics AS (
             SELECT
                 tag_name,
@@ -79,39 +171,181 @@ class AggregationRepository:
                     array_agg(dg4_value) as dg4_values,
                     array_agg(dg5_value) as dg5_values,
                     array_agg(weight) as weights
-                FROM damage_data
+                FROM padded_damage_data
                 GROUP BY tag_name
             ) aggregated
+        )
+"""
+
+LOSS_STATISTICS = """
+        loss_data AS (
+            SELECT
+                lat.name as tag_name,
+                rv.loss_value,
+                ev.weight
+            FROM loss_riskvalue rv
+            INNER JOIN loss_event ev ON
+                rv._calculationbranch_oid = ev._calculationbranch_oid
+                AND rv.eventid = ev.eventid
+            {tag_joins}
+                AND rv._calculation_oid = :calculation_id
+                AND rv.losscategory = CAST(:loss_category_str AS elosscategory)
+                AND lat.type = :aggregation_type
+                AND lat.name LIKE :name_pattern
         ),
+        loss_total_weight AS (
+            SELECT SUM(weight) AS weight
+            FROM loss_totalweight
+            WHERE
+                _calculation_oid = :calculation_id
+                AND losscategory = CAST(:loss_category_str AS elosscategory)
+        ),
+        padded_loss_data AS (
+            SELECT * FROM loss_data
+            UNION ALL
+            -- event weight without stored values, e.g. dropped zero losses
+            SELECT
+                d.tag_name,
+                0,
+                tw.weight - SUM(d.weight::float8)
+            FROM loss_data d
+            CROSS JOIN loss_total_weight tw
+            GROUP BY d.tag_name, tw.weight
+            HAVING SUM(d.weight::float8) < (1 - 1e-6) * tw.weight
+        ),
+        loss_statistics AS (
+            SELECT
+                tag_name,
+                -- Loss statistics using sparse data functions
+                weighted_mean(array_agg(loss_value),
+                    array_agg(weight)) as loss_mean,
+                weighted_quantile(array_agg(loss_value),
+                    array_agg(weight), ARRAY[0.1, 0.9]) as loss_quantiles
+            FROM padded_loss_data
+            GROUP BY tag_name
+        )
+"""
+
+
+def precomputed_statistics(name: str, quantities: list[str]) -> str:
+    """Build a CTE reading the precomputed statistics of the quantities."""
+    columns = ',\n'.join(
+        f'{q}_mean, ARRAY[{q}_pc10, {q}_pc90] as {q}_quantiles'
+        for q in quantities)
+    return PRECOMPUTED_STATISTICS.format(name=name, columns=columns)
+
+
+def event_array_statistics(name: str, quantities: list[str]) -> str:
+    """Build a CTE computing the statistics of the quantities' arrays."""
+    columns = ',\n'.join(
+        f"MAX(mean) FILTER (WHERE quantity = '{q}') as {q}_mean, "
+        f"ARRAY[MAX(quantiles[1]) FILTER (WHERE quantity = '{q}'), "
+        f"MAX(quantiles[2]) FILTER (WHERE quantity = '{q}')] "
+        f"as {q}_quantiles"
+        for q in quantities)
+    return EVENT_ARRAY_STATISTICS.format(name=name, columns=columns)
+
+
+class AggregationRepository:
+    """
+    Repository for aggregation-related queries with database-side statistics
+    """
+
+    @classmethod
+    async def get_results_layout(cls,
+                                 session: AsyncSession,
+                                 calculation_id: int) -> EResultsLayout:
+        """Get the storage layout of the results of a calculation."""
+        result = await session.execute(text("""
+            SELECT resultslayout FROM loss_calculation
+            WHERE _oid = :calculation_id
+        """), {'calculation_id': calculation_id})
+        layout = result.scalar_one_or_none()
+        return EResultsLayout[layout] if layout \
+            else EResultsLayout.ASSOCIATION
+
+    @classmethod
+    async def has_precomputed_statistics(cls,
+                                         session: AsyncSession,
+                                         calculation_id: int,
+                                         aggregation_type: str,
+                                         loss_category_str: str) -> bool:
+        """Check whether statistics were precomputed at ingest time."""
+        result = await session.execute(text("""
+            SELECT EXISTS (
+                SELECT 1 FROM loss_riskstatistics
+                WHERE _calculation_oid = :calculation_id
+                AND losscategory = CAST(:loss_category_str AS elosscategory)
+                AND aggregationtype = :aggregation_type
+            )
+        """), {'calculation_id': calculation_id,
+               'loss_category_str': loss_category_str,
+               'aggregation_type': aggregation_type})
+        return result.scalar_one()
+
+    @classmethod
+    async def get_damage_statistics(
+        cls,
+        session: AsyncSession,
+        calculation_id: int,
+        aggregation_type: str,
+        loss_category: WSRiskCategory,
+        filter_like_tag: str | None = None
+    ) -> pd.DataFrame:
+        """
+        Get damage statistics with weighted mean and percentiles
+        calculated in database
+        """
+
+        loss_category_str = loss_category.name  # Use the enum name (uppercase)
+        name_pattern = f'%{filter_like_tag}%' if filter_like_tag else '%'
+
+        if await cls.has_precomputed_statistics(
+                session, calculation_id, aggregation_type,
+                loss_category_str):
+            statistics = precomputed_statistics(
+                'damage_statistics', ['dg1', 'dg2', 'dg3', 'dg4', 'dg5'])
+        else:
+            layout = await cls.get_results_layout(session, calculation_id)
+            if layout == EResultsLayout.EVENTARRAY:
+                statistics = event_array_statistics(
+                    'damage_statistics', ['dg1', 'dg2', 'dg3', 'dg4', 'dg5'])
+            else:
+                statistics = DAMAGE_STATISTICS.format(
+                    tag_joins=RISKVALUE_TAG_JOINS[layout])
+
+        # Complete SQL query that returns exact webservice format
+        sql_query = text("""
+        WITH {statistics},
         all_tags AS (
             SELECT DISTINCT lat.name as tag_name
-            FROM loss_aggregationtag lat
-            INNER JOIN loss_assoc_asset_aggregationtag asset_assoc ON
-                lat._oid = asset_assoc.aggregationtag
-            INNER JOIN loss_asset ast ON asset_assoc.asset = ast._oid
+            FROM loss_buildingcount bc
+            INNER JOIN loss_aggregationtag lat ON
+                lat._oid = bc.aggregationtag
+                AND lat.type = bc.aggregationtype
             INNER JOIN loss_calculationbranch cb ON
-                         ast._exposuremodel_oid = cb._exposuremodel_oid
+                         bc._exposuremodel_oid = cb._exposuremodel_oid
             WHERE
-                lat.type = :aggregation_type
+                bc.aggregationtype = :aggregation_type
                 AND lat.name LIKE :name_pattern
                 AND cb._calculation_oid = :calculation_id
         ),
         building_counts AS (
             SELECT
                 lat.name as tag_name,
-                SUM(ast.buildingcount) as total_buildings
-            FROM loss_aggregationtag lat
-            INNER JOIN loss_assoc_asset_aggregationtag assoc ON
-                lat._oid = assoc.aggregationtag
-            INNER JOIN loss_asset ast ON assoc.asset = ast._oid
+                SUM(bc.buildingcount) as total_buildings
+            FROM loss_buildingcount bc
+            INNER JOIN loss_aggregationtag lat ON
+                lat._oid = bc.aggregationtag
+                AND lat.type = bc.aggregationtype
             INNER JOIN (
                 SELECT _exposuremodel_oid
                 FROM loss_calculationbranch
                 WHERE _calculation_oid = :calculation_id
                 LIMIT 1
-            ) exp_sub ON ast._exposuremodel_oid = exp_sub._exposuremodel_oid
+            ) exp_sub ON bc._exposuremodel_oid = exp_sub._exposuremodel_oid
             WHERE
-                lat.type = :aggregation_type
+                bc.aggregationtype = :aggregation_type
                 AND lat.name LIKE :name_pattern
             GROUP BY lat.name
         )
@@ -138,7 +372,7 @@ class AggregationRepository:
         LEFT JOIN damage_statistics ds ON at.tag_name = ds.tag_name
         LEFT JOIN building_counts bc ON at.tag_name = bc.tag_name
         ORDER BY at.tag_name
-        """)
+        """.format(statistics=statistics))
 
         result = await session.execute(sql_query, {
             'calculation_id': calculation_id,
@@ -168,48 +402,32 @@ class AggregationRepository:
         loss_category_str = loss_category.name  # Use the enum name (uppercase)
         name_pattern = f'%{filter_like_tag}%' if filter_like_tag else '%'
 
+        if await cls.has_precomputed_statistics(
+                session, calculation_id, aggregation_type,
+                loss_category_str):
+            statistics = precomputed_statistics('loss_statistics', ['loss'])
+        else:
+            layout = await cls.get_results_layout(session, calculation_id)
+            if layout == EResultsLayout.EVENTARRAY:
+                statistics = event_array_statistics(
+                    'loss_statistics', ['loss'])
+            else:
+                statistics = LOSS_STATISTICS.format(
+                    tag_joins=RISKVALUE_TAG_JOINS[layout])
+
         # Complete SQL query that returns exact webservice format
         sql_query = text("""
-        WITH loss_data AS (
-            SELECT
-                lat.name as tag_name,
-                rv.loss_value,
-                rv.weight
-            FROM loss_riskvalue rv
-            INNER JOIN loss_assoc_riskvalue_aggregationtag assoc ON
-                rv._oid = assoc.riskvalue
-                AND rv._calculation_oid = assoc._calculation_oid
-                AND rv.losscategory = assoc.losscategory
-            INNER JOIN loss_aggregationtag lat ON
-                         assoc.aggregationtag = lat._oid
-            WHERE
-                rv._calculation_oid = :calculation_id
-                AND rv.losscategory = CAST(:loss_category_str AS elosscategory)
-                AND assoc.aggregationtype = :aggregation_type
-                AND lat.type = :aggregation_type
-                AND lat.name LIKE :name_pattern
-        ),
-        loss_statistics AS (
-            SELECT
-                tag_name,
-                -- Loss statistics using sparse data functions
-                weighted_mean(array_agg(loss_value),
-                    array_agg(weight)) as loss_mean,
-                weighted_quantile(array_agg(loss_value),
-                    array_agg(weight), ARRAY[0.1, 0.9]) as loss_quantiles
-            FROM loss_data
-            GROUP BY tag_name
-        ),
+        WITH {statistics},
         all_tags AS (
             SELECT DISTINCT lat.name as tag_name
-            FROM loss_aggregationtag lat
-            INNER JOIN loss_assoc_asset_aggregationtag asset_assoc ON
-                lat._oid = asset_assoc.aggregationtag
-            INNER JOIN loss_asset ast ON asset_assoc.asset = ast._oid
+            FROM loss_buildingcount bc
+            INNER JOIN loss_aggregationtag lat ON
+                lat._oid = bc.aggregationtag
+                AND lat.type = bc.aggregationtype
             INNER JOIN loss_calculationbranch cb ON
-                         ast._exposuremodel_oid = cb._exposuremodel_oid
+                         bc._exposuremodel_oid = cb._exposuremodel_oid
             WHERE
-                lat.type = :aggregation_type
+                bc.aggregationtype = :aggregation_type
                 AND lat.name LIKE :name_pattern
                 AND cb._calculation_oid = :calculation_id
         )
@@ -222,7 +440,7 @@ class AggregationRepository:
         FROM all_tags at
         LEFT JOIN loss_statistics ls ON at.tag_name = ls.tag_name
         ORDER BY at.tag_name
-        """)
+        """.format(statistics=statistics))
 
         result = await session.execute(sql_query, {
             'calculation_id': calculation_id,
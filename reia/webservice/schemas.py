@@ -10,6 +10,7 @@ from reia.schemas.calculation_schemas import (Calculation, CalculationBranch,
                                               DamageCalculationBranch,
                                               LossCalculationBranch,
                                               RiskAssessment)
+from reia.schemas.enums import EResultsLayout
 
 
 class WSModel(CoreModel):
@@ -93,7 +94,7 @@ class WSDamageCalculationBranch(DamageCalculationBranch, WSModel):
 
 class WSCalculation(Calculation, WSCreationInfoMixin):
     """Webservice version of Calculation - inherits all core fields."""
-    pass
+    resultslayout: EResultsLayout | None = Field(default=None, exclude=True)
 
 
 class WSLossCalculation(WSCalculation):